@@ -3,8 +3,27 @@ from shapely.geometry import Point
 import pandas as pd
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import shapely
 
+from diagnostics import bind_run, current, log, timed
+from geo_cache import read_cached
+import reproject
+
+# Name der Ausschlusszone um bestehende Bäume
+BAUM_PUFFER = '🌳_Baum_Puffer'
+
+# Threads beim Laden der Constraint-Layer
+LOAD_WORKERS = 8
+
+# Rand (Meter) um das Baumkataster beim Laden der Constraints (> größter Linien-Buffer)
+BBOX_MARGIN_M = 50
+
+# Maximale Erosion (Meter) bei 100% Entsperrung im Modus 'buffer'
+MAX_EROSION_M = 5
+
+@timed()
 def load_data(data_path="data"):
     """Lädt das Baumkataster - sucht automatisch nach passender Datei"""
     try:
@@ -12,37 +31,57 @@ def load_data(data_path="data"):
         shp_files = list(Path(data_path).glob("*.shp"))
         
         if not shp_files:
-            print(f"✗ Keine .shp Dateien in '{data_path}' gefunden!")
+            log(f"✗ Keine .shp Dateien in '{data_path}' gefunden!")
             return None
         
         # Versuche zuerst die erwartete Datei
         expected_file = f"{data_path}/SHN_Baumkataster_open_UTM32N_EPSG25832.shp"
         if os.path.exists(expected_file):
-            bäume = gpd.read_file(expected_file)
+            bäume = read_cached(expected_file)
         else:
             # Nehme die erste .shp Datei
-            print(f"⚠ Erwartete Datei nicht gefunden, verwende: {shp_files[0].name}")
-            bäume = gpd.read_file(shp_files[0])
+            log(f"⚠ Erwartete Datei nicht gefunden, verwende: {shp_files[0].name}")
+            bäume = read_cached(shp_files[0])
         
-        print(f"✓ Erfolgreich geladen: {len(bäume)} Bäume")
-        print(f"✓ Koordinatensystem: {bäume.crs}")
-        print(f"✓ Datei: {shp_files[0].name if not os.path.exists(expected_file) else 'SHN_Baumkataster_open_UTM32N_EPSG25832.shp'}")
+        current()['bäume'] = len(bäume)
+        log(f"✓ Erfolgreich geladen: {len(bäume)} Bäume")
+        log(f"✓ Koordinatensystem: {bäume.crs.to_string()}")
+        log(f"✓ Datei: {shp_files[0].name if not os.path.exists(expected_file) else 'SHN_Baumkataster_open_UTM32N_EPSG25832.shp'}")
         return bäume
     except Exception as e:
-        print(f"✗ Fehler beim Laden: {e}")
+        log(f"✗ Fehler beim Laden: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def load_all_constraints(constraints_path="constraints"):
+def _load_constraint(task):
+    """Lädt einen Constraint-Layer (Fehler werden zurückgegeben statt geworfen)"""
+    shp_file, columns, bbox, bbox_crs = task
+    try:
+        return read_cached(shp_file, columns=columns, bbox=bbox, bbox_crs=bbox_crs), None
+    except Exception as e:
+        return None, e
+
+@timed()
+def load_all_constraints(constraints_path="constraints", columns=(), bbox=None, bbox_crs=None,
+                         workers=None):
     """
     Lädt ALLE Shapefiles aus dem constraints-Ordner
+    ⚡ OPTIMIERT: Parallel in einem Thread-Pool (Lesen ist I/O bzw. nativer Code),
+    standardmäßig nur die Geometrie und optional nur Features in der Bounding Box
+    
+    Args:
+        constraints_path: Ordner mit den Shapefiles
+        columns: Zu behaltende Attributspalten (Standard: keine, None = alle)
+        bbox: Optional (minx, miny, maxx, maxy), z.B. Ausdehnung des Baumkatasters
+        bbox_crs: CRS der Bounding Box
+        workers: Anzahl der Threads (Standard: bis zu 8)
     """
     constraints = {}
     
     # Prüfe ob Ordner existiert
     if not os.path.exists(constraints_path):
-        print(f"⚠ Ordner '{constraints_path}' existiert nicht - erstelle ihn...")
+        log(f"⚠ Ordner '{constraints_path}' existiert nicht - erstelle ihn...")
         os.makedirs(constraints_path)
         return constraints
     
@@ -50,33 +89,75 @@ def load_all_constraints(constraints_path="constraints"):
     constraint_files = list(Path(constraints_path).glob("*.shp"))
     
     if not constraint_files:
-        print(f"⚠ Keine Shapefiles in '{constraints_path}' gefunden")
+        log(f"⚠ Keine Shapefiles in '{constraints_path}' gefunden")
         return constraints
     
-    print(f"\n📂 Lade Constraints aus '{constraints_path}':")
+    log(f"\n📂 Lade Constraints aus '{constraints_path}':")
     
-    for shp_file in constraint_files:
+    columns = list(columns) if columns is not None else None
+    tasks = [(shp_file, columns, bbox, bbox_crs) for shp_file in constraint_files]
+    workers = workers or min(len(tasks), LOAD_WORKERS)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(bind_run(_load_constraint), tasks))
+    
+    for shp_file, (gdf, error) in zip(constraint_files, results):
         filename = shp_file.stem
-        try:
-            gdf = gpd.read_file(shp_file)
+        if error is None:
             constraints[filename] = gdf
-            print(f"  ✓ {filename}: {len(gdf)} Features")
-        except Exception as e:
-            print(f"  ✗ {filename}: Fehler - {e}")
+            log(f"  ✓ {filename}: {len(gdf)} Features")
+        else:
+            log(f"  ✗ {filename}: Fehler - {error}")
             constraints[filename] = None
     
+    current()['layer'] = len(constraints)
+    current()['features'] = sum(len(gdf) for gdf in constraints.values() if gdf is not None)
     return constraints
 
-def find_suitable_locations(bäume, constraints, abstand_bäume=5, buffer_linien=10):
-    """Findet geeignete Standorte für neue Bäume"""
+def make_distance_zone(bäume, abstand_bäume):
+    """
+    Abstandszone um bestehende Bäume: nur die Baumpunkte + Mindestabstand
+    ⚡ Kein Buffer, kein Dissolve - der Abstand wird per Nearest-Neighbour-Abfrage geprüft
+    """
+    return gpd.GeoDataFrame({'abstand': float(abstand_bäume)},
+                            index=range(len(bäume)), geometry=bäume.geometry.values, crs=bäume.crs)
+
+def is_distance_zone(zone):
+    """True, wenn die Zone als Punkte + Mindestabstand gespeichert ist"""
+    return zone is not None and 'abstand' in zone.columns
+
+def dissolved_zone(zone):
+    """Flächenzone als eine vereinigte Zeile (unverändert, wenn sie nur eine Zeile hat)"""
+    if len(zone) <= 1:
+        return zone
+    return gpd.GeoDataFrame(geometry=[shapely.union_all(zone.geometry.values)], crs=zone.crs)
+
+def distance_zone_polygons(zone, quad_segs=4):
+    """
+    Abstandszone als Kreisflächen (für Karte und Export)
+    ⚡ Ein Kreis pro Punkt, ohne Dissolve - die teure Vereinigung bleibt der Analyse erspart
+    """
+    geometry = shapely.buffer(zone.geometry.values, zone['abstand'].to_numpy(), quad_segs=quad_segs)
+    return gpd.GeoDataFrame(geometry=geometry, crs=zone.crs)
+
+@timed()
+def find_suitable_locations(bäume, constraints, abstand_bäume=5, buffer_linien=10, tree_mode='buffer',
+                            dissolve=False):
+    """
+    Findet geeignete Standorte für neue Bäume
+    
+    tree_mode='distance' speichert den Baum-Puffer als Abstandszone (Punkte +
+    Mindestabstand) statt Tausende Kreise zu puffern und zu vereinigen.
+    
+    ⚡ Standardmäßig ohne Dissolve: jede Zone behält ihre (gepufferten) Einzelteile, die
+    Suche indiziert sie im ExclusionStore. Ohne Vereinigung bleibt nur das Puffern - parallel
+    läuft deshalb erst die gekachelte Standortsuche. dissolve=True vereinigt jede Zone zu
+    einer Geometrie.
+    """
     ausschlusszonen = {}
     
     # 1. Buffer um bestehende Bäume
-    baum_buffer = bäume.copy()
-    baum_buffer['geometry'] = baum_buffer.buffer(abstand_bäume)
-    baum_zone = baum_buffer.dissolve()
-    baum_zone.crs = bäume.crs
-    ausschlusszonen['🌳_Baum_Puffer'] = baum_zone
+    ausschlusszonen[BAUM_PUFFER] = tree_zone(bäume, abstand_bäume, tree_mode, dissolve)
     
     # 2. Alle Constraint-Layer verarbeiten
     for name, layer in constraints.items():
@@ -84,33 +165,60 @@ def find_suitable_locations(bäume, constraints, abstand_bäume=5, buffer_linien
             continue
         
         try:
-            constraint_copy = layer.copy()
-            
-            # CRS angleichen
-            if constraint_copy.crs != bäume.crs:
-                constraint_copy = constraint_copy.to_crs(bäume.crs)
-            
-            # Prüfe Geometrie-Typ
-            geom_type = constraint_copy.geometry.geom_type.iloc[0] if len(constraint_copy) > 0 else None
-            
-            # Linien bekommen einen Buffer
-            if geom_type in ['LineString', 'MultiLineString']:
-                constraint_copy['geometry'] = constraint_copy.buffer(buffer_linien)
-                print(f"  → {name} (Linie): Buffer von {buffer_linien}m angewendet")
-            
-            # Dissolve
-            zone = constraint_copy.dissolve()
-            zone.crs = bäume.crs
-            
-            ausschlusszonen[name] = zone
-            
+            ausschlusszonen[name] = constraint_zone(layer, bäume.crs, buffer_linien, name, dissolve)
         except Exception as e:
-            print(f"  ✗ Fehler bei {name}: {e}")
+            log(f"  ✗ Fehler bei {name}: {e}")
     
-    print(f"\n✓ {len(ausschlusszonen)} Ausschlusszonen-Typen berechnet")
+    log(f"\n✓ {len(ausschlusszonen)} Ausschlusszonen-Typen berechnet")
+    current()['zonen'] = len(ausschlusszonen)
     
     return ausschlusszonen
 
+@timed()
+def tree_zone(bäume, abstand_bäume, tree_mode='buffer', dissolve=True):
+    """Ausschlusszone um bestehende Bäume (Abstandszone oder vereinigte Puffer)"""
+    if tree_mode == 'distance':
+        return make_distance_zone(bäume, abstand_bäume)
+    
+    baum_buffer = gpd.GeoDataFrame(geometry=bäume.buffer(abstand_bäume), crs=bäume.crs)
+    if not dissolve:
+        return baum_buffer
+    current()['geometrien_vereinigt'] = len(baum_buffer)
+    baum_zone = baum_buffer.dissolve()
+    baum_zone.crs = bäume.crs
+    return baum_zone
+
+@timed()
+def constraint_zone(layer, crs, buffer_linien=10, name='', dissolve=True):
+    """
+    Ausschlusszone eines einzelnen Constraint-Layers
+    Hängt nur von diesem Layer ab - ein neuer Layer kostet nur seine eigene Zone.
+    dissolve=False liefert die (gepufferten) Einzelgeometrien für den ExclusionStore.
+    """
+    constraint_copy = gpd.GeoDataFrame(geometry=layer.geometry.values, crs=layer.crs)
+    
+    # CRS angleichen (Reprojektions-Cache: ein unveränderter Layer wird nur einmal projiziert)
+    constraint_copy = reproject.to_crs(constraint_copy, crs)
+    
+    # Prüfe Geometrie-Typ
+    geom_type = constraint_copy.geometry.geom_type.iloc[0] if len(constraint_copy) > 0 else None
+    
+    # Linien bekommen einen Buffer
+    if geom_type in ['LineString', 'MultiLineString']:
+        # Neues GeoDataFrame - die projizierte Kopie gehört dem Cache
+        constraint_copy = gpd.GeoDataFrame(geometry=constraint_copy.buffer(buffer_linien).values,
+                                           crs=constraint_copy.crs)
+        log(f"  → {name} (Linie): Buffer von {buffer_linien}m angewendet")
+    
+    if not dissolve:
+        return constraint_copy
+    
+    # Dissolve
+    current()['geometrien_vereinigt'] = len(constraint_copy)
+    zone = constraint_copy.dissolve()
+    zone.crs = crs
+    return zone
+
 def calculate_stats(bäume):
     """Berechnet Statistiken über das Baumkataster"""
     stats = {
@@ -125,7 +233,30 @@ def calculate_stats(bäume):
     
     return stats
 
-def apply_zone_relaxation(ausschlusszonen_dict, unlock_zones, unlock_percentage):
+def area_unlock_distance(zone, unlock_percentage, iterations=20):
+    """
+    Erosionsdistanz, bei der genau unlock_percentage % der Zonenfläche frei werden
+    (Bisektion auf der Fläche von zone.buffer(-d))
+    """
+    area = zone.area.sum()
+    if area == 0 or unlock_percentage <= 0:
+        return 0.0
+    
+    minx, miny, maxx, maxy = zone.total_bounds
+    lower, upper = 0.0, max(maxx - minx, maxy - miny) / 2
+    target = area * (1 - unlock_percentage / 100)
+    
+    for _ in range(iterations):
+        middle = (lower + upper) / 2
+        if zone.buffer(-middle).area.sum() > target:
+            lower = middle
+        else:
+            upper = middle
+    
+    return upper
+
+@timed()
+def apply_zone_relaxation(ausschlusszonen_dict, unlock_zones, unlock_percentage, mode='buffer'):
     """
     Entsperrt teilweise Zonen für Baumpflanzung
     ⚡ OPTIMIERT: Nur modifizierte Zonen werden kopiert
@@ -134,6 +265,8 @@ def apply_zone_relaxation(ausschlusszonen_dict, unlock_zones, unlock_percentage)
         ausschlusszonen_dict: Dict mit allen Ausschlusszonen
         unlock_zones: Liste der zu entsperrenden Zonen-Namen
         unlock_percentage: Prozent der Fläche, die genutzt werden darf (0-100)
+        mode: 'buffer' = Rand um MAX_EROSION_M * Prozent erodieren,
+              'area' = Erosion so wählen, dass der Prozentsatz der Fläche frei wird
     
     Returns:
         Dict mit modifizierten Ausschlusszonen
@@ -144,15 +277,39 @@ def apply_zone_relaxation(ausschlusszonen_dict, unlock_zones, unlock_percentage)
     # ⚡ OPTIMIERUNG: Shallow copy, nur geänderte Zonen werden kopiert
     modified_zones = ausschlusszonen_dict.copy()
     
-    print(f"\n🔧 What-If: Entsperre {len(unlock_zones)} Zone(n) zu {unlock_percentage}%")
+    log(f"\n🔧 What-If: Entsperre {len(unlock_zones)} Zone(n) zu {unlock_percentage}%")
+    current()['zonen_entsperrt'] = len(unlock_zones)
     
     for zone_name in unlock_zones:
         if zone_name in modified_zones and modified_zones[zone_name] is not None:
             zone = modified_zones[zone_name]
             
             try:
+                # Abstandszone: Erosion = kleinerer Mindestabstand
+                # (Kreisfläche wächst mit dem Quadrat des Radius)
+                if is_distance_zone(zone):
+                    reduced = zone.copy()
+                    if mode == 'area':
+                        reduced['abstand'] = zone['abstand'] * np.sqrt(1 - unlock_percentage / 100)
+                    else:
+                        reduced['abstand'] = zone['abstand'] - MAX_EROSION_M * (unlock_percentage / 100)
+                    
+                    if (reduced['abstand'] > 0).all():
+                        modified_zones[zone_name] = reduced
+                        log(f"  ✓ {zone_name}: {unlock_percentage}% entsperrt")
+                    else:
+                        modified_zones[zone_name] = None
+                        log(f"  ✓ {zone_name}: Komplett entsperrt")
+                    continue
+                
+                # Erodiert wird die Vereinigung - bei Einzelteilen nur diese eine Zone
+                zone = dissolved_zone(zone)
+                
                 # Erode die Zone (verkleinere sie)
-                buffer_distance = -5 * (unlock_percentage / 100)
+                if mode == 'area':
+                    buffer_distance = -area_unlock_distance(zone, unlock_percentage)
+                else:
+                    buffer_distance = -MAX_EROSION_M * (unlock_percentage / 100)
                 
                 eroded = zone.copy()
                 eroded['geometry'] = zone.buffer(buffer_distance)
@@ -162,112 +319,348 @@ def apply_zone_relaxation(ausschlusszonen_dict, unlock_zones, unlock_percentage)
                 
                 if len(eroded) > 0:
                     modified_zones[zone_name] = eroded
-                    print(f"  ✓ {zone_name}: {unlock_percentage}% entsperrt")
+                    log(f"  ✓ {zone_name}: {unlock_percentage}% entsperrt")
                 else:
                     # Zone komplett entsperrt
                     modified_zones[zone_name] = None
-                    print(f"  ✓ {zone_name}: Komplett entsperrt")
+                    log(f"  ✓ {zone_name}: Komplett entsperrt")
                     
             except Exception as e:
-                print(f"  ✗ {zone_name}: Fehler - {e}")
+                log(f"  ✗ {zone_name}: Fehler - {e}")
     
     return modified_zones
 
-def find_planting_locations(ausschlusszonen_dict, bounds, grid_spacing=20):
+def _get_crs(ausschlusszonen_dict):
+    """Liefert das CRS der ersten vorhandenen Ausschlusszone"""
+    for zone in ausschlusszonen_dict.values():
+        if zone is not None:
+            return zone.crs
+    return None
+
+# Geschätzter Speicherbedarf pro Testpunkt (x, y, Maske + Zwischenarrays) in Bytes
+BYTES_PER_TESTPUNKT = 48
+
+def _zone_geometries(ausschlusszonen_dict):
+    """Sammelt die Geometrien aller vorhandenen Flächen-Ausschlusszonen (dissolvt oder nicht)"""
+    all_exclusions = []
+    for name, zone in ausschlusszonen_dict.items():
+        if zone is not None and len(zone) > 0 and not is_distance_zone(zone):
+            all_exclusions.extend(zone.geometry.values)
+    return all_exclusions
+
+# Punkte pro Nearest-Neighbour-Abfrage (begrenzt den Speicher für Punkt-Geometrien)
+DISTANCE_CHUNK = 500_000
+
+def nearest_distance(tree, x, y, max_distance=None):
     """
-    Erzeugt potenzielle Pflanzstandorte als Punktraster
-    ⚡ MASSIV OPTIMIERT: Spatial Index + Vektorisierung
+    Abstand jedes Punkts zur nächsten Geometrie im STRtree
+    
+    Returns:
+        float-Array, np.inf wo nichts innerhalb von max_distance liegt
+    """
+    distances = np.full(len(x), np.inf)
+    for start in range(0, len(x), DISTANCE_CHUNK):
+        points = shapely.points(x[start:start + DISTANCE_CHUNK], y[start:start + DISTANCE_CHUNK])
+        (point_idx, _), dist = tree.query_nearest(points, max_distance=max_distance,
+                                                  return_distance=True, all_matches=False)
+        distances[point_idx + start] = dist
+    return distances
+
+def _distance_checks(ausschlusszonen_dict):
+    """Spatial Index + Mindestabstand für jede Abstandszone"""
+    checks = []
+    for name, zone in ausschlusszonen_dict.items():
+        if is_distance_zone(zone) and len(zone) > 0:
+            checks.append((shapely.STRtree(zone.geometry.values), float(zone['abstand'].iloc[0])))
+    return checks
+
+def _distance_excluded(checks, x, y):
+    """Punkte, die näher als der Mindestabstand an einer Abstandszone liegen"""
+    excluded = np.zeros(len(x), dtype=bool)
+    for tree, abstand in checks:
+        excluded |= nearest_distance(tree, x, y, max_distance=abstand) < abstand
+    return excluded
+
+def _tile_cells(grid_spacing, tile_size=None, memory_budget_mb=256):
+    """Kantenlänge einer Kachel in Rasterzellen (aus Kachelgröße oder Speicherbudget)"""
+    if tile_size is not None:
+        return max(1, int(np.ceil(tile_size / grid_spacing)))
+    
+    max_points = memory_budget_mb * 1024 * 1024 / BYTES_PER_TESTPUNKT
+    return max(1, int(np.sqrt(max_points)))
+
+def iter_tiles(bounds, grid_spacing=20, tile_size=None, memory_budget_mb=256):
+    """
+    Zerlegt das Punktraster über bounds in Kacheln
+    
+    Die Kacheln teilen sich das globale Raster, d.h. die Punkte sind identisch
+    zum ungekachelten Lauf.
+    
+    Yields:
+        Tuple (x_coords, y_coords) mit den Rasterkoordinaten einer Kachel
+    """
+    minx, miny, maxx, maxy = bounds
+    x_coords = np.arange(minx, maxx, grid_spacing)
+    y_coords = np.arange(miny, maxy, grid_spacing)
+    
+    cells = _tile_cells(grid_spacing, tile_size, memory_budget_mb)
+    
+    for y_start in range(0, len(y_coords), cells):
+        for x_start in range(0, len(x_coords), cells):
+            yield x_coords[x_start:x_start + cells], y_coords[y_start:y_start + cells]
+
+def _tile_exclusions(parts, tree, tile_bounds):
+    """Schneidet die Ausschlusszonen auf eine Kachel zu und vereinigt sie lokal"""
+    idx = tree.query(shapely.box(*tile_bounds))
+    if len(idx) == 0:
+        return None
+    
+    clipped = shapely.clip_by_rect(parts[idx], *tile_bounds)
+    tile_union = shapely.union_all(clipped)
+    if tile_union.is_empty:
+        return None
+    
+    shapely.prepare(tile_union)
+    return tile_union
+
+def _exclusion_parts(ausschlusszonen_dict):
+    """Zerlegt alle Ausschlusszonen in ihre Einzelpolygone"""
+    return shapely.get_parts(np.array(_zone_geometries(ausschlusszonen_dict), dtype=object))
+
+def evaluate_tile(parts, tree, x_coords, y_coords, grid_spacing, distance_checks=()):
+    """
+    Testet die Rasterpunkte einer Kachel gegen die lokal vereinigten Zonenteile
+    und die Abstandszonen
+    
+    Returns:
+        Tuple (x, y) mit den geeigneten Standorten der Kachel
+    """
+    xx, yy = np.meshgrid(x_coords, y_coords)
+    xx = xx.ravel()
+    yy = yy.ravel()
+    
+    # Rand um eine Rasterweite erweitern, damit kein Punkt auf der Schnittkante liegt
+    tile_bounds = (x_coords[0] - grid_spacing, y_coords[0] - grid_spacing,
+                   x_coords[-1] + grid_spacing, y_coords[-1] + grid_spacing)
+    tile_exclusions = _tile_exclusions(parts, tree, tile_bounds)
+    
+    if tile_exclusions is not None:
+        excluded = shapely.contains_xy(tile_exclusions, xx, yy)
+        xx, yy = xx[~excluded], yy[~excluded]
+    
+    if distance_checks:
+        excluded = _distance_excluded(distance_checks, xx, yy)
+        xx, yy = xx[~excluded], yy[~excluded]
+    
+    return xx, yy
+
+def iter_planting_tiles(ausschlusszonen_dict, bounds, grid_spacing=20,
+                        tile_size=None, memory_budget_mb=256):
+    """
+    Sucht Pflanzstandorte kachelweise mit begrenztem Speicherbedarf
+    ⚡ Kein globales Meshgrid, keine globale Unary Union
     
     Args:
         ausschlusszonen_dict: Dict mit allen Ausschlusszonen
         bounds: Bounding Box [minx, miny, maxx, maxy]
         grid_spacing: Abstand zwischen Punkten in Metern
+        tile_size: Kantenlänge einer Kachel in Metern (überschreibt das Budget)
+        memory_budget_mb: Speicherbudget pro Kachel in MB
     
-    Returns:
-        GeoDataFrame mit geeigneten Pflanzstandorten
+    Yields:
+        Tuple (x, y) mit den geeigneten Standorten einer Kachel
+    """
+    # Zonen in Einzelteile zerlegen und räumlich indizieren
+    parts = _exclusion_parts(ausschlusszonen_dict)
+    tree = shapely.STRtree(parts)
+    distance_checks = _distance_checks(ausschlusszonen_dict)
+    
+    for x_coords, y_coords in iter_tiles(bounds, grid_spacing, tile_size, memory_budget_mb):
+        yield evaluate_tile(parts, tree, x_coords, y_coords, grid_spacing, distance_checks)
+
+@timed()
+def find_planting_coords(ausschlusszonen_dict, bounds, grid_spacing=20,
+                         tile_size=None, memory_budget_mb=None, workers=1):
     """
-    from shapely.geometry import Point
-    from shapely.ops import unary_union
+    Sucht Pflanzstandorte als reine Koordinaten-Arrays (ohne Shapely-Punkte)
     
-    print(f"\n🔍 Suche Pflanzstandorte (Raster: {grid_spacing}m)...")
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen oder ein ExclusionStore
+        bounds: Bounding Box [minx, miny, maxx, maxy]
+        grid_spacing: Abstand zwischen Punkten in Metern
+        tile_size: Kachelgröße in Metern - aktiviert den gekachelten Modus
+        memory_budget_mb: Speicherbudget pro Kachel in MB - aktiviert den gekachelten Modus
+        workers: Anzahl der Prozesse (None = alle Kerne, > 1 = parallel)
     
-    # ⚡ OPTIMIERUNG 1: Erstelle Punktraster mit numpy (viel schneller)
+    Returns:
+        Tuple (x, y) mit den Koordinaten der geeigneten Standorte
+    """
+    from exclusion_store import ExclusionStore
+    
+    store = None
+    if isinstance(ausschlusszonen_dict, ExclusionStore):
+        store = ausschlusszonen_dict
+        ausschlusszonen_dict = store.zones_dict(dissolve=False)
+    
+    if workers is None or workers > 1:
+        from parallel import find_planting_coords_parallel
+        return find_planting_coords_parallel(
+            ausschlusszonen_dict, bounds, grid_spacing, workers=workers, tile_size=tile_size,
+            memory_budget_mb=memory_budget_mb if memory_budget_mb is not None else 256
+        )
+    
+    log(f"\n🔍 Suche Pflanzstandorte (Raster: {grid_spacing}m)...")
+    
+    # Gekachelter Modus: Speicher wächst mit der Kachel, nicht mit der Bounding Box
+    if tile_size is not None or memory_budget_mb is not None:
+        tiles = list(iter_planting_tiles(
+            ausschlusszonen_dict, bounds, grid_spacing,
+            tile_size=tile_size,
+            memory_budget_mb=memory_budget_mb if memory_budget_mb is not None else 256
+        ))
+        xx = np.concatenate([x for x, y in tiles]) if tiles else np.empty(0)
+        yy = np.concatenate([y for x, y in tiles]) if tiles else np.empty(0)
+        log(f"  ✓ {len(xx)} geeignete Standorte gefunden ({len(tiles)} Kacheln)")
+        current().update({'standorte': len(xx), 'kacheln': len(tiles)})
+        return xx, yy
+    
+    # ⚡ OPTIMIERUNG 1: Punktraster bleibt ein numpy-Array
     minx, miny, maxx, maxy = bounds
     x_coords = np.arange(minx, maxx, grid_spacing)
     y_coords = np.arange(miny, maxy, grid_spacing)
     
-    # Erstelle Meshgrid und flatten
     xx, yy = np.meshgrid(x_coords, y_coords)
-    points = [Point(x, y) for x, y in zip(xx.ravel(), yy.ravel())]
+    xx = xx.ravel()
+    yy = yy.ravel()
     
-    print(f"  → {len(points)} Testpunkte erstellt")
+    log(f"  → {len(xx)} Testpunkte erstellt")
+    current()['punkte_getestet'] = len(xx)
     
-    # ⚡ OPTIMIERUNG 2: Kombiniere Ausschlusszonen VOR dem Check
-    all_exclusions = []
-    for name, zone in ausschlusszonen_dict.items():
-        if zone is not None and len(zone) > 0:
-            all_exclusions.append(zone.geometry.iloc[0])
-    
-    if not all_exclusions:
-        # Keine Ausschlusszonen = alle Punkte sind geeignet
-        crs = next(iter(ausschlusszonen_dict.values())).crs
-        gdf = gpd.GeoDataFrame(geometry=points, crs=crs)
-        print(f"  ✓ {len(gdf)} geeignete Standorte gefunden (keine Ausschlusszonen)")
-        return gdf
-    
-    # ⚡ OPTIMIERUNG 3: Unary union nur einmal
-    combined_exclusions = unary_union(all_exclusions)
-    
-    # ⚡ OPTIMIERUNG 4: Spatial Index für schnelle Abfragen
-    # Statt für jeden Punkt .contains() aufzurufen, nutze prepare()
-    from shapely.prepared import prep
-    prepared_exclusions = prep(combined_exclusions)
-    
-    # ⚡ OPTIMIERUNG 5: List comprehension statt Loop
-    suitable_points = [p for p in points if not prepared_exclusions.contains(p)]
-    
-    print(f"  ✓ {len(suitable_points)} geeignete Standorte gefunden")
-    
-    # Als GeoDataFrame zurückgeben
-    if suitable_points:
-        crs = next(iter(ausschlusszonen_dict.values())).crs
-        gdf = gpd.GeoDataFrame(geometry=suitable_points, crs=crs)
-        return gdf
+    # ⚡ OPTIMIERUNG 2: Keine globale Union - Zonenteile im Spatial Index (ExclusionStore)
+    if store is None:
+        store = ExclusionStore.from_zones(ausschlusszonen_dict)
+    
+    if len(store.parts) == 0 and not store.distance_checks:
+        log(f"  ✓ {len(xx)} geeignete Standorte gefunden (keine Ausschlusszonen)")
+        return xx, yy
+    
+    # ⚡ OPTIMIERUNG 3: Vektorisierte Index-Abfrage auf den Arrays,
+    # Abstandszonen per Nearest-Neighbour statt Puffer-Union
+    excluded = store.excluded_xy(xx, yy)
+    
+    log(f"  ✓ {int((~excluded).sum())} geeignete Standorte gefunden")
+    current()['standorte'] = int((~excluded).sum())
+    return xx[~excluded], yy[~excluded]
+
+@timed()
+def find_planting_locations(ausschlusszonen_dict, bounds, grid_spacing=20,
+                            tile_size=None, memory_budget_mb=None, workers=1):
+    """
+    Erzeugt potenzielle Pflanzstandorte als Punktraster
+    ⚡ MASSIV OPTIMIERT: Vektorisierter Test, Punkte nur für Treffer
+    
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen
+        bounds: Bounding Box [minx, miny, maxx, maxy]
+        grid_spacing: Abstand zwischen Punkten in Metern
+        tile_size: Kachelgröße in Metern für den gekachelten Modus
+        memory_budget_mb: Speicherbudget pro Kachel in MB für den gekachelten Modus
+        workers: Anzahl der Prozesse (None = alle Kerne, > 1 = parallel)
+    
+    Returns:
+        GeoDataFrame mit geeigneten Pflanzstandorten
+    """
+    x, y = find_planting_coords(ausschlusszonen_dict, bounds, grid_spacing,
+                                tile_size=tile_size, memory_budget_mb=memory_budget_mb,
+                                workers=workers)
+    
+    # Geometrien nur für die geeigneten Standorte erzeugen
+    if len(x) > 0:
+        crs = _get_crs(ausschlusszonen_dict)
+        return gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y), crs=crs)
     else:
         return None
     
-def calculate_tree_density_heatmap(bäume, bounds, grid_size=100):
-    """
-    Berechnet Baumdichte als Heatmap
-    ⚡ OPTIMIERT: Spatial Join statt Loop (10x schneller!)
+@timed()
+def calculate_tree_density_grid(bäume, bounds, grid_size=100):
     """
-    from shapely.geometry import box
-    import numpy as np
+    Zählt Bäume pro Rasterzelle als Histogramm
+    ⚡ OPTIMIERT: bincount auf Zellindizes statt Zell-Polygone + Spatial Join
     
-    print(f"\n🔥 Berechne Hitze-Heatmap (Raster: {grid_size}m)...")
+    Returns:
+        Dict mit 'x_coords', 'y_coords' (linke/untere Zellkanten), 'grid_size',
+        'tree_count' und 'heat_score' (Arrays der Form len(x_coords) x len(y_coords)) und 'crs'
+    """
+    log(f"\n🔥 Berechne Hitze-Heatmap (Raster: {grid_size}m)...")
     
     minx, miny, maxx, maxy = bounds
     x_coords = np.arange(minx, maxx, grid_size)
     y_coords = np.arange(miny, maxy, grid_size)
+    nx, ny = len(x_coords), len(y_coords)
     
-    # ⚡ OPTIMIERUNG 1: Erstelle alle Zellen auf einmal
-    cells = []
-    for x in x_coords:
-        for y in y_coords:
-            cells.append(box(x, y, x + grid_size, y + grid_size))
-    
-    # ⚡ OPTIMIERUNG 2: Spatial Join statt Loop
-    grid_gdf = gpd.GeoDataFrame({'geometry': cells}, crs=bäume.crs)
-    
-    # Zähle Bäume pro Zelle mit Spatial Join
-    joined = gpd.sjoin(grid_gdf, bäume, how='left', predicate='intersects')
-    tree_counts = joined.groupby(joined.index).size()
+    # ⚡ OPTIMIERUNG: Zellindex pro Baum, dann ein bincount
+    coords = shapely.get_coordinates(bäume.geometry.values)
+    ix = np.floor((coords[:, 0] - minx) / grid_size).astype(np.int64)
+    iy = np.floor((coords[:, 1] - miny) / grid_size).astype(np.int64)
+    # Bäume genau auf maxx/maxy gehören zur letzten Zelle (ist die Ausdehnung ein Vielfaches
+    # von grid_size, fiele sonst ihr Index eine Zelle hinter das Raster)
+    ix[(ix == nx) & (coords[:, 0] <= maxx)] = nx - 1
+    iy[(iy == ny) & (coords[:, 1] <= maxy)] = ny - 1
+    inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
     
-    # Fülle fehlende Zellen mit 0
-    grid_gdf['tree_count'] = tree_counts.reindex(grid_gdf.index, fill_value=0)
+    tree_count = np.bincount(ix[inside] * ny + iy[inside], minlength=nx * ny).reshape(nx, ny)
     
     # Score berechnen: 0 = viele Bäume (kühl), 1 = keine Bäume (heiß)
-    grid_gdf['heat_score'] = 1 / (1 + grid_gdf['tree_count'] * 0.1)
+    heat_score = 1 / (1 + tree_count * 0.1)
+    
+    log(f"  ✓ {nx * ny} Heatmap-Zellen berechnet")
+    current().update({'bäume': int(inside.sum()), 'zellen': nx * ny})
+    return {
+        'x_coords': x_coords,
+        'y_coords': y_coords,
+        'grid_size': grid_size,
+        'tree_count': tree_count,
+        'heat_score': heat_score,
+        'crs': bäume.crs
+    }
+
+def top_heat_cells(heat_grid, n=5, min_score=None):
+    """
+    Flache Indizes der n heißesten Zellen (wie nlargest: bei Gleichstand die ersten)
+    """
+    scores = heat_grid['heat_score'].ravel()
+    order = np.argsort(-scores, kind='stable')
+    if min_score is not None:
+        order = order[scores[order] > min_score]
+    return order[:n]
+
+def heatmap_cells(heat_grid, cell_idx=None):
+    """
+    Erzeugt Zell-Polygone nur für die gewünschten Zellen
     
-    print(f"  ✓ {len(grid_gdf)} Heatmap-Zellen berechnet")
-    return grid_gdf
\ No newline at end of file
+    Args:
+        heat_grid: Ergebnis von calculate_tree_density_grid
+        cell_idx: Flache Zellindizes (Standard: alle Zellen)
+    
+    Returns:
+        GeoDataFrame mit 'geometry', 'tree_count' und 'heat_score' (Index = Zellindex)
+    """
+    ny = len(heat_grid['y_coords'])
+    grid_size = heat_grid['grid_size']
+    if cell_idx is None:
+        cell_idx = np.arange(heat_grid['tree_count'].size)
+    
+    x0 = heat_grid['x_coords'][cell_idx // ny]
+    y0 = heat_grid['y_coords'][cell_idx % ny]
+    
+    return gpd.GeoDataFrame({
+        'tree_count': heat_grid['tree_count'].ravel()[cell_idx],
+        'heat_score': heat_grid['heat_score'].ravel()[cell_idx]
+    }, index=cell_idx, geometry=shapely.box(x0, y0, x0 + grid_size, y0 + grid_size), crs=heat_grid['crs'])
+
+def calculate_tree_density_heatmap(bäume, bounds, grid_size=100):
+    """
+    Berechnet Baumdichte als Heatmap
+    ⚡ OPTIMIERT: Histogramm statt Spatial Join, Zellen vektorisiert erzeugt
+    """
+    return heatmap_cells(calculate_tree_density_grid(bäume, bounds, grid_size))
@@ -2,9 +2,14 @@ import streamlit as st
 import geopandas as gpd
 import folium
 from streamlit_folium import st_folium
-from analysis import load_data, load_all_constraints, find_suitable_locations, calculate_stats
+from analysis import BAUM_PUFFER, load_data, calculate_stats
+import diagnostics
+import reproject
+from diagnostics import record_span, span, track_cache
 import random
+import time
 import os
+import json
 import zipfile
 import tempfile
 import shutil
@@ -25,6 +30,43 @@ def gdf_to_clean_geojson(gdf):
         ]
     }
 
+# Ab dieser Version nimmt st.download_button eine Funktion als data (erst beim Klick ausgeführt)
+DEFERRED_DOWNLOAD_VERSION = "1.52.0"
+
+def lazy_download_button(label, build, file_name, mime, key):
+    """
+    Download-Button, dessen Daten erst beim Klick erzeugt werden
+    Ab DEFERRED_DOWNLOAD_VERSION ruft Streamlit build() selbst beim Klick auf; sonst erzeugt
+    ein vorgeschalteter Button die Datei einmal und erst danach erscheint der Download.
+    
+    Args:
+        build: Funktion ohne Argumente, die den Pfad der fertigen Datei liefert
+    """
+    from packaging.version import Version
+    
+    if Version(st.__version__) >= Version(DEFERRED_DOWNLOAD_VERSION):
+        return st.download_button(label, data=lambda: build().read_bytes(), file_name=file_name, mime=mime,
+                                  key=key, on_click="ignore")
+    
+    if st.button(f"📦 {file_name} erzeugen", key=f"{key}_build"):
+        st.session_state[f"{key}_requested"] = file_name
+    if st.session_state.get(f"{key}_requested") == file_name:
+        # ⚡ Datei nur neu lesen, wenn build() eine andere liefert - nicht bei jedem Rerun
+        path = build()
+        loaded = st.session_state.get(f"{key}_data")
+        if loaded is None or loaded[0] != path:
+            loaded = st.session_state[f"{key}_data"] = (path, path.read_bytes())
+        return st.download_button(label, data=loaded[1], file_name=file_name, mime=mime, key=key)
+    return False
+
+# Detailstufen der Zonen (zone_lod.LOD_LEVELS) für die Auswahl in den Einstellungen
+ZONE_DETAIL_LABELS = {
+    'stadt': "Stadt (Zoom 13)",
+    'quartier': "Quartier (Zoom 15)",
+    'strasse': "Straße (Zoom 17)",
+    'original': "Original"
+}
+
 def get_random_color(seed):
     """Generiert eine zufällige aber konsistente Farbe"""
     random.seed(seed)
@@ -254,38 +296,290 @@ def load_custom_css():
 
 load_custom_css()
 
-@st.cache_data
-def load_all_data():
-    """Lädt und transformiert alle Daten einmal"""
+@track_cache(st.cache_data)
+def load_all_data(source_key):
+    """
+    Lädt und transformiert das Baumkataster einmal
+    source_key (Signatur der Dateien in data/) sorgt für Neuladen, sobald sich eine Datei ändert.
+    """
+    from result_cache import frame_fingerprint
+    
     bäume = load_data()
-    constraints = load_all_constraints()
     
     if bäume is not None:
-        bäume_wgs84 = bäume.to_crs(epsg=4326)
+        tree_key = frame_fingerprint(bäume)
+        bäume_wgs84 = reproject.to_crs(bäume, 4326, key=tree_key)
         stats = calculate_stats(bäume)
-        return bäume, bäume_wgs84, constraints, stats
+        return bäume, bäume_wgs84, stats, tree_key
     return None, None, None, None
 
-@st.cache_data
-def get_exclusion_zones(_bäume, _constraints, abstand_bäume, buffer_linien):
-    """Cached Berechnung der Ausschlusszonen"""
-    return find_suitable_locations(_bäume, _constraints, abstand_bäume, buffer_linien)
+def get_constraint_watcher(bäume):
+    """
+    Überwachter constraints-Ordner (ein Watcher pro Prozess, von allen Sitzungen geteilt)
+    Neue, geänderte und gelöschte Layer werden im Hintergrund einzeln nachgeladen.
+    """
+    from analysis import BBOX_MARGIN_M
+    from watcher import watch_constraints
+    
+    # Nur Geometrien im Bereich des Katasters (plus Rand für Linien-Buffer)
+    minx, miny, maxx, maxy = bäume.total_bounds
+    bbox = (minx - BBOX_MARGIN_M, miny - BBOX_MARGIN_M, maxx + BBOX_MARGIN_M, maxy + BBOX_MARGIN_M)
+    return watch_constraints("constraints", bbox=bbox, bbox_crs=bäume.crs.to_string())
+
+def rerun_on_constraint_change(watcher, version):
+    """Startet die App neu, sobald der Watcher einen neueren Stand als version hat"""
+    if watcher.version != version:
+        st.rerun()
+
+# ⚡ Als Fragment prüft jede Sitzung alle WATCH_INTERVAL Sekunden nur die Versionsnummer -
+# nachgeladene Layer erscheinen ohne Interaktion (st.fragment gibt es ab Streamlit 1.37)
+if hasattr(st, 'fragment'):
+    from watcher import WATCH_INTERVAL
+    rerun_on_constraint_change = st.fragment(run_every=WATCH_INTERVAL)(rerun_on_constraint_change)
+
+@track_cache(st.cache_data)
+def get_tree_zone(_bäume, tree_key, abstand_bäume):
+    """
+    Cached Baum-Puffer (im Speicher + auf der Festplatte)
+    ⚡ Ein Kreis pro Baum ohne Dissolve - Maske, Distanzfeld und Karte lesen alle Zeilen
+    """
+    from analysis import tree_zone
+    from result_cache import disk_cached
+    return disk_cached('tree_zone', (tree_key, abstand_bäume, 'parts'),
+                       lambda: tree_zone(_bäume, abstand_bäume, 'buffer', dissolve=False))
+
+@track_cache(st.cache_data)
+def get_layer_zone(_layer, layer_key, name, crs_key, buffer_linien):
+    """Cached Zone eines einzelnen Constraint-Layers (Einzelteile ohne Dissolve, im Speicher + auf der Festplatte)"""
+    from analysis import constraint_zone
+    from result_cache import disk_cached
+    
+    def compute():
+        try:
+            return constraint_zone(_layer, crs_key, buffer_linien, name, dissolve=False)
+        except Exception as e:
+            diagnostics.log(f"  ✗ Fehler bei {name}: {e}")
+            return None
+    
+    return disk_cached('layer_zone', (layer_key, crs_key, buffer_linien, 'parts'), compute)
+
+@track_cache(st.cache_data)
+def get_zone_lod(_zone, zone_key, level):
+    """
+    Cached Kartenversion einer Zone (vereinfacht + WGS84, im Speicher + auf der Festplatte)
+    Abstandszonen (Baumpunkte) werden dafür als Kreise um die Punkte gezeichnet.
+    """
+    from analysis import distance_zone_polygons, is_distance_zone
+    from result_cache import disk_cached
+    from zone_lod import LOD_LEVELS, zone_lod
+    
+    if not is_distance_zone(_zone):
+        return disk_cached('zone_lod', (zone_key, level, LOD_LEVELS.get(level)), lambda: zone_lod(_zone, level))
+    
+    # Der Mindestabstand steckt im Abstandsmodus nicht in zone_key
+    abstand = float(_zone['abstand'].iloc[0])
+    return disk_cached('zone_lod', (zone_key, abstand, level, LOD_LEVELS.get(level)),
+                       lambda: zone_lod(distance_zone_polygons(_zone), level))
+
+def get_zones(bäume, constraints, layer_keys, abstand_bäume, buffer_linien, tree_mode):
+    """
+    Ausschlusszonen für die aktuellen Einstellungen
+    Jede Zone ist einzeln gecacht - ein neuer oder geänderter Layer berechnet nur seine
+    eigene Zone. Im Abstandsmodus hängt nur die (billige) Baum-Zone am Mindestabstand.
+    
+    Returns:
+        Tuple (zones, zone_keys): Zonen-Dict und ein Schlüssel pro Zone (Daten + Parameter)
+    """
+    from analysis import BAUM_PUFFER, make_distance_zone
+    
+    tree_key = layer_keys[BAUM_PUFFER]
+    if tree_mode == 'distance':
+        zones = {BAUM_PUFFER: make_distance_zone(bäume, abstand_bäume)}
+        # Das Distanzfeld speichert Abstände - Schlüssel unabhängig vom Mindestabstand
+        zone_keys = {BAUM_PUFFER: (tree_key, tree_mode)}
+    else:
+        zones = {BAUM_PUFFER: get_tree_zone(bäume, tree_key, abstand_bäume)}
+        zone_keys = {BAUM_PUFFER: (tree_key, tree_mode, abstand_bäume)}
+    
+    crs_key = bäume.crs.to_string()
+    for name, layer in constraints.items():
+        if layer is None or len(layer) == 0:
+            continue
+        zone = get_layer_zone(layer, layer_keys[name], name, crs_key, buffer_linien)
+        if zone is not None:
+            zones[name] = zone
+            zone_keys[name] = (layer_keys[name], buffer_linien)
+    
+    return zones, tuple(sorted(zone_keys.items()))
+
+@st.cache_resource
+def latest_results():
+    """
+    Zuletzt berechnetes Feld bzw. Maske pro Ausdehnung und Raster - Ausgangspunkt für
+    inkrementelle Updates (ein Eintrag pro Schlüssel, mit Lock, ältere werden ersetzt)
+    """
+    from result_cache import LatestResults
+    return LatestResults(max_per_kind=2)
 
-@st.cache_data
-def compute_planting_locations(_zones_dict, bounds, grid_spacing, unlock_zones_tuple, unlock_percentage):
-    """Cached Berechnung der Pflanzstandorte"""
-    from analysis import find_planting_locations, apply_zone_relaxation
+@st.cache_resource
+def get_tile_server():
+    """Kachel-Server für die Karte (einer pro Prozess, von allen Sitzungen geteilt)"""
+    from tile_server import TileServer
+    return TileServer()
+
+def tiles_reachable():
+    """
+    Erreicht der Browser den Kachel-Server? Ja, wenn CITY_FOREST_TILE_URL gesetzt ist oder
+    die App selbst über localhost aufgerufen wird - sonst zeigt die Standard-Adresse
+    http://127.0.0.1:<port> auf den Rechner des Nutzers (bzw. wird unter HTTPS blockiert)
+    """
+    from tile_server import TILE_URL
+    
+    if TILE_URL:
+        return True
+    # st.context gibt es erst in neueren Streamlit-Versionen
+    context = getattr(st, 'context', None)
+    host = context.headers.get('Host', '') if context is not None else ''
+    return host.rsplit(':', 1)[0].strip('[]') in ('localhost', '127.0.0.1', '::1')
+
+@track_cache(st.cache_resource)
+def get_base_field(_zones_dict, zone_keys, bounds, grid_spacing):
+    """
+    Cached Distanzfeld pro Rasterabstand (cache_resource: große Arrays werden nicht kopiert)
+    Gibt es schon ein Feld für dieses Raster, werden nur die geänderten Zonen eingearbeitet.
+    """
+    from candidates import build_relaxation_field, update_field
+    from result_cache import combine_fingerprints, disk_cached
+    
+    registry_key = ('field', tuple(bounds), grid_spacing)
+    previous = latest_results().get(registry_key)
+    
+    def compute():
+        if previous is None:
+            return build_relaxation_field(_zones_dict, bounds, grid_spacing)
+        field, previous_keys = previous
+        old, new = dict(previous_keys), dict(zone_keys)
+        changed = sorted(name for name in set(old) | set(new) if old.get(name) != new.get(name))
+        return update_field(field, _zones_dict, changed)
+    
+    field = disk_cached('field', (combine_fingerprints(dict(zone_keys)), list(bounds), grid_spacing), compute)
+    latest_results().put(registry_key, (field, zone_keys))
+    return field
+
+@track_cache(st.cache_resource, max_entries=8)
+def get_relaxation_field(_zones_dict, zone_keys, bounds, grid_spacing, abstand_bäume, tree_mode='buffer'):
+    """
+    Distanzfeld für die aktuellen Einstellungen
+    Im Abstandsmodus wird der Baumabstand nur per Schwellwert umgestellt.
+    """
+    from analysis import BAUM_PUFFER
+    from candidates import with_zone_distance
+    
+    field = get_base_field(_zones_dict, zone_keys, bounds, grid_spacing)
+    if tree_mode != 'distance':
+        return field
+    return with_zone_distance(field, BAUM_PUFFER, abstand_bäume)
+
+def compute_planting_scenario(zones_dict, zone_keys, bounds, grid_spacing, abstand_bäume, tree_mode,
+                              unlock_zones_tuple, unlock_percentage, unlock_mode='buffer'):
+    """Basis + What-If aus dem Distanzfeld - What-If ist nur noch ein Schwellwert-Vergleich"""
+    from candidates import planting_scenario_field
     
-    unlock_zones = list(unlock_zones_tuple)
-    modified_zones = apply_zone_relaxation(_zones_dict, unlock_zones, unlock_percentage)
+    field = get_relaxation_field(zones_dict, zone_keys, bounds, grid_spacing, abstand_bäume, tree_mode)
+    return planting_scenario_field(field, list(unlock_zones_tuple), unlock_percentage, unlock_mode)
+
+@track_cache(st.cache_resource, max_entries=2)
+def get_exclusion_mask(_zones_dict, zone_keys, bounds, resolution, tree_abstand=None):
+    """
+    Cached Ausschluss-Maske pro Zonen-Stand und Auflösung (cache_resource: große Arrays werden nicht kopiert)
+    What-If-Szenarien nutzen dieselbe Maske - entsperrt wird nur im Ausschnitt der Zonen.
+    Sind seit der letzten Maske nur Zonen hinzugekommen, werden nur diese eingebrannt.
+    
+    tree_abstand: Mindestabstand der Abstandszone (Bäume), sonst None - er steckt im Abstandsmodus
+    nicht in zone_keys, die Maske hängt aber davon ab
+    """
+    from raster_mask import add_zone_to_mask, build_exclusion_mask
+    
+    registry_key = ('mask', tuple(bounds), resolution)
+    mask_keys = (zone_keys, tree_abstand)
+    previous = latest_results().get(registry_key)
+    
+    added = None
+    if previous is not None and previous[1][1] == tree_abstand:
+        old, new = dict(previous[1][0]), dict(zone_keys)
+        if all(new.get(name) == key for name, key in old.items()):
+            added = [name for name in new if name not in old]
+    
+    if added is not None:
+        mask_info = previous[0]
+        for name in added:
+            mask_info = add_zone_to_mask(mask_info, _zones_dict[name])
+    else:
+        mask_info = build_exclusion_mask(_zones_dict, bounds, resolution)
     
-    return find_planting_locations(modified_zones, bounds, grid_spacing)
+    latest_results().put(registry_key, (mask_info, mask_keys))
+    return mask_info
+
+@track_cache(st.cache_resource, max_entries=16)
+def get_zone_depth_raster(_zone, zone_key, bounds, resolution, grid_spacing):
+    """
+    Cached Abdeckung und Randtiefe einer entsperrbaren Zone auf dem Pflanzraster
+    Hängt nicht vom Prozentwert ab - der What-If-Regler ändert danach nur noch den Schwellwert.
+    """
+    from raster_mask import zone_depth_raster
+    return zone_depth_raster(_zone, bounds, resolution, grid_spacing)
+
+@track_cache(st.cache_resource, max_entries=4)
+def get_raster_scenario(_zones_dict, zone_keys, bounds, resolution, tree_abstand, grid_spacing,
+                        unlock_zones_tuple, unlock_percentage, unlock_mode):
+    """Cached Basis + What-If-Szenario auf dem Pflanzraster (nur Raster-Arrays, nicht die Maske)"""
+    from raster_mask import planting_scenario_raster
+    
+    mask_info = get_exclusion_mask(_zones_dict, zone_keys, bounds, resolution, tree_abstand)
+    keys = dict(zone_keys)
+    zone_depths = {}
+    if unlock_percentage > 0:
+        zone_depths = {
+            name: get_zone_depth_raster(_zones_dict[name], keys.get(name), bounds, resolution, grid_spacing)
+            for name in unlock_zones_tuple
+            if _zones_dict.get(name) is not None and len(_zones_dict[name]) > 0
+        }
+    return planting_scenario_raster(mask_info, zone_depths, grid_spacing, list(unlock_zones_tuple),
+                                    unlock_percentage, unlock_mode)
+
+def compute_planting_scenario_fast(zones_dict, zone_keys, bounds, grid_spacing, abstand_bäume, tree_mode,
+                                   unlock_zones_tuple, unlock_percentage, unlock_mode, resolution):
+    """Basis + What-If aus der Raster-Maske - ein Array-Zugriff pro Rasterabstand"""
+    return get_raster_scenario(zones_dict, zone_keys, bounds, resolution,
+                               abstand_bäume if tree_mode == 'distance' else None, grid_spacing,
+                               unlock_zones_tuple, unlock_percentage, unlock_mode)
+
+def scenario_points(scenario, selected):
+    """Rasterpunkte eines Szenarios als GeoDataFrame (selected: bool-Maske oder Indizes)"""
+    return gpd.GeoDataFrame(geometry=gpd.points_from_xy(scenario['x'][selected], scenario['y'][selected]),
+                            crs=scenario['crs'])
+
+@track_cache(st.cache_data)
+def compute_heatmap(_bäume, tree_key, bounds, grid_size):
+    """Cached Heatmap-Berechnung (nur Zählraster, keine Zell-Polygone)"""
+    from analysis import calculate_tree_density_grid
+    return calculate_tree_density_grid(_bäume, bounds, grid_size)
+
+def heat_colormap():
+    """Farbskala der Hitze-Heatmap (Rasterbild und Legende)"""
+    import branca.colormap as cm
+    return cm.LinearColormap(
+        colors=['blue', 'cyan', 'yellow', 'orange', 'red'],
+        vmin=0,
+        vmax=1,
+        caption='Hitze-Score (0=kühl, 1=heiß)'
+    )
 
-@st.cache_data
-def compute_heatmap(_bäume, bounds, grid_size):
-    """Cached Heatmap-Berechnung"""
-    from analysis import calculate_tree_density_heatmap
-    return calculate_tree_density_heatmap(_bäume, bounds, grid_size)
+@track_cache(st.cache_data)
+def get_heat_image(_heatmap, tree_key, bounds, grid_size):
+    """Cached Rasterbild der Heatmap (alle Zellen in einem PNG)"""
+    from heat_raster import heat_image
+    return heat_image(_heatmap, heat_colormap())
 
 # ✨ CUSTOM HEADER
 st.markdown("""
@@ -298,13 +592,18 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Ereignisse ab hier gehören zu diesem Rerun dieser Sitzung (für das Diagnose-Panel)
+run_id = diagnostics.start_run()
+
 # Sidebar - Basis-Einstellungen
 st.sidebar.markdown("### ⚙️ Haupteinstellungen")
 st.sidebar.markdown("---")
 
-# Standardwerte für die Slider (werden später unten gesetzt)
-buffer_linien = 10
-abstand_bäume = 5
+# Werte der Slider unter "Erweiterte Einstellungen" (stehen weiter unten,
+# werden aber schon hier für die Berechnung gebraucht)
+buffer_linien = st.session_state.get('buffer_linien', 10)
+abstand_bäume = st.session_state.get('abstand_bäume', 5)
+tree_mode = 'distance' if st.session_state.get('tree_distance_mode', True) else 'buffer'
 
 with st.sidebar.expander("📥 Constraints hochladen", expanded=False):
     st.caption("Lade neue Ausschlusszonen hoch")
@@ -353,12 +652,10 @@ with st.sidebar.expander("📥 Constraints hochladen", expanded=False):
                                 shutil.copy2(source_file, dest_file)
                     
                     st.success("✅ Import erfolgreich!")
-                    st.info("🔄 Lade Seite neu (F5) um Daten zu aktualisieren")
                     
-                    # Automatisch neu laden nach 2 Sekunden
-                    import time
-                    time.sleep(2)
-                    st.cache_data.clear()
+                    # Kein Cache-Reset: der Watcher lädt nur die neue Datei nach,
+                    # berechnet wird nur deren Zone (alle anderen bleiben warm)
+                    st.session_state['poll_constraints'] = True
                     st.rerun()
             else:
                 st.error("❌ Keine .shp Dateien gefunden!")
@@ -366,17 +663,37 @@ with st.sidebar.expander("📥 Constraints hochladen", expanded=False):
 
 # Daten laden
 with st.spinner("Lade Geodaten..."):
-    bäume, bäume_wgs84, constraints, stats = load_all_data()
+    from geo_cache import folder_signature
+    bäume, bäume_wgs84, stats, tree_key = load_all_data(json.dumps(folder_signature("data")))
+    
+    if bäume is not None:
+        watcher = get_constraint_watcher(bäume)
+        if st.session_state.pop('poll_constraints', False):
+            watcher.poll()
+        constraints, layer_keys, constraints_version = watcher.snapshot()
+        layer_keys = {BAUM_PUFFER: tree_key, **layer_keys}
+        
+        # Hinweis, wenn der Watcher seit dem letzten Lauf dieser Sitzung Layer nachgeladen hat
+        # (alle Versionen seitdem, nicht nur die letzte)
+        seen_version = st.session_state.get('constraints_version')
+        if seen_version is not None and seen_version != constraints_version:
+            changes = watcher.changes_since(seen_version)
+            changed = [f"{name} ({kind})" for kind, names in changes.items() for name in names]
+            if changed:
+                st.toast(f"🔄 Constraints aktualisiert: {', '.join(changed)}")
+        st.session_state['constraints_version'] = constraints_version
+        
+        if hasattr(st, 'fragment'):
+            rerun_on_constraint_change(watcher, constraints_version)
+        else:
+            st.sidebar.caption("🔄 Neue oder geänderte Constraints erscheinen bei der nächsten Interaktion")
 
 if bäume is not None:
     # Ausschlusszonen berechnen
     with st.spinner(f"Berechne Ausschlusszonen..."):
-        ausschlusszonen_dict = get_exclusion_zones(bäume, constraints, abstand_bäume, buffer_linien)
-        
-        ausschlusszonen_wgs84 = {}
-        for key, zone in ausschlusszonen_dict.items():
-            if zone is not None:
-                ausschlusszonen_wgs84[key] = zone.to_crs(epsg=4326)
+        ausschlusszonen_dict, zone_keys = get_zones(bäume, constraints, layer_keys, abstand_bäume, buffer_linien,
+                                                    tree_mode)
+
     
     # ✅ DASHBOARD OBEN in Sidebar
     st.sidebar.markdown("---")
@@ -413,7 +730,16 @@ if bäume is not None:
         disabled=len(unlock_zones) == 0
     ) if unlock_zones else 0
     
+    unlock_mode = 'buffer'
     if unlock_zones:
+        unlock_mode_label = st.sidebar.radio(
+            "Bedeutung des Prozentwerts:",
+            options=["Flächenanteil der Zone", "Randstreifen (100% = 5 m)"],
+            index=1,
+            help="Flächenanteil: genau so viel Prozent der Zonenfläche werden frei. "
+                 "Randstreifen: die Zone wird vom Rand her um bis zu 5 m verkleinert."
+        )
+        unlock_mode = 'area' if unlock_mode_label.startswith("Fläche") else 'buffer'
         st.sidebar.info(f"💡 {unlock_percentage}% von {len(unlock_zones)} Zone(n) entsperrt")
     
     
@@ -422,77 +748,128 @@ if bäume is not None:
     st.sidebar.markdown("---")
     show_planting_locations = st.sidebar.checkbox("🌱 Zeige Pflanzstandorte", value=True)
     
-    planting_locations_wgs84 = None
-    original_locations_wgs84 = None
+    planting_scenario = None
+    baseline_locations_wgs84 = None
+    added_locations_wgs84 = None
+    removed_locations_wgs84 = None
+    planting_count = 0
+    delta = 0
     
     if show_planting_locations:
         grid_spacing = st.sidebar.slider(
             "Rasterabstand (m)", 
-            min_value=15,  
+            min_value=10,  
             max_value=50, 
             value=25,  
-            help="Kleinerer Wert = mehr Punkte (langsamer). Empfohlen: 20-30m"
+            help="Kleinerer Wert = mehr Punkte (langsamer). Empfohlen: 10-30m"
+        )
+        
+        fast_mode = st.sidebar.checkbox(
+            "⚡ Schnellmodus (Raster-Maske)",
+            value=True,
+            help="Zonen einmal als Maske rastern - Rasterabstand ändern ist dann sofort fertig"
         )
         
+        mask_resolution = 1.0
+        if fast_mode:
+            mask_resolution = st.sidebar.select_slider(
+                "Masken-Auflösung (m)",
+                options=[0.5, 1.0, 2.0, 5.0],
+                value=1.0,
+                help="Feiner = genauer, aber mehr Speicher"
+            )
+            from raster_mask import mask_error_bound
+            error_bound = mask_error_bound({'resolution': mask_resolution}, grid_spacing)
+            st.sidebar.caption(f"📐 Max. Lageabweichung zur exakten Berechnung: {error_bound:.2f} m")
+        
+        scenario_fn = compute_planting_scenario
+        scenario_args = ()
+        if fast_mode:
+            scenario_fn = compute_planting_scenario_fast
+            scenario_args = (mask_resolution,)
+        
         with st.spinner("Berechne Pflanzstandorte..."):
-            # Berechne aktuelle Standorte (mit What-If)
-            planting_locations = compute_planting_locations(
+            # ⚡ OPTIMIERUNG: Ein Aufruf liefert Basis und What-If - die Basis wird nicht ein
+            # zweites Mal berechnet, das Szenario ist nur das Delta im Fußabdruck der Zonen
+            planting_scenario = scenario_fn(
                 ausschlusszonen_dict,
+                zone_keys,
                 stats['bounds'],
                 grid_spacing,
+                abstand_bäume,
+                tree_mode,
                 tuple(unlock_zones),
-                unlock_percentage
+                unlock_percentage,
+                unlock_mode,
+                *scenario_args
             )
             
-            if planting_locations is not None:
-                planting_locations_wgs84 = planting_locations.to_crs(epsg=4326)
+            added_idx = planting_scenario['delta']['added']
+            removed_idx = planting_scenario['delta']['removed']
+            delta = len(added_idx) - len(removed_idx)
+            planting_count = int(planting_scenario['suitable'].sum())
+            
+            # Basis hängt nicht vom What-If ab - projiziert wird sie nur einmal pro Zonen-Stand und Raster
+            baseline_key = ('baseline', zone_keys, abstand_bäume, tree_mode, tuple(stats['bounds']), grid_spacing,
+                            mask_resolution if fast_mode else None)
+            baseline_locations_wgs84 = reproject.to_crs(
+                scenario_points(planting_scenario, planting_scenario['baseline']), 4326, key=baseline_key)
+            
+            # ✅ WHAT-IF IMPACT - PROMINENT
+            if unlock_zones and unlock_percentage > 0:
+                from candidates import delta_locations
+                
+                added_locations, removed_locations = delta_locations(planting_scenario, planting_scenario['delta'])
+                added_locations_wgs84 = reproject.to_crs(added_locations, 4326)
+                removed_locations_wgs84 = reproject.to_crs(removed_locations, 4326)
                 
-                # ✅ WHAT-IF IMPACT - PROMINENT
-                if unlock_zones and unlock_percentage > 0:
-                    original_locations = compute_planting_locations(
-                        ausschlusszonen_dict,
-                        stats['bounds'],
-                        grid_spacing,
-                        tuple([]),
-                        0
-                    )
+                # ✅ PROMINENT Impact Box
+                st.sidebar.markdown("---")
+                st.sidebar.markdown("### 🎯 What-If Impact")
+                
+                if delta > 0:
+                    col1, col2 = st.sidebar.columns(2)
+                    with col1:
+                        st.metric(
+                            "Neue Standorte", 
+                            f"{planting_count:,}",
+                            delta=f"+{delta}",
+                            delta_color="normal"
+                        )
+                    with col2:
+                        co2_gain = delta * 22
+                        st.metric(
+                            "CO₂/Jahr", 
+                            f"{co2_gain/1000:.1f} t",
+                            delta=f"+{co2_gain:,} kg",
+                            delta_color="normal"
+                        )
                     
-                    if original_locations is not None:
-                        original_locations_wgs84 = original_locations.to_crs(epsg=4326)
-                        delta = len(planting_locations) - len(original_locations)
-                        
-                        # ✅ PROMINENT Impact Box
-                        st.sidebar.markdown("---")
-                        st.sidebar.markdown("### 🎯 What-If Impact")
-                        
-                        if delta > 0:
-                            col1, col2 = st.sidebar.columns(2)
-                            with col1:
-                                st.metric(
-                                    "Neue Standorte", 
-                                    f"{len(planting_locations):,}",
-                                    delta=f"+{delta}",
-                                    delta_color="normal"
-                                )
-                            with col2:
-                                co2_gain = delta * 22
-                                st.metric(
-                                    "CO₂/Jahr", 
-                                    f"{co2_gain/1000:.1f} t",
-                                    delta=f"+{co2_gain:,} kg",
-                                    delta_color="normal"
-                                )
-                            
-                            # Trade-off Visualisierung
-                            st.sidebar.progress(unlock_percentage / 100)
-                            st.sidebar.caption(f"💡 {unlock_percentage}% der Zone(n) genutzt = **+{delta} Bäume**")
-                            
-                        elif delta < 0:
-                            st.sidebar.error(f"⚠️ {abs(delta)} Standorte weniger")
-                        else:
-                            st.sidebar.info("ℹ️ Keine Änderung")
+                    # Trade-off Visualisierung
+                    st.sidebar.progress(unlock_percentage / 100)
+                    st.sidebar.caption(f"💡 {unlock_percentage}% der Zone(n) genutzt = **+{delta} Bäume**")
+                    
+                elif delta < 0:
+                    st.sidebar.error(f"⚠️ {abs(delta)} Standorte weniger")
                 else:
-                    st.sidebar.success(f"✓ {len(planting_locations_wgs84):,} Standorte gefunden")
+                    st.sidebar.info("ℹ️ Keine Änderung")
+            else:
+                st.sidebar.success(f"✓ {planting_count:,} Standorte gefunden")
+        
+        # Pro Zone: wie viele Rasterpunkte blockiert sie (Bitmaske aus dem Distanzfeld)
+        # Streamlit führt den Inhalt auch zugeklappt aus - im Schnellmodus gibt es das Feld
+        # noch nicht, es wird deshalb nur auf Anforderung gebaut
+        with st.sidebar.expander("🚫 Blockiert durch", expanded=False):
+            if fast_mode and not st.checkbox("Zählung berechnen (exaktes Distanzfeld)", value=False,
+                                             key="blocked_counts"):
+                st.caption("Im Schnellmodus wird das Distanzfeld nur auf Anforderung berechnet")
+            else:
+                from candidates import blocked_counts
+                
+                field = get_relaxation_field(ausschlusszonen_dict, zone_keys, stats['bounds'], grid_spacing,
+                                             abstand_bäume, tree_mode)
+                st.dataframe(blocked_counts(field).sort_values('blockiert', ascending=False))
+                st.caption("nur_diese_zone = Standorte, die frei würden, wenn nur diese Zone entfiele")
     
     # Prioritäts-Heatmap Optionen
     st.sidebar.markdown("---")
@@ -503,82 +880,87 @@ if bäume is not None:
     if show_heatmap:
         heatmap_grid_size = st.sidebar.slider(
             "Heatmap Rasterweite (m)",
-            min_value=50,
+            min_value=25,
             max_value=300,
             value=150,
-            step=50,
+            step=25,
             help="Größere Zellen = schneller, aber gröber"
         )
     
     # Hitze-Heatmap berechnen
-    heatmap_wgs84 = None
+    heatmap = None
     if show_heatmap:
         with st.spinner("Berechne Hitze-Heatmap..."):
-            heatmap = compute_heatmap(bäume, stats['bounds'], heatmap_grid_size)
+            from analysis import top_heat_cells
+            heatmap = compute_heatmap(bäume, layer_keys[BAUM_PUFFER], stats['bounds'], heatmap_grid_size)
             
             if heatmap is not None:
-                heatmap_wgs84 = heatmap.to_crs(epsg=4326)
-                
-                top_hotspots = heatmap.nlargest(5, 'heat_score')
+                # ⚡ Top-Hotspots direkt aus den Arrays, ohne Zell-Polygone
+                heat_scores = heatmap['heat_score'].ravel()
+                tree_counts = heatmap['tree_count'].ravel()
                 st.sidebar.markdown("---")
                 st.sidebar.markdown("#### 🔥 Top 5 Hitze-Hotspots")
-                for idx, row in top_hotspots.iterrows():
-                    st.sidebar.text(f"Score: {row['heat_score']:.2f} | {row['tree_count']} Bäume")
+                for cell in top_heat_cells(heatmap, 5):
+                    st.sidebar.text(f"Score: {heat_scores[cell]:.2f} | {tree_counts[cell]} Bäume")
 
     # Export & Berichte
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 📥 Export & Berichte")
     
-    # ===== GeoJSON/CSV Export =====
-    if planting_locations_wgs84 is not None and len(planting_locations_wgs84) > 0:
+    # ===== Export (wird erst auf Anforderung erzeugt) =====
+    if planting_count > 0:
         with st.sidebar.expander("💾 Standorte exportieren", expanded=False):
-            st.caption(f"Exportiere {len(planting_locations_wgs84):,} Pflanzstandorte")
+            from exports import EXPORT_FORMATS, cached_export, export_mime, export_name
             
-            # GeoJSON Export
-            geojson_str = planting_locations_wgs84.to_json()
+            st.caption(f"Exportiere {planting_count:,} Pflanzstandorte")
             
-            st.download_button(
-                label="📍 Download GeoJSON",
-                data=geojson_str,
-                file_name=f"heilbronn_pflanzstandorte_{len(planting_locations_wgs84)}.geojson",
-                mime="application/json",
-                help="Für QGIS, ArcGIS, Google Maps",
-                key="download_geojson"
+            export_format = st.selectbox(
+                "Format",
+                options=list(EXPORT_FORMATS),
+                format_func=lambda f: EXPORT_FORMATS[f]['label'],
+                help="GeoJSON/CSV für QGIS, Excel, Google Maps - GeoParquet/FlatGeobuf kompakt für große Ergebnisse",
+                key="export_format"
+            )
+            export_compression = st.selectbox(
+                "Kompression",
+                options=[None] + EXPORT_FORMATS[export_format]['compression'],
+                format_func=lambda c: c or "keine",
+                key=f"export_compression_{export_format}"
             )
             
-            # CSV Export
-            import pandas as pd
-            csv_data = pd.DataFrame({
-                'id': range(1, len(planting_locations_wgs84) + 1),
-                'latitude': planting_locations_wgs84.geometry.y,
-                'longitude': planting_locations_wgs84.geometry.x,
+            # Gleiche Zusatzspalten für alle Formate
+            export_attributes = {
                 'whatif_aktiv': 'Ja' if (unlock_zones and unlock_percentage > 0) else 'Nein',
                 'entsperrte_zonen': ', '.join(unlock_zones) if unlock_zones else 'Keine'
-            })
+            }
+            suitable = planting_scenario['suitable']
             
-            st.download_button(
-                label="📊 Download CSV",
-                data=csv_data.to_csv(index=False),
-                file_name=f"heilbronn_standorte_{len(planting_locations_wgs84)}.csv",
-                mime="text/csv",
-                help="Für Excel, Google Sheets",
-                key="download_csv"
-            )
+            def build_export():
+                """Schreibt die Datei blockweise in den Export-Cache (nur beim ersten Download)"""
+                return cached_export(planting_scenario['x'][suitable], planting_scenario['y'][suitable],
+                                     planting_scenario['crs'], export_format, export_compression,
+                                     export_attributes)
             
-            st.success(f"✅ {len(planting_locations_wgs84):,} Standorte bereit zum Export")
+            lazy_download_button(
+                f"📍 Download {EXPORT_FORMATS[export_format]['label']}",
+                build_export,
+                file_name=export_name(f"heilbronn_pflanzstandorte_{planting_count}", export_format,
+                                      export_compression),
+                mime=export_mime(export_format, export_compression),
+                key="download_sites"
+            )
     
     # ===== Email-Template =====
     with st.sidebar.expander("✉️ Email-Vorlage", expanded=False):
         st.caption("Erstelle Email für Stadtplanung")
         
         # Email-Text generieren
-        standorte_count = len(planting_locations_wgs84) if planting_locations_wgs84 is not None else 0
+        standorte_count = planting_count
         co2_gesamt = standorte_count * 22
         
         # Delta für What-If
         delta_text = ""
-        if unlock_zones and unlock_percentage > 0 and original_locations_wgs84 is not None:
-            delta = len(planting_locations_wgs84) - len(original_locations_wgs84)
+        if unlock_zones and unlock_percentage > 0 and planting_scenario is not None:
             delta_co2 = delta * 22
             delta_text = f"""
 WHAT-IF SZENARIO:
@@ -653,7 +1035,8 @@ Future City Hackathon 2025
         baeume = delta
         
         st.sidebar.metric("Trade-off", f"{parkplaetze} Parkplätze = {baeume} Bäume")
-        st.sidebar.caption(f"Das sind {int(baeume/parkplaetze*100)}% mehr Schattenfläche!")
+        if parkplaetze > 0:
+            st.sidebar.caption(f"Das sind {int(baeume/parkplaetze*100)}% mehr Schattenfläche!")
     
     # ===== ERWEITERTE EINSTELLUNGEN (GANZ UNTEN) =====
     st.sidebar.markdown("---")
@@ -665,7 +1048,8 @@ Future City Hackathon 2025
             min_value=5, 
             max_value=20, 
             value=10,
-            help="Sicherheitsabstand zu Linien wie Straßen, Leitungen etc."
+            help="Sicherheitsabstand zu Linien wie Straßen, Leitungen etc.",
+            key="buffer_linien"
         )
         
         abstand_bäume = st.slider(
@@ -673,13 +1057,76 @@ Future City Hackathon 2025
             min_value=2, 
             max_value=10, 
             value=5,
-            help="Minimaler Abstand zwischen neuen Pflanzungen und existierenden Bäumen"
+            help="Minimaler Abstand zwischen neuen Pflanzungen und existierenden Bäumen",
+            key="abstand_bäume"
+        )
+        
+        st.checkbox(
+            "⚡ Baumabstand per Nearest-Neighbour",
+            value=True,
+            help="Prüft den Abstand direkt zu den Baumpunkten statt alle Baum-Puffer zu vereinigen - "
+                 "der Mindestabstand lässt sich dann ohne Neuberechnung ändern",
+            key="tree_distance_mode"
         )
         
         st.info("💡 Diese Werte beeinflussen die Berechnung der Ausschlusszonen")
+        
+        zone_detail = st.select_slider(
+            "Detailgrad der Zonen auf der Karte",
+            options=list(ZONE_DETAIL_LABELS),
+            value='quartier',
+            format_func=ZONE_DETAIL_LABELS.get,
+            help="Zonen werden für die Karte vereinfacht und gerundet (einmal berechnet, dann gecacht). "
+                 "Bis zur genannten Zoomstufe ist kein Unterschied zum Original sichtbar",
+            key="zone_detail"
+        )
+        
+        use_vector_tiles = st.checkbox(
+            "🧩 Vektor-Kacheln (lokaler Kachel-Server)",
+            value=tiles_reachable(),
+            help="Die Karte lädt Bäume, Standorte und Zonen kachelweise statt alles in die Seite "
+                 "einzubetten. Standardmäßig nur aktiv, wenn die App über localhost läuft oder "
+                 "CITY_FOREST_TILE_URL gesetzt ist - sonst erreicht der Browser den Server nicht",
+            key="vector_tiles"
+        )
    
     # Karte
     
+    # ⚡ OPTIMIERUNG: Alle Punkte einer Ebene als ein Canvas-Layer (ein Koordinaten-Array statt
+    # eines CircleMarkers pro Zeile) - kein Sampling mehr nötig
+    from map_layers import CanvasPoints, VectorTiles
+    
+    # ⚡ OPTIMIERUNG: Mit Kachel-Server lädt der Browser nur sichtbare, vereinfachte Kacheln
+    tile_server = None
+    if use_vector_tiles:
+        try:
+            tile_server = get_tile_server()
+        except OSError as e:
+            st.warning(f"⚠ Kachel-Server nicht verfügbar ({e}) - Karte wird eingebettet")
+    
+    def point_layer(points, **style):
+        """Punktebene als Vektor-Kacheln oder (ohne Server) eingebettet"""
+        if tile_server is not None:
+            return VectorTiles(**tile_server.register(points), pane='markerPane', **style)
+        return CanvasPoints(points, **style)
+    
+    # ⚡ OPTIMIERUNG: Zonen in der gewählten Detailstufe (einmal vereinfacht + projiziert, gecacht).
+    # Die Kacheln vereinfachen pro Zoomstufe selbst und bekommen deshalb das Original.
+    ausschlusszonen_wgs84 = {}
+    zone_key_map = dict(zone_keys)
+    with span('map_zones', zonen=0) as counts:
+        for key, zone in ausschlusszonen_dict.items():
+            if zone is not None:
+                ausschlusszonen_wgs84[key] = get_zone_lod(zone, zone_key_map[key],
+                                                          'original' if tile_server is not None else zone_detail)
+                counts['zonen'] += 1
+    
+    # Heatmap als ein Rasterbild (gecacht pro Raster)
+    heat_image = None
+    if heatmap is not None:
+        heat_image = get_heat_image(heatmap, layer_keys[BAUM_PUFFER], stats['bounds'], heatmap_grid_size)
+    
+    map_start = time.perf_counter()
     center_lat = bäume_wgs84.geometry.y.mean()
     center_lon = bäume_wgs84.geometry.x.mean()
     
@@ -690,132 +1137,71 @@ Future City Hackathon 2025
     )
     
     # Bäume
-    baum_group = folium.FeatureGroup(
+    point_layer(
+        bäume_wgs84,
         name="🌳 Baumkataster",
-        overlay=True,
-        control=True,
-        show=True
+        radius=2,
+        color='green',
+        fill_opacity=0.6,
+        weight=0
     ).add_to(m)
     
-    # Adaptives Sampling
-    if len(bäume_wgs84) > 10000:
-        sample_size = 200
-    elif len(bäume_wgs84) > 5000:
-        sample_size = 300
-    else:
-        sample_size = min(500, len(bäume_wgs84))
-
-    baum_sample = bäume_wgs84.sample(sample_size, random_state=42)
+    # ✅ BASIS-Pflanzstandorte (ohne What-If) - BLAU
+    if baseline_locations_wgs84 is not None and len(baseline_locations_wgs84) > 0:
+        point_layer(
+            baseline_locations_wgs84,
+            name="🌱 Potenzielle Pflanzstandorte",
+            radius=4,
+            color='blue',
+            fill_color='lightblue',
+            fill_opacity=0.8,
+            weight=1,
+            popup="Pflanzstandort"
+        ).add_to(m)
     
-    for idx, row in baum_sample.iterrows():
-        folium.CircleMarker(
-            location=[row.geometry.y, row.geometry.x],
-            radius=2,
+    # ✅ NEUE Pflanzstandorte (nur das What-If-Delta) - GRÜN
+    if added_locations_wgs84 is not None and len(added_locations_wgs84) > 0:
+        point_layer(
+            added_locations_wgs84,
+            name="🌱 Neu durch What-If",
+            radius=4,
             color='green',
-            fill=True,
-            fillOpacity=0.6,
-            weight=0
-        ).add_to(baum_group)
-    
-    # ✅ ORIGINAL-Standorte (wenn What-If aktiv) - in GRAU
-    if original_locations_wgs84 is not None:
-        from folium.plugins import MarkerCluster
-        
-        original_cluster = MarkerCluster(
-            name="🔵 Basis-Standorte (ohne What-If)",
-            overlay=True,
-            control=True,
-            show=False
+            fill_color='lightgreen',
+            fill_opacity=0.8,
+            weight=1,
+            popup="Pflanzstandort (mit What-If entsperrt!)"
         ).add_to(m)
-        
-        sample_size = min(500, len(original_locations_wgs84))
-        original_sample = original_locations_wgs84.sample(sample_size, random_state=42) if len(original_locations_wgs84) > sample_size else original_locations_wgs84
-        
-        for idx, row in original_sample.iterrows():
-            folium.CircleMarker(
-                location=[row.geometry.y, row.geometry.x],
-                radius=3,
-                color='gray',
-                fill=True,
-                fillColor='lightgray',
-                fillOpacity=0.5,
-                weight=1,
-                popup="Basis-Standort (ohne What-If)"
-            ).add_to(original_cluster)
-    
-    # ✅ NEUE Pflanzstandorte (mit What-If) - FARBIG
-    if planting_locations_wgs84 is not None:
-        from folium.plugins import MarkerCluster
-        
-        # Farbe abhängig von What-If
-        is_whatif = unlock_zones and unlock_percentage > 0
-        marker_color = 'green' if is_whatif else 'blue'
-        fill_color = 'lightgreen' if is_whatif else 'lightblue'
-        layer_name = "🌱 Pflanzstandorte (mit What-If!)" if is_whatif else "🌱 Potenzielle Pflanzstandorte"
-        
-        marker_cluster = MarkerCluster(
-            name=layer_name,
-            overlay=True,
-            control=True,
-            show=True
+    
+    # Durch das Szenario wegfallende Basis-Standorte - GRAU
+    if removed_locations_wgs84 is not None and len(removed_locations_wgs84) > 0:
+        point_layer(
+            removed_locations_wgs84,
+            name="⚪ Entfällt durch What-If",
+            radius=4,
+            color='gray',
+            fill_color='lightgray',
+            fill_opacity=0.8,
+            weight=1,
+            popup="Basis-Standort (entfällt mit What-If)"
         ).add_to(m)
-        
-        sample_size = min(1000, len(planting_locations_wgs84))
-        location_sample = planting_locations_wgs84.sample(sample_size, random_state=42) if len(planting_locations_wgs84) > sample_size else planting_locations_wgs84
-        
-        for idx, row in location_sample.iterrows():
-            folium.CircleMarker(
-                location=[row.geometry.y, row.geometry.x],
-                radius=4,
-                color=marker_color,
-                fill=True,
-                fillColor=fill_color,
-                fillOpacity=0.8,
-                weight=1,
-                popup="Pflanzstandort" + (" (mit What-If entsperrt!)" if is_whatif else "")
-            ).add_to(marker_cluster)
-    
-    # ✅ Hitze-Heatmap (nur Hotspots > 0.3)
-    if heatmap_wgs84 is not None:
-        import branca.colormap as cm
-        
-        colormap = cm.LinearColormap(
-            colors=['blue', 'cyan', 'yellow', 'orange', 'red'],
-            vmin=0,
-            vmax=1,
-            caption='Hitze-Score (0=kühl, 1=heiß)'
-        )
-        
-        heatmap_group = folium.FeatureGroup(
+    
+    # ✅ Hitze-Heatmap (alle Zellen als ein Rasterbild)
+    if heat_image is not None:
+        # ⚡ OPTIMIERUNG: Ein ImageOverlay statt eines GeoJSON-Layers pro Zelle
+        folium.raster_layers.ImageOverlay(
+            image=heat_image['url'],
+            bounds=heat_image['bounds'],
+            opacity=0.6,
             name="🔥 Hitze-Heatmap",
             overlay=True,
             control=True,
             show=True
         ).add_to(m)
         
-        # Nur Hotspots rendern
-        hot_cells = heatmap_wgs84[heatmap_wgs84['heat_score'] > 0.3]
-        
-        if len(hot_cells) > 200:
-            hot_cells = hot_cells.nlargest(200, 'heat_score')
+        heat_colormap().add_to(m)
         
-        for idx, row in hot_cells.iterrows():
-            color = colormap(row['heat_score'])
-            
-            folium.GeoJson(
-                row['geometry'].__geo_interface__,
-                style_function=lambda x, c=color: {
-                    'fillColor': c,
-                    'color': c,
-                    'weight': 0.5,
-                    'fillOpacity': 0.6
-                },
-                tooltip=f"Hitze: {row['heat_score']:.2f} | Bäume: {row['tree_count']}"
-            ).add_to(heatmap_group)
-        
-        colormap.add_to(m)
-        
-        st.caption(f"🔥 Zeige {len(hot_cells)} von {len(heatmap_wgs84)} Heatmap-Zellen (nur Hotspots > 0.3)")
+        width, height = heat_image['size']
+        st.caption(f"🔥 Zeige alle {heatmap['heat_score'].size} Heatmap-Zellen als ein Rasterbild ({width}×{height} Pixel)")
     
     # ✅ Ausschlusszonen mit STÄRKEREM Highlight
     for idx, (key, zone_wgs84) in enumerate(ausschlusszonen_wgs84.items()):
@@ -831,6 +1217,19 @@ Future City Hackathon 2025
             zone_name = f"🔓 {key}" if is_unlocked else key
             
             try:
+                if tile_server is not None:
+                    VectorTiles(
+                        **tile_server.register(zone_wgs84),
+                        name=zone_name,
+                        color=color,
+                        fill_color=fill_color,
+                        fill_opacity=0.2 if is_unlocked else 0.4,
+                        weight=4 if is_unlocked else 2,
+                        dash_array=[10, 5] if is_unlocked else None,
+                        show=False
+                    ).add_to(m)
+                    continue
+                
                 clean_geojson = gdf_to_clean_geojson(zone_wgs84)
                 
                 zone_group = folium.FeatureGroup(
@@ -861,16 +1260,18 @@ Future City Hackathon 2025
         [bäume_wgs84.geometry.y.max(), bäume_wgs84.geometry.x.max()]
     ]
     m.fit_bounds(bounds, padding=[50, 50])  # 50px Padding
+    record_span('folium_build', time.perf_counter() - map_start, {'layer': len(m._children)})
     
-    st_folium(m, width=1400, height=800, returned_objects=[])
+    with span('st_folium'):
+        st_folium(m, width=1400, height=800, returned_objects=[])
     
     # Info
     st.info("""
     **Legende:**
     - 🟢 **Grüne Punkte (Pflanzstandorte)** = Mit What-If entsperrt! (Neue Flächen)
     - 🔵 **Blaue Punkte** = Basis-Pflanzstandorte (ohne What-If)
-    - ⚪ **Graue Punkte** = Original-Standorte zum Vergleich (ausblendbar)
-    - 🌳 **Dunkelgrüne Punkte** = Bestehende Bäume (Stichprobe)
+    - ⚪ **Graue Punkte** = Basis-Standorte, die mit What-If entfallen
+    - 🌳 **Dunkelgrüne Punkte** = Bestehende Bäume (alle)
     - 🟢 **Hellgrün** = Baum-Puffer (Mindestabstand)
     - 🔴 **Rote/Orange Bereiche** = Ausschlusszonen
     - 🔓 **Dick gestrichelt** = Entsperrte Zonen (What-If aktiv!)
@@ -878,7 +1279,7 @@ Future City Hackathon 2025
     
     💡 **Tipp:** 
     - Nutze die Layer-Steuerung oben rechts zum Ein-/Ausblenden
-    - Aktiviere "Basis-Standorte" für direkten Vergleich
+    - Blende "Neu durch What-If" ein/aus für den direkten Vergleich
     - What-If-Impact siehst du SOFORT in der Sidebar oben!
     """)
     
@@ -893,16 +1294,41 @@ Future City Hackathon 2025
     with col3:
         st.metric("📏 Baum-Abstand", f"{abstand_bäume} m")
     with col4:
-        if planting_locations_wgs84 is not None:
+        if planting_scenario is not None:
             # Zeige Delta wenn What-If aktiv
-            if original_locations_wgs84 is not None:
-                delta = len(planting_locations_wgs84) - len(original_locations_wgs84)
-                st.metric(
-                    "🌱 Pflanzstandorte", 
-                    f"{len(planting_locations_wgs84):,}",
-                    delta=f"+{delta}" if delta > 0 else None
-                )
-            else:
-                st.metric("🌱 Pflanzstandorte", f"{len(planting_locations_wgs84):,}")
+            st.metric(
+                "🌱 Pflanzstandorte", 
+                f"{planting_count:,}",
+                delta=f"+{delta}" if delta > 0 else None
+            )
         else:
-            st.metric("🌱 Pflanzstandorte", "—")
\ No newline at end of file
+            st.metric("🌱 Pflanzstandorte", "—")
+
+# ===== DIAGNOSE (optional, ganz unten in der Sidebar) =====
+st.sidebar.markdown("---")
+if st.sidebar.checkbox("🩺 Diagnose anzeigen", value=False, key="show_diagnostics"):
+    with st.sidebar.expander("🩺 Laufzeit-Diagnose", expanded=True):
+        st.caption("Stufen dieses Durchlaufs (Sekunden und Zähler)")
+        st.dataframe(diagnostics.stage_summary(run=run_id).round(3))
+        
+        st.caption("Cache-Treffer seit Prozessstart")
+        st.dataframe(diagnostics.cache_summary())
+        
+        st.caption("Letzte Meldungen")
+        messages = [e['message'] for e in diagnostics.events(kind='log', run=run_id)][-30:]
+        st.code("\n".join(messages) or "—", language=None)
+        
+        st.download_button(
+            label="📄 Ereignisse (JSON Lines)",
+            data=diagnostics.events_jsonl(),
+            file_name="city_forest_events.jsonl",
+            mime="application/x-ndjson",
+            key="download_events"
+        )
+        st.download_button(
+            label="📈 Metriken (Prometheus)",
+            data=diagnostics.prometheus_text(),
+            file_name="city_forest_metrics.prom",
+            mime="text/plain",
+            key="download_metrics"
+        )
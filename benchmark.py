@@ -0,0 +1,267 @@
+"""
+Benchmark der Standortsuche auf einer synthetischen Stadt
+Führe aus mit: python benchmark.py --workers 1 2 4 8 --grid-spacing 5
+Oder als Suite über mehrere Größen (Zeit + Spitzenspeicher pro Stufe, als JSON):
+    python benchmark.py --suite --scales klein mittel gross --json bench.json --compare baseline.json
+Läuft komplett offline, ohne die Heilbronn-Daten.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import LineString, box
+
+from analysis import (apply_zone_relaxation, calculate_stats, calculate_tree_density_heatmap,
+                      find_planting_coords, find_planting_locations, find_suitable_locations)
+
+# Größen der Suite: Bäume, Ausdehnung (m) und Mischung der Constraint-Layer
+SCALES = {
+    'klein': {'n_trees': 5000, 'extent': 2000, 'n_buildings': 800, 'n_streets': 40,
+              'n_polygon_layers': 1, 'n_line_layers': 1},
+    'mittel': {'n_trees': 20000, 'extent': 4000, 'n_buildings': 3000, 'n_streets': 80,
+               'n_polygon_layers': 2, 'n_line_layers': 1},
+    'gross': {'n_trees': 80000, 'extent': 8000, 'n_buildings': 12000, 'n_streets': 150,
+              'n_polygon_layers': 3, 'n_line_layers': 2}
+}
+
+# Stufen in Ausführungsreihenfolge (jede nutzt das Ergebnis der vorherigen)
+STAGES = ('find_suitable_locations', 'apply_zone_relaxation', 'find_planting_locations',
+          'calculate_tree_density_heatmap')
+
+def make_synthetic_city(n_trees=20000, extent=8000, n_buildings=3000, n_streets=150, seed=42,
+                        n_polygon_layers=1, n_line_layers=1):
+    """
+    Erzeugt ein synthetisches Baumkataster mit Gebäude- und Straßen-Layern (EPSG:25832)
+
+    Args:
+        n_buildings, n_streets: Features pro Polygon- bzw. Linien-Layer
+        n_polygon_layers, n_line_layers: Anzahl der Layer ('buildings', 'buildings_2', ...)
+
+    Returns:
+        Tuple (bäume, constraints)
+    """
+    rng = np.random.default_rng(seed)
+    x0, y0 = 510000, 5440000
+    crs = "EPSG:25832"
+
+    bäume = gpd.GeoDataFrame(
+        {'GATTUNG': rng.choice(['Acer', 'Tilia', 'Quercus', 'Platanus', 'Betula'], n_trees)},
+        geometry=gpd.points_from_xy(x0 + rng.uniform(0, extent, n_trees),
+                                    y0 + rng.uniform(0, extent, n_trees)),
+        crs=crs
+    )
+
+    constraints = {}
+    for layer in range(n_polygon_layers):
+        corners = rng.uniform(0, extent, (n_buildings, 2))
+        sizes = rng.uniform(10, 60, (n_buildings, 2))
+        constraints['buildings' if layer == 0 else f'buildings_{layer + 1}'] = gpd.GeoDataFrame(
+            geometry=[box(x0 + x, y0 + y, x0 + x + w, y0 + y + h)
+                      for (x, y), (w, h) in zip(corners, sizes)],
+            crs=crs
+        )
+
+    for layer in range(n_line_layers):
+        ends = rng.uniform(0, extent, (n_streets, 2))
+        constraints['streets' if layer == 0 else f'streets_{layer + 1}'] = gpd.GeoDataFrame(
+            geometry=[LineString([(x0 + a, y0), (x0 + b, y0 + extent)]) if i % 2 else
+                      LineString([(x0, y0 + a), (x0 + extent, y0 + b)])
+                      for i, (a, b) in enumerate(ends)],
+            crs=crs
+        )
+
+    return bäume, constraints
+
+def measure(fn, *args, **kwargs):
+    """
+    Führt fn zweimal aus und misst Spitzenspeicher und Laufzeit in getrennten Läufen
+
+    tracemalloc verfolgt jede Allokation und bremst speicherintensive Stufen deutlich -
+    die Zeit stammt deshalb aus einem zweiten Lauf ohne tracemalloc. Der Spitzenspeicher
+    umfasst Python-Objekte und numpy-Arrays; Speicher, den GEOS intern anlegt, ist nicht enthalten.
+
+    Returns:
+        Tuple (ergebnis, sekunden, peak_mb) - das Ergebnis stammt aus dem Zeit-Lauf
+    """
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    return result, seconds, peak / 1024 / 1024
+
+def run_suite(scales=('klein', 'mittel'), grid_spacing=20, heatmap_grid_size=100,
+              unlock_percentage=50, repeat=1):
+    """
+    Misst alle Stufen der Pipeline für jede Größe
+
+    Args:
+        scales: Namen aus SCALES
+        repeat: Wiederholungen pro Stufe (gemeldet wird die schnellste)
+
+    Returns:
+        Liste von Dicts mit 'scale', 'stage', 'seconds', 'peak_mb' und 'result'
+    """
+    records = []
+    for scale in scales:
+        params = SCALES[scale]
+        bäume, constraints = make_synthetic_city(**params)
+        bounds = calculate_stats(bäume)['bounds']
+        unlock_zones = [name for name in constraints if name.startswith('buildings')][:1]
+
+        stages = {
+            'find_suitable_locations': lambda: find_suitable_locations(bäume, constraints),
+            'apply_zone_relaxation': lambda: apply_zone_relaxation(zones, unlock_zones, unlock_percentage,
+                                                                   mode='area'),
+            'find_planting_locations': lambda: find_planting_locations(relaxed, bounds, grid_spacing),
+            'calculate_tree_density_heatmap': lambda: calculate_tree_density_heatmap(bäume, bounds,
+                                                                                    heatmap_grid_size)
+        }
+
+        for stage in STAGES:
+            runs = [measure(stages[stage]) for _ in range(repeat)]
+            result = runs[0][0]
+            if stage == 'find_suitable_locations':
+                zones = result
+            elif stage == 'apply_zone_relaxation':
+                relaxed = result
+
+            records.append({
+                'scale': scale,
+                'stage': stage,
+                'seconds': min(seconds for _, seconds, _ in runs),
+                'peak_mb': max(peak for _, _, peak in runs),
+                'result': 0 if result is None else len(result)
+            })
+
+    return records
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def write_report(records, path, settings):
+    """Schreibt Messwerte und Umgebung als JSON (für den Vergleich zwischen Commits)"""
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'versions': {'geopandas': gpd.__version__, 'shapely': shapely.__version__, 'numpy': np.__version__},
+        'settings': settings,
+        'scales': {scale: SCALES[scale] for scale in dict.fromkeys(r['scale'] for r in records)},
+        'records': records
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+def compare_reports(records, baseline_path, threshold=1.2):
+    """
+    Vergleicht mit einem früheren Report
+
+    Returns:
+        Liste der (scale, stage), die um mehr als threshold langsamer geworden sind
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['scale'], r['stage']): r for r in json.load(f)['records']}
+
+    print(f"\n{'Größe':>8s} | {'Stufe':<32s} | {'vorher (s)':>10s} | {'jetzt (s)':>9s} | {'Faktor':>6s}")
+    regressions = []
+    for record in records:
+        old = baseline.get((record['scale'], record['stage']))
+        if old is None:
+            continue
+        ratio = record['seconds'] / max(old['seconds'], 1e-9)
+        flag = " ⚠" if ratio > threshold else ""
+        print(f"{record['scale']:>8s} | {record['stage']:<32s} | {old['seconds']:10.3f} | "
+              f"{record['seconds']:9.3f} | {ratio:5.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append((record['scale'], record['stage']))
+    return regressions
+
+def print_records(records):
+    print("\n" + "=" * 78)
+    print("BENCHMARK-SUITE")
+    print("=" * 78)
+    print(f"{'Größe':>8s} | {'Stufe':<32s} | {'Zeit (s)':>8s} | {'Peak (MB)':>9s} | Ergebnis")
+    for r in records:
+        print(f"{r['scale']:>8s} | {r['stage']:<32s} | {r['seconds']:8.3f} | {r['peak_mb']:9.1f} | {r['result']}")
+
+def run_scaling(workers_list, grid_spacing=5, n_trees=20000, extent=8000):
+    """
+    Misst die gekachelte Standortsuche für verschiedene Worker-Zahlen
+
+    Nur diese Stufe läuft parallel - die Zonen werden einmal (seriell) vorab berechnet
+    und gehen nicht in den Speedup ein.
+    """
+    bäume, constraints = make_synthetic_city(n_trees=n_trees, extent=extent)
+    bounds = calculate_stats(bäume)['bounds']
+
+    start = time.perf_counter()
+    zones = find_suitable_locations(bäume, constraints)
+    t_zones = time.perf_counter() - start
+
+    rows = []
+    for workers in workers_list:
+        start = time.perf_counter()
+        x, y = find_planting_coords(zones, bounds, grid_spacing, workers=workers)
+        rows.append((workers, time.perf_counter() - start, len(x)))
+
+    base = rows[0][1]
+    print("\n" + "=" * 60)
+    print(f"SCALING Standortsuche in Kacheln ({n_trees} Bäume, {extent}m Ausdehnung, Raster {grid_spacing}m)")
+    print("=" * 60)
+    print(f"Zonen (seriell, einmalig): {t_zones:.2f}s")
+    print(f"{'Worker':>6s} | {'Kacheln (s)':>11s} | {'Speedup':>7s} | Standorte")
+    for workers, t_grid, count in rows:
+        print(f"{workers:6d} | {t_grid:11.2f} | {base / t_grid:6.1f}x | {count}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark der Standortsuche")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--grid-spacing", type=float, default=None, help="Standard: 5 (Scaling) bzw. 20 (Suite)")
+    parser.add_argument("--trees", type=int, default=20000)
+    parser.add_argument("--extent", type=float, default=8000)
+    parser.add_argument("--suite", action="store_true", help="Alle Stufen über mehrere Größen messen")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=['klein', 'mittel'])
+    parser.add_argument("--heatmap-grid-size", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", help="Messwerte als JSON speichern")
+    parser.add_argument("--compare", help="Früherer JSON-Report zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Ab diesem Faktor gilt es als Regression")
+    args = parser.parse_args()
+
+    if not args.suite:
+        run_scaling(args.workers, args.grid_spacing or 5, args.trees, args.extent)
+    else:
+        args.grid_spacing = args.grid_spacing or 20
+        records = run_suite(args.scales, args.grid_spacing, args.heatmap_grid_size, repeat=args.repeat)
+        print_records(records)
+        if args.json:
+            write_report(records, args.json, {'grid_spacing': args.grid_spacing,
+                                              'heatmap_grid_size': args.heatmap_grid_size,
+                                              'repeat': args.repeat})
+            print(f"\n💾 Report gespeichert: {args.json}")
+        if args.compare:
+            regressions = compare_reports(records, args.compare, args.threshold)
+            if regressions:
+                print(f"\n⚠ {len(regressions)} Regression(en) über {args.threshold}x")
+                raise SystemExit(1)
@@ -0,0 +1,505 @@
+"""
+Vorberechnete Felder an den Kandidatenpunkten des Pflanzrasters
+Macht What-If-Änderungen zu reinen Array-Operationen statt Geometrie-Neuberechnungen.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from analysis import BAUM_PUFFER, MAX_EROSION_M, _get_crs, is_distance_zone, nearest_distance
+from diagnostics import current, log, timed
+from exclusion_store import ExclusionStore
+
+# Bis zu diesem Abstand (Meter) wird der Abstand zu Abstandszonen (Bäumen) gespeichert
+MAX_FELD_ABSTAND = 20
+
+def grid_points(bounds, grid_spacing):
+    """Alle Rasterpunkte über bounds als flache Koordinaten-Arrays (wie im Vektorpfad)"""
+    minx, miny, maxx, maxy = bounds
+    xx, yy = np.meshgrid(np.arange(minx, maxx, grid_spacing), np.arange(miny, maxy, grid_spacing))
+    return xx.ravel(), yy.ravel()
+
+def _merged_parts(geometry):
+    """
+    Teile einer Zone, bei denen sich überlappende oder berührende Teile vereinigt sind
+    (ihr gemeinsamer Rand ist dann kein Zonenrand mehr)
+    ⚡ Vereinigt wird nur pro zusammenhängender Gruppe, nie die ganze Zone auf einmal
+
+    Args:
+        geometry: Geometrie oder Array der Zeilen einer Zone (dissolvt oder nicht)
+    """
+    if np.ndim(geometry) == 0 or len(geometry) == 1:
+        # Eine (dissolvte) Geometrie: ihre Teile überlappen nicht
+        return shapely.get_parts(geometry)
+
+    parts = shapely.get_parts(geometry)
+    parts = parts[~shapely.is_empty(parts)]
+    left, right = shapely.STRtree(parts).query(parts, predicate='intersects')
+    linked = left != right
+    left, right = left[linked], right[linked]
+    if len(left) == 0:
+        return parts
+
+    # Zusammenhangskomponenten: kleinste Teilnummer pro Gruppe (Label-Propagation)
+    labels = np.arange(len(parts))
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, left, labels[right])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+
+    single = np.bincount(labels, minlength=len(parts))[labels] == 1
+    groups = [shapely.union_all(parts[labels == label]) for label in np.unique(labels[~single])]
+    return np.concatenate([parts[single], shapely.get_parts(np.asarray(groups, dtype=object))])
+
+def _boundary_segments(geom):
+    """Zerlegt den Rand einer Polygon-Geometrie (bzw. eines Arrays davon) in einzelne Liniensegmente"""
+    rings = shapely.get_rings(shapely.get_parts(geom))
+    coords, ring_idx = shapely.get_coordinates(rings, return_index=True)
+    same_ring = ring_idx[:-1] == ring_idx[1:]
+    return shapely.linestrings(np.stack([coords[:-1][same_ring], coords[1:][same_ring]], axis=1))
+
+def build_constraint_bitmask(ausschlusszonen_dict, x, y, distances=None):
+    """
+    Bitmaske pro Rasterpunkt: welche Zonen decken ihn ab?
+    ⚡ Ein einziger Durchlauf über einen Spatial Index mit den Teilen aller Flächenzonen,
+    Abstandszonen über den vorberechneten Abstand
+
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen
+        x, y: Koordinaten-Arrays der Rasterpunkte
+        distances: Dict Name -> Abstand jedes Rasterpunkts zur Abstandszone
+
+    Returns:
+        Tuple (bits, layers): uint64-Array (Punkte x Wörter) und die Zonen-Namen in Bit-Reihenfolge
+    """
+    layers = []
+    area_zones = {}
+    for name, zone in ausschlusszonen_dict.items():
+        if zone is None or len(zone) == 0:
+            continue
+        if not is_distance_zone(zone):
+            area_zones[name] = zone
+        layers.append(name)
+
+    n_words = max(1, (len(layers) + 63) // 64)
+    bits = np.zeros((len(x), n_words), dtype=np.uint64)
+
+    if area_zones:
+        # Alle Zeilen jeder Zone (dissolvt oder nicht) als Teile im ExclusionStore
+        store = ExclusionStore.from_zones(area_zones)
+        point_idx, owner = store.covered_xy(x, y)
+        layer_idx = np.array([layers.index(name) for name in store.names], dtype=np.int64)[owner]
+
+        word = layer_idx // 64
+        bit = np.left_shift(np.uint64(1), (layer_idx % 64).astype(np.uint64))
+        np.bitwise_or.at(bits, (point_idx, word), bit)
+
+    for name, distance in (distances or {}).items():
+        _set_distance_bits(bits, layers.index(name), distance,
+                           float(ausschlusszonen_dict[name]['abstand'].iloc[0]))
+
+    return bits, layers
+
+def _set_distance_bits(bits, layer_index, distance, abstand):
+    """Setzt das Bit einer Abstandszone für alle Punkte näher als abstand"""
+    word, bit = _layer_bit(layer_index)
+    bits[:, word] &= ~bit
+    bits[distance < abstand, word] |= bit
+
+def zone_distances(ausschlusszonen_dict, x, y, max_distance=MAX_FELD_ABSTAND):
+    """
+    Abstand jedes Rasterpunkts zur nächsten Geometrie jeder Abstandszone
+    ⚡ Eine Nearest-Neighbour-Abfrage, unabhängig vom eingestellten Mindestabstand
+
+    Returns:
+        Dict Name -> float32-Array (np.inf jenseits von max_distance)
+    """
+    return {
+        name: nearest_distance(shapely.STRtree(zone.geometry.values), x, y,
+                               max_distance=max(max_distance, float(zone['abstand'].iloc[0]))
+                               ).astype(np.float32)
+        for name, zone in ausschlusszonen_dict.items()
+        if is_distance_zone(zone) and len(zone) > 0
+    }
+
+def _layer_bit(layer_index):
+    """Wort-Index und Bitwert einer Zone in der Bitmaske"""
+    return layer_index // 64, np.uint64(1) << np.uint64(layer_index % 64)
+
+def layer_mask(field, names):
+    """Wort-Maske (uint64 pro Wort), in der die Bits der angegebenen Zonen gesetzt sind"""
+    mask = np.zeros(field['bits'].shape[1], dtype=np.uint64)
+    for name in names:
+        if name in field['layers']:
+            word, bit = _layer_bit(field['layers'].index(name))
+            mask[word] |= bit
+    return mask
+
+def _covered_idx(bits, layer_index):
+    """Indizes aller Punkte, in denen das Bit einer Zone gesetzt ist"""
+    word, bit = _layer_bit(layer_index)
+    return np.flatnonzero(bits[:, word] & bit)
+
+def zone_depth(geom, idx, x, y):
+    """
+    Abstand der Punkte innerhalb einer Zone zu deren Rand
+    ⚡ Spatial Index über die Randsegmente statt Distanz zur Gesamtgeometrie
+
+    Args:
+        geom: Geometrie der Zone oder Array ihrer Zeilen (zone.geometry.values)
+        idx: Indizes der Punkte strikt in der Zone (aus der Bitmaske)
+        x, y: Koordinaten-Arrays aller Rasterpunkte
+
+    Returns:
+        float32-Array mit dem Randabstand der Punkte idx
+    """
+    depth = np.empty(len(idx), dtype=np.float32)
+    if len(idx) == 0:
+        return depth
+
+    tree = shapely.STRtree(_boundary_segments(_merged_parts(geom)))
+    (point_idx, _), distances = tree.query_nearest(
+        shapely.points(x[idx], y[idx]), return_distance=True, all_matches=False
+    )
+    depth[point_idx] = distances
+    return depth
+
+@timed()
+def build_relaxation_field(ausschlusszonen_dict, bounds, grid_spacing=20, unlockable=None):
+    """
+    Berechnet für jede Zone, welche Rasterpunkte sie abdeckt und wie tief sie darin liegen
+
+    Die Abdeckung steckt als Bitmaske in 'bits' (ein Bit pro Zone). Eine Erosion um
+    d Meter (buffer(-d)) schließt genau die Punkte mit Tiefe > d aus, jede
+    Entsperrung ist danach nur noch ein Bit- bzw. Schwellwert-Vergleich.
+
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen
+        bounds: Bounding Box [minx, miny, maxx, maxy]
+        grid_spacing: Abstand zwischen Punkten in Metern
+        unlockable: Zonen, für die Tiefen berechnet werden (Standard: alle außer Baum-Puffer)
+
+    Returns:
+        Dict mit 'x', 'y', 'bits', 'layers', 'zones' (Name -> {'idx', 'depth'}),
+        'distances' (Abstandszonen), 'fixed' (nicht entsperrbar), 'crs' und 'grid_spacing'
+    """
+    log(f"\n📏 Berechne Distanzfeld (Raster: {grid_spacing}m)...")
+
+    x, y = grid_points(bounds, grid_spacing)
+    distances = zone_distances(ausschlusszonen_dict, x, y)
+    bits, layers = build_constraint_bitmask(ausschlusszonen_dict, x, y, distances)
+    zones = {}
+    fixed = []
+
+    for layer_index, name in enumerate(layers):
+        idx = _covered_idx(bits, layer_index)
+        with_depth = name in unlockable if unlockable is not None else name != BAUM_PUFFER
+        if not with_depth:
+            fixed.append(name)
+
+        if name in distances:
+            # Abstandszone: "Tiefe" = wie weit der Punkt innerhalb des Mindestabstands liegt
+            abstand = float(ausschlusszonen_dict[name]['abstand'].iloc[0])
+            depth = (abstand - distances[name][idx]).astype(np.float32)
+            if not with_depth:
+                depth[:] = np.inf
+        elif with_depth:
+            depth = zone_depth(ausschlusszonen_dict[name].geometry.values, idx, x, y)
+        else:
+            # Nicht entsperrbar: unendlich tief, fällt nie durch eine Erosion heraus
+            depth = np.full(len(idx), np.inf, dtype=np.float32)
+
+        zones[name] = {'idx': idx, 'depth': depth}
+        log(f"  → {name}: {len(idx)} Punkte abgedeckt")
+
+    current().update({'punkte': len(x), 'zonen': len(layers)})
+    return {
+        'x': x,
+        'y': y,
+        'bits': bits,
+        'layers': layers,
+        'zones': zones,
+        'distances': distances,
+        'fixed': fixed,
+        'crs': _get_crs(ausschlusszonen_dict),
+        'grid_spacing': grid_spacing
+    }
+
+def with_zone_distance(field, name, abstand):
+    """
+    Feld mit geändertem Mindestabstand einer Abstandszone (z.B. Bäume)
+    ⚡ Nur ein Schwellwert-Vergleich auf dem vorberechneten Abstand - kein Buffer, kein Dissolve
+
+    Returns:
+        Neues Feld (das übergebene bleibt unverändert)
+    """
+    if name not in field.get('distances', {}):
+        return field
+    if abstand > MAX_FELD_ABSTAND:
+        raise ValueError(f"Mindestabstand {abstand}m > MAX_FELD_ABSTAND ({MAX_FELD_ABSTAND}m)")
+
+    distance = field['distances'][name]
+    layer_index = field['layers'].index(name)
+
+    bits = field['bits'].copy()
+    _set_distance_bits(bits, layer_index, distance, abstand)
+    idx = _covered_idx(bits, layer_index)
+
+    depth = (abstand - distance[idx]).astype(np.float32)
+    if name in field['fixed']:
+        depth[:] = np.inf
+
+    updated = {key: value for key, value in field.items() if key != 'baseline'}
+    updated['bits'] = bits
+    updated['zones'] = {**field['zones'], name: {'idx': idx, 'depth': depth}}
+    return updated
+
+def _points_within(zone, x, y):
+    """Indizes der Rasterpunkte strikt innerhalb einer Flächenzone (nur Punkte in deren Bounding Box)"""
+    minx, miny, maxx, maxy = zone.total_bounds
+    candidates = np.flatnonzero((x > minx) & (x < maxx) & (y > miny) & (y < maxy))
+    point_idx, _ = ExclusionStore.from_zones({'zone': zone}).covered_xy(x[candidates], y[candidates])
+    return candidates[point_idx]
+
+def with_zone(field, name, zone, unlockable=None):
+    """
+    Feld mit hinzugefügter, ersetzter oder (zone=None) entfernter Zone
+    ⚡ Nur die Punkte im Bereich der Zone werden ausgewertet - der Aufwand hängt
+    von dieser Zone ab, nicht von allen anderen
+
+    Entfernte Zonen behalten ihren (gelöschten) Bit-Platz als None in 'layers',
+    der von der nächsten neuen Zone wiederverwendet wird.
+
+    Returns:
+        Neues Feld (das übergebene bleibt unverändert)
+    """
+    layers = list(field['layers'])
+    bits = field['bits']
+    zones = {key: value for key, value in field['zones'].items() if key != name}
+    distances = {key: value for key, value in field['distances'].items() if key != name}
+    fixed = [key for key in field['fixed'] if key != name]
+    has_zone = zone is not None and len(zone) > 0
+
+    if name in layers:
+        layer_index = layers.index(name)
+    elif not has_zone:
+        return field
+    elif None in layers:
+        layer_index = layers.index(None)
+    else:
+        layer_index = len(layers)
+        layers.append(None)
+
+    word, bit = _layer_bit(layer_index)
+    if word >= bits.shape[1]:
+        bits = np.hstack([bits, np.zeros((len(bits), 1), dtype=np.uint64)])
+    else:
+        bits = bits.copy()
+    bits[:, word] &= ~bit
+    layers[layer_index] = None
+
+    if has_zone:
+        x, y = field['x'], field['y']
+        with_depth = name in unlockable if unlockable is not None else name != BAUM_PUFFER
+
+        if is_distance_zone(zone):
+            abstand = float(zone['abstand'].iloc[0])
+            distances.update(zone_distances({name: zone}, x, y))
+            idx = np.flatnonzero(distances[name] < abstand)
+            depth = (abstand - distances[name][idx]).astype(np.float32)
+        else:
+            idx = _points_within(zone, x, y)
+            depth = zone_depth(zone.geometry.values, idx, x, y) if with_depth else None
+
+        if not with_depth:
+            fixed.append(name)
+            depth = np.full(len(idx), np.inf, dtype=np.float32)
+
+        bits[idx, word] |= bit
+        layers[layer_index] = name
+        zones[name] = {'idx': idx, 'depth': depth}
+        log(f"  → {name}: {len(idx)} Punkte abgedeckt")
+
+    updated = {key: value for key, value in field.items() if key != 'baseline'}
+    updated.update(bits=bits, layers=layers, zones=zones, distances=distances, fixed=fixed)
+    if updated['crs'] is None and has_zone:
+        updated['crs'] = zone.crs
+    return updated
+
+@timed()
+def update_field(field, ausschlusszonen_dict, names, unlockable=None):
+    """Übernimmt die Zonen names aus ausschlusszonen_dict (fehlende werden entfernt)"""
+    log(f"\n📏 Aktualisiere Distanzfeld: {len(names)} Zone(n)")
+    for name in names:
+        field = with_zone(field, name, ausschlusszonen_dict.get(name), unlockable)
+    return field
+
+def blocked_counts(field):
+    """
+    Anzahl Rasterpunkte, die von jeder Zone blockiert werden
+
+    Returns:
+        DataFrame mit 'blockiert' (Zone deckt den Punkt ab) und 'nur_diese_zone'
+        (Punkt wäre ohne diese Zone frei) pro Zone
+    """
+    import pandas as pd
+
+    bits = field['bits']
+    n_covering = np.unpackbits(bits.view(np.uint8), axis=1).sum(axis=1)
+
+    rows = []
+    for layer_index, name in enumerate(field['layers']):
+        if name is None:
+            continue
+        word, bit = _layer_bit(layer_index)
+        covered = (bits[:, word] & bit) != 0
+        rows.append({
+            'zone': name,
+            'blockiert': int(covered.sum()),
+            'nur_diese_zone': int((covered & (n_covering == 1)).sum())
+        })
+
+    return pd.DataFrame(rows, columns=['zone', 'blockiert', 'nur_diese_zone']).set_index('zone')
+
+def unlock_distance(field, zone_name, unlock_percentage, mode='buffer'):
+    """
+    Erosionsdistanz für eine Zone
+
+    mode='buffer': wie apply_zone_relaxation (MAX_EROSION_M * Prozent)
+    mode='area': Distanz, bei der unlock_percentage % der abgedeckten Punkte frei
+                 werden - das Quantil der Tiefen, also die exakte Umkehrung der
+                 Flächenverteilung auf dem Raster (statt Bisektion)
+    """
+    if unlock_percentage <= 0:
+        return 0.0
+    if mode != 'area':
+        return MAX_EROSION_M * (unlock_percentage / 100)
+
+    depth = field['zones'][zone_name]['depth']
+    if len(depth) == 0:
+        return 0.0
+    if unlock_percentage >= 100:
+        return np.inf
+    return float(np.quantile(depth, unlock_percentage / 100))
+
+def baseline_excluded(field):
+    """
+    Ausschluss-Maske ohne Entsperrung (wird im Feld zwischengespeichert)
+    ⚡ Eine Bit-Operation über alle Rasterpunkte
+    """
+    if 'baseline' not in field:
+        field['baseline'] = (field['bits'] & layer_mask(field, field['layers'])).any(axis=1)
+    return field['baseline']
+
+def find_planting_delta(field, unlock_zones=(), unlock_percentage=0, mode='buffer'):
+    """
+    Änderung gegenüber der Basis für ein What-If-Szenario
+    ⚡ Nur Punkte im Fußabdruck der entsperrten Zonen werden neu bewertet
+
+    Returns:
+        Dict mit 'added' und 'removed': Indizes der Rasterpunkte (in field['x']/['y']),
+        die durch das Szenario frei bzw. gesperrt werden
+    """
+    names = [name for name in unlock_zones if name in field['zones']]
+    if not names or unlock_percentage <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {'added': empty, 'removed': empty}
+
+    footprint = np.unique(np.concatenate([field['zones'][name]['idx'] for name in names]))
+
+    # Gesperrte Zonen per Bit-Operation, nur auf dem Fußabdruck
+    locked = [name for name in field['layers'] if name not in names]
+    excluded = (field['bits'][footprint] & layer_mask(field, locked)).any(axis=1)
+
+    # Teilweise entsperrte Zonen per Schwellwert (komplett entsperrt = Schwelle unendlich)
+    for name in names:
+        threshold = unlock_distance(field, name, unlock_percentage, mode)
+        if np.isfinite(threshold):
+            zone = field['zones'][name]
+            still_excluded = zone['idx'][zone['depth'] > threshold]
+            excluded[np.searchsorted(footprint, still_excluded)] = True
+
+    was_excluded = baseline_excluded(field)[footprint]
+    return {
+        'added': footprint[was_excluded & ~excluded],
+        'removed': footprint[~was_excluded & excluded]
+    }
+
+def excluded_mask(field, unlock_zones=(), unlock_percentage=0, mode='buffer'):
+    """Boolesche Ausschluss-Maske über alle Rasterpunkte: Basis + What-If-Delta"""
+    excluded = baseline_excluded(field)
+    if not unlock_zones or unlock_percentage <= 0:
+        return excluded
+
+    delta = find_planting_delta(field, unlock_zones, unlock_percentage, mode)
+    excluded = excluded.copy()
+    excluded[delta['added']] = False
+    excluded[delta['removed']] = True
+    return excluded
+
+def planting_scenario_field(field, unlock_zones=(), unlock_percentage=0, mode='buffer'):
+    """
+    Basis + What-If-Szenario aus dem Distanzfeld in einem Durchgang
+    ⚡ Basis aus dem Feld-Cache, das Szenario nur als Delta auf dem Fußabdruck
+
+    Returns:
+        Dict mit 'x', 'y' (alle Rasterpunkte), 'crs', 'baseline' und 'suitable' (bool: geeignet
+        ohne bzw. mit Szenario) und 'delta' (wie find_planting_delta)
+    """
+    baseline = ~baseline_excluded(field)
+    delta = find_planting_delta(field, unlock_zones, unlock_percentage, mode)
+
+    suitable = baseline
+    if len(delta['added']) or len(delta['removed']):
+        suitable = baseline.copy()
+        suitable[delta['added']] = True
+        suitable[delta['removed']] = False
+
+    return {
+        'x': field['x'],
+        'y': field['y'],
+        'crs': field['crs'],
+        'baseline': baseline,
+        'suitable': suitable,
+        'delta': delta
+    }
+
+def delta_locations(field, delta):
+    """
+    Hinzugekommene und weggefallene Standorte eines Deltas als GeoDataFrames
+
+    Returns:
+        Tuple (added, removed)
+    """
+    return tuple(
+        gpd.GeoDataFrame(geometry=gpd.points_from_xy(field['x'][idx], field['y'][idx]), crs=field['crs'])
+        for idx in (delta['added'], delta['removed'])
+    )
+
+def find_planting_coords_field(field, unlock_zones=(), unlock_percentage=0, mode='buffer'):
+    """
+    Pflanzstandorte aus dem Distanzfeld
+    ⚡ Nur Schwellwert-Vergleiche, keine Geometrie-Operation
+
+    Returns:
+        Tuple (x, y) mit den Koordinaten der geeigneten Standorte
+    """
+    suitable = ~excluded_mask(field, unlock_zones, unlock_percentage, mode)
+    return field['x'][suitable], field['y'][suitable]
+
+def find_planting_locations_field(field, unlock_zones=(), unlock_percentage=0, mode='buffer'):
+    """
+    Pflanzstandorte aus dem Distanzfeld als GeoDataFrame
+
+    Returns:
+        GeoDataFrame mit geeigneten Pflanzstandorten
+    """
+    x, y = find_planting_coords_field(field, unlock_zones, unlock_percentage, mode)
+
+    if len(x) > 0:
+        return gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y), crs=field['crs'])
+    else:
+        return None
@@ -0,0 +1,219 @@
+"""
+Kommandozeile für die Standortsuche (ohne Streamlit/Folium)
+Führe aus mit: python cli.py --config nightly.json --output results/
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+# Standardwerte wie in der App; Konfigurationsdatei und Flags überschreiben sie
+DEFAULTS = {
+    'data': "data",
+    'constraints': "constraints",
+    'output': "results",
+    'abstand_bäume': 5,
+    'buffer_linien': 10,
+    'tree_mode': 'distance',
+    'unlock_zones': [],
+    'unlock_percentage': 0,
+    'unlock_mode': 'buffer',
+    'grid_spacing': 25,
+    'heatmap_grid_size': 150,
+    'workers': 1,
+    'formats': ['geojson', 'csv'],
+    'compression': None,
+    'export_zones': False
+}
+
+def load_config(path=None, overrides=None):
+    """
+    Parameter aus DEFAULTS, optionaler JSON-Datei und Overrides (in dieser Reihenfolge)
+
+    Returns:
+        Dict mit allen Parametern
+    """
+    config = dict(DEFAULTS)
+    if path is not None:
+        with open(path, encoding='utf-8') as f:
+            from_file = json.load(f)
+        unknown = set(from_file) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unbekannte Parameter in {path}: {', '.join(sorted(unknown))}")
+        config.update(from_file)
+
+    config.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return config
+
+def run_pipeline(config):
+    """
+    Lädt die Daten und führt die komplette Analyse aus
+
+    Returns:
+        Dict mit 'bäume', 'zones', 'planting_locations', 'heatmap', 'stats' und 'timings' (Sekunden)
+        oder None, wenn kein Baumkataster gefunden wurde
+    """
+    from analysis import (BBOX_MARGIN_M, apply_zone_relaxation, calculate_stats,
+                          calculate_tree_density_heatmap, find_planting_locations,
+                          find_suitable_locations, load_all_constraints, load_data)
+
+    timings = {}
+
+    start = time.perf_counter()
+    bäume = load_data(config['data'])
+    if bäume is None:
+        return None
+
+    # Nur Geometrien im Bereich des Katasters (plus Rand für Linien-Buffer)
+    minx, miny, maxx, maxy = bäume.total_bounds
+    bbox = (minx - BBOX_MARGIN_M, miny - BBOX_MARGIN_M, maxx + BBOX_MARGIN_M, maxy + BBOX_MARGIN_M)
+    constraints = load_all_constraints(config['constraints'], bbox=bbox, bbox_crs=bäume.crs)
+    stats = calculate_stats(bäume)
+    timings['laden'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    zones = find_suitable_locations(bäume, constraints, config['abstand_bäume'], config['buffer_linien'],
+                                    tree_mode=config['tree_mode'])
+    timings['zonen'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    missing = [name for name in config['unlock_zones'] if name not in zones]
+    if missing:
+        print(f"⚠ Unbekannte Zonen werden ignoriert: {', '.join(missing)}")
+    relaxed = apply_zone_relaxation(zones, config['unlock_zones'], config['unlock_percentage'],
+                                    config['unlock_mode'])
+    timings['what_if'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    planting_locations = find_planting_locations(relaxed, stats['bounds'], config['grid_spacing'],
+                                                 workers=config['workers'])
+    timings['standorte'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    heatmap = calculate_tree_density_heatmap(bäume, stats['bounds'], config['heatmap_grid_size'])
+    timings['heatmap'] = time.perf_counter() - start
+
+    return {
+        'bäume': bäume,
+        'zones': relaxed,
+        'planting_locations': planting_locations,
+        'heatmap': heatmap,
+        'stats': stats,
+        'timings': timings
+    }
+
+def write_results(results, config):
+    """
+    Schreibt Standorte, Heatmap, optional die Zonen und eine summary.json in config['output']
+
+    Returns:
+        Liste der geschriebenen Dateien
+    """
+    import shapely
+
+    from exports import EXPORT_FORMATS, export_name, write_sites
+
+    output = Path(config['output'])
+    output.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    locations = results['planting_locations']
+    count = 0 if locations is None else len(locations)
+    if count > 0:
+        # Gleiche Zusatzspalten wie der Export der App
+        unlock_active = bool(config['unlock_zones']) and config['unlock_percentage'] > 0
+        attributes = {
+            'whatif_aktiv': 'Ja' if unlock_active else 'Nein',
+            'entsperrte_zonen': ', '.join(config['unlock_zones']) if config['unlock_zones'] else 'Keine'
+        }
+        coords = shapely.get_coordinates(locations.geometry.values)
+        for fmt in config['formats']:
+            if fmt not in EXPORT_FORMATS:
+                print(f"⚠ Format {fmt} ist hier nicht verfügbar (FlatGeobuf braucht pyogrio mit write_arrow) "
+                      f"- übersprungen")
+                continue
+            # Nicht unterstützte Kompression gilt für dieses Format als "keine"
+            compression = config['compression'] if config['compression'] in EXPORT_FORMATS[fmt]['compression'] else None
+            path = output / export_name("pflanzstandorte", fmt, compression)
+            written.append(write_sites(coords[:, 0], coords[:, 1], locations.crs, path, fmt, compression, attributes))
+
+    heatmap = results['heatmap']
+    if 'geojson' in config['formats'] and len(heatmap) > 0:
+        path = output / "heatmap.geojson"
+        heatmap.to_crs(epsg=4326).to_file(path, driver="GeoJSON")
+        written.append(path)
+
+    if config['export_zones']:
+        from analysis import dissolved_zone, distance_zone_polygons, is_distance_zone
+        
+        zones_dir = output / "zonen"
+        zones_dir.mkdir(exist_ok=True)
+        for name, zone in results['zones'].items():
+            if zone is None or len(zone) == 0:
+                continue
+            # Abstandszonen sind nur Punkte + Mindestabstand: als Fläche puffern (Kreise so fein wie
+            # der Baum-Puffer im Puffermodus); exportiert wird ein vereinigter Umriss pro Zone
+            if is_distance_zone(zone):
+                zone = distance_zone_polygons(zone, quad_segs=16)
+            path = zones_dir / f"{name}.geojson"
+            dissolved_zone(zone).to_crs(epsg=4326).to_file(path, driver="GeoJSON")
+            written.append(path)
+
+    summary = {
+        'parameter': config,
+        'anzahl_bäume': results['stats']['anzahl_bäume'],
+        'zonen': sorted(results['zones']),
+        'neue_standorte': count,
+        'co2_kg_pro_jahr': count * 22,
+        'laufzeit_s': {stage: round(seconds, 3) for stage, seconds in results['timings'].items()}
+    }
+    path = output / "summary.json"
+    path.write_text(json.dumps(summary, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+    written.append(path)
+
+    return written
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="City Forest Creator - Standortsuche ohne UI")
+    parser.add_argument("--config", help="JSON-Datei mit Parametern (Schlüssel wie DEFAULTS in cli.py)")
+    parser.add_argument("--data", help="Ordner mit dem Baumkataster")
+    parser.add_argument("--constraints", help="Ordner mit den Constraint-Layern")
+    parser.add_argument("--output", help="Ausgabeordner")
+    parser.add_argument("--abstand-baeume", dest="abstand_bäume", type=float, help="Mindestabstand zu Bäumen (m)")
+    parser.add_argument("--buffer-linien", dest="buffer_linien", type=float, help="Buffer für Linien (m)")
+    parser.add_argument("--tree-mode", choices=['buffer', 'distance'])
+    parser.add_argument("--unlock-zones", nargs="*", help="Zonen für die What-If-Analyse")
+    parser.add_argument("--unlock-percentage", type=float, help="Entsperrter Anteil in Prozent")
+    parser.add_argument("--unlock-mode", choices=['area', 'buffer'])
+    parser.add_argument("--grid-spacing", type=float, help="Rasterabstand der Standorte (m)")
+    parser.add_argument("--heatmap-grid-size", type=float, help="Rasterweite der Heatmap (m)")
+    parser.add_argument("--workers", type=int, help="Prozesse für die gekachelte Standortsuche (0 = alle Kerne)")
+    parser.add_argument("--formats", nargs="+", choices=['geojson', 'csv', 'parquet', 'fgb'],
+                        help="Formate der Standorte (parquet = GeoParquet, fgb = FlatGeobuf)")
+    parser.add_argument("--compression", choices=['gzip', 'zstd', 'snappy'],
+                        help="gzip für GeoJSON/CSV/FlatGeobuf, Codec für GeoParquet")
+    parser.add_argument("--export-zones", action="store_true", default=None,
+                        help="Ausschlusszonen zusätzlich als GeoJSON schreiben")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = vars(parse_args(argv))
+    config = load_config(args.pop('config'), args)
+    if config['workers'] == 0:
+        config['workers'] = None
+
+    print(f"🌳 City Forest Creator (CLI) - Parameter: {json.dumps(config, ensure_ascii=False)}")
+    results = run_pipeline(config)
+    if results is None:
+        print("✗ Kein Baumkataster gefunden - Abbruch")
+        return 1
+
+    written = write_results(results, config)
+    print(f"\n✅ {len(written)} Datei(en) geschrieben nach {config['output']}/")
+    for stage, seconds in results['timings'].items():
+        print(f"  ⏱ {stage}: {seconds:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
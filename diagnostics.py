@@ -0,0 +1,296 @@
+"""
+Laufzeit-Diagnose: Zeitspannen, Zähler und Fortschrittsmeldungen
+Jede Stufe läuft in einem span() mit Dauer und Zählern (z.B. getestete Punkte),
+Cache-Zugriffe werden als Treffer/Fehlschlag gezählt. Fortschrittsmeldungen (log)
+erscheinen weiter auf der Konsole und landen zusätzlich im Ereignis-Puffer.
+Jedes Ereignis trägt die Kennung des Durchlaufs (start_run), in dem es entstand - so
+lassen sich die Ereignisse eines Streamlit-Reruns von denen anderer Sitzungen trennen.
+Export als JSON-Lines und im Prometheus-Textformat.
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# Ist die Variable gesetzt, werden Ereignisse laufend nach <dir>/events.jsonl geschrieben
+# und <dir>/metrics.prom nach jeder äußersten Stufe aktualisiert
+METRICS_DIR = os.environ.get("CITY_FOREST_METRICS_DIR")
+
+# Anzahl der Ereignisse im Speicher (für das Diagnose-Panel)
+MAX_EVENTS = 5000
+
+# Präfix der Prometheus-Metriken
+METRIC_PREFIX = "city_forest"
+
+_lock = threading.Lock()
+_local = threading.local()
+_events = deque(maxlen=MAX_EVENTS)
+_counters = {}
+_sequence = 0
+_run_ids = itertools.count(1)
+
+# Durchlauf des aktuellen Threads/Kontexts (None = außerhalb eines Durchlaufs)
+_run = ContextVar('diagnostics_run', default=None)
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+def _record(event):
+    """Speichert ein Ereignis (mit laufender Nummer) und schreibt es ggf. als JSON-Zeile"""
+    global _sequence
+    event['run'] = _run.get()
+    with _lock:
+        _sequence += 1
+        event['seq'] = _sequence
+        _events.append(event)
+
+    if METRICS_DIR:
+        try:
+            Path(METRICS_DIR).mkdir(parents=True, exist_ok=True)
+            with open(Path(METRICS_DIR) / "events.jsonl", 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            pass
+
+def count(metric, value=1, **labels):
+    """Erhöht einen Zähler, z.B. count('cache_requests', cache='field', result='hit')"""
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def log(message):
+    """Fortschrittsmeldung: Konsole + Ereignis (mit der gerade laufenden Stufe)"""
+    print(message)
+    stack = _stack()
+    _record({
+        'type': 'log',
+        'ts': time.time(),
+        'span': stack[-1]['name'] if stack else None,
+        'message': message.strip()
+    })
+
+@contextmanager
+def span(name, **counts):
+    """
+    Zeitspanne einer Stufe
+
+    Zähler können beim Start übergeben oder im Block gesetzt werden:
+        with span('find_planting_coords') as s:
+            s['punkte_getestet'] = len(xx)
+    """
+    stack = _stack()
+    entry = {'name': name, 'counts': dict(counts)}
+    parent = stack[-1]['name'] if stack else None
+    stack.append(entry)
+
+    start = time.perf_counter()
+    error = None
+    try:
+        yield entry['counts']
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        record_span(name, time.perf_counter() - start, entry['counts'], parent=parent, error=error)
+
+def record_span(name, seconds, counts=None, parent=None, error=None):
+    """Erfasst eine von außen gemessene Stufe (z.B. Code auf Modulebene der App)"""
+    counts = counts or {}
+    stack = _stack()
+    if parent is None and stack:
+        parent = stack[-1]['name']
+
+    count('stage_seconds_total', seconds, stage=name)
+    count('stage_calls_total', 1, stage=name)
+    for item, value in counts.items():
+        if isinstance(value, (int, float)):
+            count('stage_items_total', value, stage=name, item=item)
+
+    _record({
+        'type': 'span',
+        'ts': time.time(),
+        'name': name,
+        'parent': parent,
+        'depth': len(stack),
+        'seconds': round(seconds, 6),
+        'counts': counts,
+        'error': error,
+        'thread': threading.current_thread().name
+    })
+
+    if METRICS_DIR and not stack:
+        try:
+            write_prometheus(Path(METRICS_DIR) / "metrics.prom")
+        except OSError:
+            pass
+
+def current():
+    """Zähler-Dict der gerade laufenden Stufe (außerhalb einer Stufe ein Wegwerf-Dict)"""
+    stack = _stack()
+    return stack[-1]['counts'] if stack else {}
+
+def timed(name=None):
+    """Decorator: ganze Funktion als span (Standardname = Funktionsname)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def track_cache(cache_decorator, **cache_kwargs):
+    """
+    Wie cache_decorator (z.B. st.cache_data), zählt aber Treffer und Fehlschläge
+
+    Die innere Funktion läuft nur bei einem Fehlschlag - sie setzt ein Flag, das der
+    äußere Aufruf auswertet. Verschachtelte gecachte Aufrufe sichern das Flag.
+    """
+    def decorate(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            _local.cache_miss = True
+            return fn(*args, **kwargs)
+
+        cached = cache_decorator(**cache_kwargs)(inner) if cache_kwargs else cache_decorator(inner)
+
+        @functools.wraps(fn)
+        def outer(*args, **kwargs):
+            saved = getattr(_local, 'cache_miss', False)
+            _local.cache_miss = False
+            try:
+                with span(f"cache:{name}") as counts:
+                    result = cached(*args, **kwargs)
+                    hit = not _local.cache_miss
+                    counts['treffer'] = int(hit)
+                count('cache_requests_total', cache=name, result='hit' if hit else 'miss')
+                return result
+            finally:
+                _local.cache_miss = saved
+
+        outer.clear = getattr(cached, 'clear', None)
+        return outer
+    return decorate
+
+def mark():
+    """Aktuelle Ereignisnummer"""
+    with _lock:
+        return _sequence
+
+def start_run():
+    """
+    Beginnt einen Durchlauf (z.B. einen Streamlit-Rerun) im aktuellen Kontext
+
+    Returns:
+        Kennung des Durchlaufs (für events(run=...) und stage_summary(run=...))
+    """
+    run = f"{os.getpid()}-{next(_run_ids)}"
+    _run.set(run)
+    return run
+
+def bind_run(fn):
+    """fn für einen Worker-Thread: dessen Ereignisse gehören zum Durchlauf des Aufrufers"""
+    run = _run.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _run.set(run)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _run.reset(token)
+    return wrapper
+
+def events(since=0, kind=None, run=None):
+    """Ereignisse nach der Nummer since (optional nur 'span' oder 'log', nur eines Durchlaufs)"""
+    with _lock:
+        return [e for e in _events if e['seq'] > since and (kind is None or e['type'] == kind)
+                and (run is None or e.get('run') == run)]
+
+def counters():
+    """Kopie aller Zähler als Dict (metric, labels) -> Wert"""
+    with _lock:
+        return dict(_counters)
+
+def stage_summary(since=0, run=None):
+    """
+    Zusammenfassung der Stufen seit since (bzw. eines Durchlaufs)
+
+    Returns:
+        DataFrame mit 'aufrufe', 'sekunden' (Summe), 'max_s' und den summierten Zählern pro Stufe
+    """
+    import pandas as pd
+
+    rows = {}
+    for event in events(since, 'span', run):
+        row = rows.setdefault(event['name'], {'stufe': event['name'], 'aufrufe': 0, 'sekunden': 0.0, 'max_s': 0.0})
+        row['aufrufe'] += 1
+        row['sekunden'] += event['seconds']
+        row['max_s'] = max(row['max_s'], event['seconds'])
+        for item, value in event['counts'].items():
+            if isinstance(value, (int, float)):
+                row[item] = row.get(item, 0) + value
+
+    if not rows:
+        return pd.DataFrame(columns=['aufrufe', 'sekunden', 'max_s'])
+    return pd.DataFrame(rows.values()).set_index('stufe').sort_values('sekunden', ascending=False)
+
+def cache_summary():
+    """Treffer und Fehlschläge pro Cache (seit Prozessstart)"""
+    import pandas as pd
+
+    rows = {}
+    for (metric, labels), value in counters().items():
+        if metric != 'cache_requests_total':
+            continue
+        labels = dict(labels)
+        row = rows.setdefault(labels['cache'], {'cache': labels['cache'], 'hit': 0, 'miss': 0})
+        row[labels['result']] += int(value)
+
+    if not rows:
+        return pd.DataFrame(columns=['hit', 'miss', 'trefferquote'])
+    table = pd.DataFrame(rows.values()).set_index('cache')
+    table['trefferquote'] = table['hit'] / (table['hit'] + table['miss'])
+    return table
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text():
+    """Alle Zähler im Prometheus-Textformat"""
+    by_metric = {}
+    for (metric, labels), value in sorted(counters().items()):
+        by_metric.setdefault(metric, []).append((labels, value))
+
+    lines = []
+    for metric, samples in by_metric.items():
+        full_name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# TYPE {full_name} counter")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+            lines.append(f"{full_name}{{{label_text}}} {value:g}" if label_text else f"{full_name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+def events_jsonl(since=0):
+    """Ereignisse als JSON-Lines"""
+    return "".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in events(since))
+
+def write_prometheus(path):
+    """Schreibt die Zähler atomar (für den node_exporter textfile collector)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(prometheus_text(), encoding='utf-8')
+    os.replace(tmp, path)
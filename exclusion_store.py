@@ -0,0 +1,236 @@
+"""
+Ausschlusszonen als räumlich indizierte Menge von Einzelteilen
+Statt alle Zonen zu einer riesigen MultiPolygon-Union zu verschmelzen, bleiben die
+(gepufferten) Teile einzeln in einem STRtree. "Ist dieser Punkt ausgeschlossen?" ist
+eine Index-Abfrage, vereinigt wird nur lokal - für Randfälle und für die Anzeige.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from analysis import _distance_checks, _distance_excluded, _get_crs, find_suitable_locations, is_distance_zone
+from diagnostics import current, log, timed
+
+# Punkte pro Abfrage an den Spatial Index (begrenzt den Speicher für Punkt-Geometrien)
+QUERY_CHUNK = 500_000
+
+# Kantenlänge der Index-Zellen in Metern: lange Teile (z.B. gepufferte Straßen) werden im
+# Index durch die Zellen vertreten, die sie berühren, statt durch ihre riesige Bounding Box
+INDEX_CELL = 100
+
+class ExclusionStore:
+    """
+    Indizierte Ausschlusszonen
+
+    Attributes:
+        parts: Array aller Flächen-Teile (Polygone)
+        owners: Index der Zone (in names) für jeden Teil
+        names: Namen der Flächenzonen
+        distance_zones: Abstandszonen (Name -> Punkte + Mindestabstand)
+        crs: Koordinatensystem
+    """
+
+    def __init__(self, parts, owners, names, crs=None, distance_zones=None):
+        self.parts = parts
+        self.owners = owners
+        self.names = names
+        self.crs = crs
+        self.distance_zones = distance_zones or {}
+        self.distance_checks = _distance_checks(self.distance_zones)
+        shapely.prepare(self.parts)
+        boxes, self.box_owner = _index_boxes(self.parts, INDEX_CELL)
+        self.tree = shapely.STRtree(boxes)
+
+    @classmethod
+    def from_zones(cls, ausschlusszonen_dict):
+        """Store aus einem Zonen-Dict (dissolvt oder nicht - alle Zeilen werden in Teile zerlegt)"""
+        parts = []
+        owners = []
+        names = []
+        distance_zones = {}
+        for name, zone in ausschlusszonen_dict.items():
+            if zone is None or len(zone) == 0:
+                continue
+            if is_distance_zone(zone):
+                distance_zones[name] = zone
+                continue
+            zone_parts = shapely.get_parts(zone.geometry.values)
+            zone_parts = zone_parts[~shapely.is_empty(zone_parts)]
+            parts.append(zone_parts)
+            owners.append(np.full(len(zone_parts), len(names)))
+            names.append(name)
+
+        return cls(
+            np.concatenate(parts) if parts else np.empty(0, dtype=object),
+            np.concatenate(owners) if owners else np.empty(0, dtype=np.int64),
+            names,
+            crs=_get_crs(ausschlusszonen_dict),
+            distance_zones=distance_zones
+        )
+
+    @classmethod
+    @timed('ExclusionStore.from_layers')
+    def from_layers(cls, bäume, constraints, abstand_bäume=5, buffer_linien=10, tree_mode='buffer'):
+        """
+        Store direkt aus Baumkataster und Constraint-Layern
+        ⚡ Kein Dissolve: Puffer und Polygone gehen unverändert als Teile in den Index
+        """
+        zones = find_suitable_locations(bäume, constraints, abstand_bäume, buffer_linien, tree_mode=tree_mode)
+
+        log(f"\n🗂️ Baue Ausschluss-Index (ohne Dissolve)...")
+        store = cls.from_zones(zones)
+        log(f"  ✓ {len(store.parts)} Teile in {len(store.names)} Flächenzonen, "
+              f"{len(store.distance_checks)} Abstandszone(n)")
+        return store
+
+    def query_box(self, bounds):
+        """Indizes der Teile, die eine Bounding Box schneiden"""
+        return np.unique(self.box_owner[self.tree.query(shapely.box(*bounds))])
+
+    @timed('ExclusionStore.excluded_xy')
+    def excluded_xy(self, x, y):
+        """
+        Ausschluss-Maske für Koordinaten-Arrays
+        Identisch zu contains() gegen die Gesamt-Union: strikt innerhalb eines Teils, oder
+        auf dem gemeinsamen Rand mehrerer Teile und innerhalb von deren lokaler Union.
+        """
+        excluded = np.zeros(len(x), dtype=bool)
+        chunks = range(0, len(x), QUERY_CHUNK) if len(self.parts) > 0 else []
+
+        for start in chunks:
+            xs, ys = x[start:start + QUERY_CHUNK], y[start:start + QUERY_CHUNK]
+
+            # Kandidaten über die Index-Boxen, danach exakter Test gegen den vorbereiteten Teil
+            point_idx, box_idx = self.tree.query(shapely.points(xs, ys))
+            pairs = np.unique(point_idx * len(self.parts) + self.box_owner[box_idx])
+            point_idx, part_idx = pairs // len(self.parts), pairs % len(self.parts)
+
+            inside = np.zeros(len(xs), dtype=bool)
+            inside[point_idx[shapely.contains_xy(self.parts[part_idx], xs[point_idx], ys[point_idx])]] = True
+
+            # Punkte nur auf Rändern: ausgeschlossen, wenn sie im Inneren der lokalen Union liegen
+            rest = ~inside[point_idx]
+            point_idx, part_idx = point_idx[rest], part_idx[rest]
+            touching = shapely.intersects_xy(self.parts[part_idx], xs[point_idx], ys[point_idx])
+            for point, members in _group_pairs(point_idx[touching], part_idx[touching]):
+                if len(members) >= 2:
+                    inside[point] = shapely.contains_xy(shapely.union_all(self.parts[members]), xs[point], ys[point])
+
+            excluded[start:start + len(xs)] = inside
+
+        current().update({'punkte_getestet': len(x), 'teile': len(self.parts)})
+        if self.distance_checks:
+            free = np.flatnonzero(~excluded)
+            excluded[free] = _distance_excluded(self.distance_checks, x[free], y[free])
+
+        return excluded
+
+    @timed('ExclusionStore.covered_xy')
+    def covered_xy(self, x, y):
+        """
+        Welche Flächenzone deckt welchen Punkt ab
+        Pro Zone wie contains() gegen deren Union: strikt innerhalb eines ihrer Teile, oder
+        auf dem gemeinsamen Rand mehrerer ihrer Teile und innerhalb von deren lokaler Union.
+
+        Returns:
+            Tuple (point_idx, owner) - Punkt-Index und Zone (Index in names) pro Paar
+        """
+        n_parts, n_zones = len(self.parts), max(len(self.names), 1)
+        keys = []
+        chunks = range(0, len(x), QUERY_CHUNK) if n_parts > 0 else []
+
+        for start in chunks:
+            xs, ys = x[start:start + QUERY_CHUNK], y[start:start + QUERY_CHUNK]
+
+            point_idx, box_idx = self.tree.query(shapely.points(xs, ys))
+            pairs = np.unique(point_idx * n_parts + self.box_owner[box_idx])
+            point_idx, part_idx = pairs // n_parts, pairs % n_parts
+            zone_key = (point_idx + start) * n_zones + self.owners[part_idx]
+
+            inside = shapely.contains_xy(self.parts[part_idx], xs[point_idx], ys[point_idx])
+            hits = np.unique(zone_key[inside])
+            keys.append(hits)
+
+            # Randpunkte: pro Zone gegen die lokale Union der berührten Teile
+            rest = ~inside & ~np.isin(zone_key, hits)
+            rest[rest] = shapely.intersects_xy(self.parts[part_idx[rest]], xs[point_idx[rest]], ys[point_idx[rest]])
+            edge_hits = [key for key, members in _group_pairs(zone_key[rest], part_idx[rest])
+                         if len(members) >= 2 and shapely.contains_xy(
+                             shapely.union_all(self.parts[members]), x[key // n_zones], y[key // n_zones])]
+            keys.append(np.asarray(edge_hits, dtype=np.int64))
+
+        keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+        return keys // n_zones, keys % n_zones
+
+    def outline(self, names=None, bounds=None):
+        """
+        Vereinigte Umrisse für die Anzeige (nur die gewünschten Zonen bzw. der Ausschnitt)
+
+        Returns:
+            Geometrie (leer, wenn keine Teile betroffen sind)
+        """
+        idx = self.query_box(bounds) if bounds is not None else np.arange(len(self.parts))
+        if names is not None:
+            wanted = [self.names.index(name) for name in names if name in self.names]
+            idx = idx[np.isin(self.owners[idx], wanted)]
+
+        parts = self.parts[idx]
+        if bounds is not None:
+            parts = shapely.clip_by_rect(parts, *bounds)
+        return shapely.union_all(parts)
+
+    def zones_dict(self, dissolve=True):
+        """
+        Zonen als Dict wie find_suitable_locations (inkl. Abstandszonen)
+
+        Args:
+            dissolve: True = ein vereinigter Umriss pro Zone (Anzeige, Export),
+                      False = alle Teile einzeln (für die gekachelte Suche)
+        """
+        zones = {}
+        for index, name in enumerate(self.names):
+            if dissolve:
+                geometry = [self.outline([name])]
+            else:
+                geometry = self.parts[self.owners == index]
+            zones[name] = gpd.GeoDataFrame(geometry=geometry, crs=self.crs)
+        return {**self.distance_zones, **zones}
+
+def _index_boxes(parts, cell):
+    """
+    Index-Boxen für alle Teile
+
+    Returns:
+        Tuple (boxes, owner) - Box-Geometrien und der Teil, zu dem jede Box gehört
+    """
+    bounds = shapely.bounds(parts)
+    large = np.flatnonzero((bounds[:, 2] - bounds[:, 0] > cell) | (bounds[:, 3] - bounds[:, 1] > cell))
+
+    boxes = [shapely.box(*bounds.T)]
+    owner = [np.arange(len(parts))]
+    keep = np.ones(len(parts), dtype=bool)
+    keep[large] = False
+
+    for i in large:
+        minx, miny, maxx, maxy = bounds[i]
+        xs = np.arange(minx, maxx, cell)
+        ys = np.arange(miny, maxy, cell)
+        gx, gy = np.meshgrid(xs, ys)
+        cells = shapely.box(gx.ravel(), gy.ravel(),
+                            np.minimum(gx.ravel() + cell, maxx), np.minimum(gy.ravel() + cell, maxy))
+        cells = cells[shapely.intersects(parts[i], cells)]
+        boxes.append(cells)
+        owner.append(np.full(len(cells), i))
+
+    boxes[0], owner[0] = boxes[0][keep], owner[0][keep]
+    return np.concatenate(boxes), np.concatenate(owner)
+
+def _group_pairs(point_idx, part_idx):
+    """Gruppiert (Punkt, Teil)-Paare nach Punkt (bzw. einem anderen ganzzahligen Schlüssel)"""
+    if len(point_idx) == 0:
+        return []
+    order = np.argsort(point_idx, kind='stable')
+    point_idx, part_idx = point_idx[order], part_idx[order]
+    starts = np.flatnonzero(np.r_[True, point_idx[1:] != point_idx[:-1]])
+    return zip(point_idx[starts], np.split(part_idx, starts[1:]))
@@ -0,0 +1,254 @@
+"""
+Export der Pflanzstandorte in Blöcken
+Die Standorte werden direkt aus den Koordinaten-Arrays geschrieben (keine Shapely-Punkte,
+kein to_json() im Speicher), blockweise nach WGS84 transformiert und als Datei abgelegt.
+Neben GeoJSON und CSV gibt es GeoParquet und FlatGeobuf für große Ergebnisse.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from diagnostics import current, timed
+from geo_cache import CACHE_DIR
+from reproject import as_crs, transform_xy
+
+# Standorte pro Block beim Schreiben
+EXPORT_CHUNK = 50_000
+
+# Nachkommastellen für Längen-/Breitengrad (7 ≈ 1 cm)
+COORD_DECIMALS = 7
+
+# gzip-Stufe (6: kaum größer als 9, aber deutlich schneller)
+GZIP_LEVEL = 6
+
+# So viele Export-Dateien bleiben im Cache (die ältesten werden gelöscht)
+MAX_EXPORTS = 20
+
+# Format -> Dateiendung, MIME-Typ und unterstützte Kompression
+EXPORT_FORMATS = {
+    'geojson': {'label': "GeoJSON", 'ext': ".geojson", 'mime': "application/geo+json", 'compression': ['gzip']},
+    'csv': {'label': "CSV", 'ext': ".csv", 'mime': "text/csv", 'compression': ['gzip']},
+    'parquet': {'label': "GeoParquet", 'ext': ".parquet", 'mime': "application/vnd.apache.parquet",
+                'compression': ['zstd', 'snappy', 'gzip']},
+    'fgb': {'label': "FlatGeobuf", 'ext': ".fgb", 'mime': "application/octet-stream", 'compression': ['gzip']}
+}
+
+def _fgb_supported():
+    """FlatGeobuf wird als Arrow-Stream geschrieben: pyogrio mit write_arrow und GDAL >= 3.8"""
+    try:
+        import pyogrio
+    except ImportError:
+        return False
+    return hasattr(pyogrio, 'write_arrow') and tuple(getattr(pyogrio, '__gdal_version__', ())) >= (3, 8)
+
+# Ohne passendes pyogrio wird FlatGeobuf nicht angeboten (App, CLI und write_sites)
+if not _fgb_supported():
+    del EXPORT_FORMATS['fgb']
+
+def to_wgs84(x, y, crs):
+    """Projiziert Koordinaten-Arrays nach EPSG:4326 (lon, lat) - ein Transformer für alle Blöcke"""
+    if crs is None or as_crs(crs).equals(as_crs(4326)):
+        return np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return transform_xy(x, y, crs, 4326)
+
+def _chunks(x, y, crs, chunk_size):
+    """Blöcke (start, lon, lat) - transformiert wird immer nur ein Block"""
+    for start in range(0, len(x), chunk_size):
+        lon, lat = to_wgs84(x[start:start + chunk_size], y[start:start + chunk_size], crs)
+        yield start, np.round(lon, COORD_DECIMALS), np.round(lat, COORD_DECIMALS)
+
+def iter_geojson(x, y, crs, attributes=None, chunk_size=EXPORT_CHUNK):
+    """
+    GeoJSON-FeatureCollection als Folge von Text-Blöcken
+
+    Args:
+        attributes: Dict mit Eigenschaften, die für alle Standorte gleich sind
+    """
+    properties = json.dumps(attributes or {}, ensure_ascii=False)
+    yield '{"type": "FeatureCollection", "features": ['
+    for start, lon, lat in _chunks(x, y, crs, chunk_size):
+        features = ",".join(
+            f'{{"type": "Feature", "id": {start + i + 1}, "properties": {properties}, '
+            f'"geometry": {{"type": "Point", "coordinates": [{a!r}, {b!r}]}}}}'
+            for i, (a, b) in enumerate(zip(lon.tolist(), lat.tolist()))
+        )
+        yield ("," if start > 0 else "") + features
+    yield ']}\n'
+
+def iter_csv(x, y, crs, attributes=None, chunk_size=EXPORT_CHUNK):
+    """CSV mit id, latitude, longitude und den konstanten Attributen als Text-Blöcke"""
+    import csv
+    import io
+
+    attributes = attributes or {}
+    header = io.StringIO()
+    csv.writer(header).writerow(['id', 'latitude', 'longitude', *attributes])
+    yield header.getvalue()
+
+    # Konstante Spalten einmal CSV-gerecht quoten
+    suffix = io.StringIO()
+    csv.writer(suffix).writerow(list(attributes.values()))
+    suffix = ("," + suffix.getvalue().rstrip("\r\n")) if attributes else ""
+
+    for start, lon, lat in _chunks(x, y, crs, chunk_size):
+        yield "".join(f"{start + i + 1},{b!r},{a!r}{suffix}\r\n"
+                      for i, (a, b) in enumerate(zip(lon.tolist(), lat.tolist())))
+
+# WKB eines 2D-Punkts: Byte-Reihenfolge (1 = little endian), Geometrietyp (1 = Point), x, y
+_WKB_POINT = np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+def _wkb_points(lon, lat):
+    """WKB-Punkte als Arrow-Binärspalte direkt aus den Koordinaten (ohne Shapely-Objekte)"""
+    import pyarrow as pa
+
+    records = np.empty(len(lon), dtype=_WKB_POINT)
+    records['order'] = 1
+    records['type'] = 1
+    records['x'] = lon
+    records['y'] = lat
+    offsets = np.arange(len(lon) + 1, dtype=np.int32) * _WKB_POINT.itemsize
+    return pa.Array.from_buffers(pa.binary(), len(lon), [None, pa.py_buffer(offsets), pa.py_buffer(records)])
+
+def _sites_schema(attributes):
+    """Arrow-Schema der binären Formate: id, konstante Attribute, Geometrie als WKB"""
+    import pyarrow as pa
+
+    fields = [pa.field('id', pa.int64())]
+    fields += [pa.field(name, pa.scalar(value).type) for name, value in attributes.items()]
+    fields.append(pa.field('geometry', pa.binary()))
+    return pa.schema(fields)
+
+def _sites_batches(x, y, crs, attributes, schema, chunk_size):
+    """
+    Standorte als Arrow-RecordBatches in WGS84 (nur für die binären Formate)
+
+    ⚡ OPTIMIERUNG: Wie bei GeoJSON/CSV liegt immer nur ein Block im Speicher - kein
+    GeoDataFrame über alle Standorte
+    """
+    import pyarrow as pa
+
+    for start, lon, lat in _chunks(x, y, crs, chunk_size):
+        columns = [pa.array(np.arange(start + 1, start + len(lon) + 1, dtype=np.int64))]
+        columns += [pa.repeat(pa.scalar(value, type=schema.field(name).type), len(lon))
+                    for name, value in attributes.items()]
+        columns.append(_wkb_points(lon, lat))
+        yield pa.record_batch(columns, schema=schema)
+
+def _geoparquet_metadata():
+    """GeoParquet-Metadaten (Version 1.0.0) für die WKB-Punktspalte"""
+    return json.dumps({
+        'version': "1.0.0",
+        'primary_column': 'geometry',
+        'columns': {'geometry': {'encoding': "WKB", 'geometry_types': ["Point"],
+                                 'crs': as_crs(4326).to_json_dict()}}
+    })
+
+@timed()
+def write_sites(x, y, crs, path, fmt='geojson', compression=None, attributes=None, chunk_size=EXPORT_CHUNK):
+    """
+    Schreibt Standorte in eine Datei (atomar über eine temporäre Datei)
+
+    Args:
+        x, y: Koordinaten-Arrays im CRS crs
+        path: Zieldatei
+        fmt: Schlüssel aus EXPORT_FORMATS
+        compression: None oder ein Wert aus EXPORT_FORMATS[fmt]['compression']
+                     (GeoParquet: Codec in der Datei, sonst gzip um die ganze Datei)
+        attributes: Konstante Eigenschaften aller Standorte
+
+    Returns:
+        Path der geschriebenen Datei
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+    if compression is not None and compression not in EXPORT_FORMATS[fmt]['compression']:
+        raise ValueError(f"Kompression {compression} wird für {fmt} nicht unterstützt")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    if fmt in ('geojson', 'csv'):
+        # ⚡ Text-Formate blockweise: höchstens ein Block liegt als String im Speicher
+        chunks = (iter_geojson if fmt == 'geojson' else iter_csv)(x, y, crs, attributes, chunk_size)
+        if compression == 'gzip':
+            f = gzip.open(tmp, 'wt', encoding='utf-8', newline='', compresslevel=GZIP_LEVEL)
+        else:
+            f = open(tmp, 'w', encoding='utf-8', newline='')
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        # Eine Row Group pro Block
+        schema = _sites_schema(attributes or {}).with_metadata({'geo': _geoparquet_metadata()})
+        with pq.ParquetWriter(tmp, schema, compression=compression or 'snappy') as writer:
+            for batch in _sites_batches(x, y, crs, attributes or {}, schema, chunk_size):
+                writer.write_batch(batch)
+    else:
+        import pyarrow as pa
+        import pyogrio
+
+        # FlatGeobuf braucht eine echte Endung; gzip wird danach um die fertige Datei gelegt.
+        # Die Blöcke laufen als Arrow-Stream in einen einzigen Schreibvorgang (append=True
+        # würde die Datei für jeden Block neu schreiben)
+        raw = tmp.with_suffix(".fgb")
+        schema = _sites_schema(attributes or {})
+        batches = pa.RecordBatchReader.from_batches(
+            schema, _sites_batches(x, y, crs, attributes or {}, schema, chunk_size))
+        pyogrio.write_arrow(batches, raw, driver="FlatGeobuf", geometry_name='geometry',
+                            geometry_type='Point', crs="EPSG:4326", layer_options={'SPATIAL_INDEX': 'YES'})
+        if compression == 'gzip':
+            with open(raw, 'rb') as src, gzip.open(tmp, 'wb', compresslevel=GZIP_LEVEL) as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b''):
+                    dst.write(block)
+            raw.unlink()
+        else:
+            os.replace(raw, tmp)
+
+    os.replace(tmp, path)
+    current().update({'standorte': len(x), 'bytes': path.stat().st_size})
+    return path
+
+def export_name(stem, fmt, compression=None):
+    """Dateiname inkl. Endung (z.B. standorte.geojson.gz)"""
+    ext = EXPORT_FORMATS[fmt]['ext']
+    if compression == 'gzip':
+        ext += ".gz"
+    return f"{stem}{ext}"
+
+def export_mime(fmt, compression=None):
+    return "application/gzip" if compression == 'gzip' else EXPORT_FORMATS[fmt]['mime']
+
+def cached_export(x, y, crs, fmt='geojson', compression=None, attributes=None, cache_dir=None):
+    """
+    Export-Datei im Cache (wird nur erzeugt, wenn es sie für diesen Inhalt noch nicht gibt)
+
+    Returns:
+        Path der Datei
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(x, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    digest.update(json.dumps([str(crs), fmt, compression, attributes], sort_keys=True, default=str).encode())
+
+    folder = Path(cache_dir or CACHE_DIR) / "exports"
+    path = folder / export_name(digest.hexdigest(), fmt, compression)
+    if path.exists():
+        return path
+
+    write_sites(x, y, crs, path, fmt, compression, attributes)
+    exports = sorted((p for p in folder.iterdir() if not p.name.endswith(".tmp")),
+                     key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in exports[MAX_EXPORTS:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass  # von einem anderen Prozess gelöscht
+    return path
@@ -0,0 +1,174 @@
+"""
+Persistenter GeoParquet-Cache für Shapefiles
+Jede Quelle wird einmal nach GeoParquet konvertiert und danach per Memory-Mapping geladen.
+Das Shapefile wird nur neu gelesen, wenn sich die Quelldateien geändert haben.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+
+from diagnostics import count, log, span
+
+# Cache-Verzeichnis (per Umgebungsvariable überschreibbar, z.B. für mehrere Replikas)
+CACHE_DIR = os.environ.get("CITY_FOREST_CACHE_DIR", ".cache")
+
+# Dateien, die zusammen ein Shapefile bilden
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# Blockgröße beim Hashen der Quelldateien
+HASH_BLOCK = 1024 * 1024
+
+def _source_files(path):
+    """Alle vorhandenen Bestandteile eines Shapefiles"""
+    path = Path(path)
+    return [p for p in (path.with_suffix(ext) for ext in SHAPEFILE_PARTS) if p.exists()]
+
+def source_signature(path):
+    """Schnelle Signatur aus Größe und mtime aller Bestandteile (ohne Dateiinhalt)"""
+    return [[p.name, p.stat().st_size, p.stat().st_mtime_ns] for p in _source_files(path)]
+
+def folder_signature(folder):
+    """Signatur aller Shapefiles eines Ordners (ändert sich bei jeder neuen/geänderten Datei)"""
+    return [[str(p), source_signature(p)] for p in sorted(Path(folder).glob("*.shp"))]
+
+def source_hash(path):
+    """SHA-1 über den Inhalt aller Bestandteile"""
+    digest = hashlib.sha1()
+    for p in _source_files(path):
+        digest.update(p.name.encode())
+        with open(p, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _cache_paths(path, cache_dir):
+    """Parquet-Datei und Manifest für eine Quelle (Quellordner im Namen gegen Kollisionen)"""
+    path = Path(path).resolve()
+    folder = hashlib.sha1(str(path.parent).encode()).hexdigest()[:8]
+    base = Path(cache_dir) / "geoparquet" / f"{path.stem}-{folder}"
+    return base.with_suffix('.parquet'), base.with_suffix('.json')
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_atomic(target, write):
+    """Schreibt über eine temporäre Datei, damit parallele Prozesse nie halbe Dateien sehen"""
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    write(tmp)
+    os.replace(tmp, target)
+
+def filter_frame(gdf, columns=None, bbox=None, bbox_crs=None):
+    """
+    Spalten-Projektion und Bounding-Box-Filter
+
+    Args:
+        columns: Zu behaltende Attributspalten (None = alle, [] = nur Geometrie)
+        bbox: (minx, miny, maxx, maxy) - nur Features, die die Box schneiden
+        bbox_crs: CRS der Box (Standard: CRS des Layers)
+    """
+    if columns is not None:
+        keep = [c for c in columns if c in gdf.columns and c != gdf.geometry.name]
+        gdf = gdf[keep + [gdf.geometry.name]]
+
+    if bbox is not None and len(gdf) > 0:
+        region = shapely.box(*bbox)
+        if bbox_crs is not None and gdf.crs is not None and gdf.crs != bbox_crs:
+            region = gpd.GeoSeries([region], crs=bbox_crs).to_crs(gdf.crs).iloc[0]
+        shapely.prepare(region)
+        gdf = gdf[shapely.intersects(region, gdf.geometry.values)]
+
+    return gdf
+
+@lru_cache(maxsize=32)
+def _parse_crs(crs_json):
+    """CRS aus den GeoParquet-Metadaten (gemerkt - das Parsen von PROJJSON ist teuer)"""
+    from pyproj import CRS
+    crs = json.loads(crs_json)
+    return CRS.from_user_input(crs) if crs is not None else None
+
+def _read_parquet(parquet_path, columns):
+    """
+    Liest nur die benötigten Spalten (Parquet ist spaltenweise, der Rest wird nie geladen)
+    ⚡ Direkt über pyarrow mit gemerktem CRS statt gpd.read_parquet
+    """
+    import pyarrow.parquet as pq
+
+    if columns is not None:
+        names = pq.read_schema(parquet_path).names
+        columns = [c for c in columns if c in names and c != 'geometry'] + ['geometry']
+
+    table = pq.read_table(parquet_path, columns=columns, memory_map=True)
+    geo = json.loads(table.schema.metadata[b'geo'])
+    crs = _parse_crs(json.dumps(geo['columns']['geometry'].get('crs', 'OGC:CRS84')))
+
+    geometry = shapely.from_wkb(table.column('geometry').to_numpy(zero_copy_only=False))
+    return gpd.GeoDataFrame(table.drop(['geometry']).to_pandas(), geometry=geometry, crs=crs)
+
+def read_cached(path, cache_dir=None, columns=None, bbox=None, bbox_crs=None):
+    """
+    Lädt ein Shapefile über den GeoParquet-Cache
+
+    Ablauf:
+        1. Signatur (Größe + mtime) unverändert → Parquet laden
+        2. Sonst Inhalt hashen; Hash unverändert (z.B. nur kopiert) → Parquet laden
+        3. Sonst Shapefile lesen und Cache neu schreiben
+    Ohne pyarrow wird direkt das Shapefile gelesen.
+    Der Cache enthält immer den vollständigen Layer, Spalten und Box werden beim Lesen gefiltert.
+
+    Args:
+        path: Pfad zur .shp Datei
+        cache_dir: Cache-Verzeichnis (Standard: CACHE_DIR)
+        columns: Zu behaltende Attributspalten (None = alle, [] = nur Geometrie)
+        bbox: Optional (minx, miny, maxx, maxy) zum Filtern der Features
+        bbox_crs: CRS der Box
+
+    Returns:
+        GeoDataFrame
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return filter_frame(gpd.read_file(path), columns, bbox, bbox_crs)
+
+    parquet_path, manifest_path = _cache_paths(path, cache_dir or CACHE_DIR)
+    signature = source_signature(path)
+    manifest = _read_manifest(manifest_path)
+
+    if manifest is not None and parquet_path.exists():
+        if manifest.get('signature') == signature:
+            count('geoparquet_cache_requests_total', result='hit')
+            return filter_frame(_read_parquet(parquet_path, columns), None, bbox, bbox_crs)
+
+        content_hash = source_hash(path)
+        if manifest.get('sha1') == content_hash:
+            manifest['signature'] = signature
+            _write_atomic(manifest_path, lambda p: p.write_text(json.dumps(manifest)))
+            count('geoparquet_cache_requests_total', result='hit')
+            return filter_frame(_read_parquet(parquet_path, columns), None, bbox, bbox_crs)
+    else:
+        content_hash = source_hash(path)
+
+    # ⚡ Einmalig: Shapefile lesen und als GeoParquet ablegen
+    count('geoparquet_cache_requests_total', result='miss')
+    with span('read_shapefile', datei=Path(path).name):
+        gdf = gpd.read_file(path)
+    try:
+        parquet_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(parquet_path, lambda p: gdf.to_parquet(p))
+        manifest = {'source': str(Path(path).resolve()), 'signature': signature, 'sha1': content_hash}
+        _write_atomic(manifest_path, lambda p: p.write_text(json.dumps(manifest)))
+        log(f"  💾 GeoParquet-Cache geschrieben: {parquet_path.name}")
+    except Exception as e:
+        log(f"  ⚠ GeoParquet-Cache nicht geschrieben ({Path(path).name}): {e}")
+
+    return filter_frame(gdf, columns, bbox, bbox_crs)
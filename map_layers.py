@@ -0,0 +1,347 @@
+"""
+Kartenebenen für große Punktmengen
+Statt eines folium.CircleMarker pro Zeile wird jede Punktmenge in einem Durchgang als
+Koordinaten-Array serialisiert und im Browser auf Canvas-Kacheln gezeichnet. Die Seite
+wächst dadurch nur um 8 Byte pro Punkt, die Python-Seite braucht keine Schleife.
+Mit dem Kachel-Server (tile_server.py) lädt VectorTiles stattdessen nur die sichtbaren Kacheln.
+"""
+
+import base64
+import json
+
+import numpy as np
+import shapely
+from branca.element import Element
+from folium.map import Layer
+from jinja2 import Template
+
+# Nachkommastellen der Koordinaten im Browser (Mikrograd ≈ 10 cm)
+COORD_SCALE = 1e6
+
+def point_payload(points):
+    """
+    Koordinaten als base64-kodiertes Int32-Array [lat0, lon0, lat1, lon1, ...] in Mikrograd
+
+    Die Punkte werden nach Länge sortiert - im Browser findet eine Binärsuche so die
+    Punkte einer Kachel (bzw. eines Klicks), ohne alle Punkte zu durchlaufen.
+
+    Args:
+        points: GeoDataFrame, GeoSeries oder Geometrie-Array mit Punkten in EPSG:4326
+
+    Returns:
+        Tuple (payload, anzahl)
+    """
+    coords = shapely.get_coordinates(np.asarray(getattr(points, 'geometry', points)))
+    coords = coords[np.argsort(coords[:, 0], kind='stable')]
+    micro = np.round(coords[:, ::-1] * COORD_SCALE).astype('<i4')
+    return base64.b64encode(micro.tobytes()).decode('ascii'), len(coords)
+
+class _ScriptData(Element):
+    """
+    Fertiger JavaScript-Code ohne eigenes Template
+
+    branca übersetzt die Ausgabe jedes script-Makros erneut als Jinja-Template - bei
+    MB-großen Koordinaten-Strings dauert das Sekunden. Dieses Element gibt den Code
+    über ein festes Template nur aus.
+    """
+
+    _template = Template(u"{{ this.code }}")
+
+    def __init__(self, code):
+        super().__init__()
+        self._name = "ScriptData"
+        self.code = code
+
+class CanvasPoints(Layer):
+    """
+    Alle Punkte einer Ebene als ein Canvas-Layer (L.GridLayer)
+
+    Jede Kachel zeichnet nur die Punkte in ihrem Längenbereich; ein Popup (für alle
+    Punkte gleich) öffnet sich beim Klick auf den nächstgelegenen Punkt.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            if (!L.CanvasPoints) {
+                L.CanvasPoints = L.GridLayer.extend({
+                    initialize: function (data, options) {
+                        L.setOptions(this, options);
+                        var raw = atob(data), bytes = new Uint8Array(raw.length);
+                        for (var i = 0; i < raw.length; i++) { bytes[i] = raw.charCodeAt(i); }
+                        var coords = new Int32Array(bytes.buffer), n = coords.length / 2;
+                        this._lat = new Float64Array(n);
+                        this._lon = new Float64Array(n);
+                        this._x = new Float64Array(n);
+                        this._y = new Float64Array(n);
+                        for (i = 0; i < n; i++) {
+                            var lat = coords[2 * i] / options.scale, lon = coords[2 * i + 1] / options.scale;
+                            var s = Math.sin(lat * Math.PI / 180);
+                            this._lat[i] = lat;
+                            this._lon[i] = lon;
+                            // Web-Mercator normiert auf [0, 1] - einmal pro Punkt, nicht pro Kachel
+                            this._x[i] = (lon + 180) / 360;
+                            this._y[i] = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+                        }
+                    },
+                    _first: function (x) {
+                        var lo = 0, hi = this._x.length;
+                        while (lo < hi) {
+                            var mid = (lo + hi) >> 1;
+                            if (this._x[mid] < x) { lo = mid + 1; } else { hi = mid; }
+                        }
+                        return lo;
+                    },
+                    createTile: function (coords) {
+                        var tile = L.DomUtil.create('canvas', 'leaflet-tile');
+                        var size = this.getTileSize(), o = this.options;
+                        tile.width = size.x;
+                        tile.height = size.y;
+                        var scale = size.x * Math.pow(2, coords.z), pad = o.radius + o.weight;
+                        var ox = coords.x * size.x, oy = coords.y * size.y;
+                        var ctx = tile.getContext('2d');
+                        ctx.beginPath();
+                        for (var i = this._first((ox - pad) / scale); i < this._x.length; i++) {
+                            var px = this._x[i] * scale - ox;
+                            if (px > size.x + pad) { break; }
+                            var py = this._y[i] * scale - oy;
+                            if (py < -pad || py > size.y + pad) { continue; }
+                            ctx.moveTo(px + o.radius, py);
+                            ctx.arc(px, py, o.radius, 0, 2 * Math.PI);
+                        }
+                        ctx.globalAlpha = o.fillOpacity;
+                        ctx.fillStyle = o.fillColor;
+                        ctx.fill();
+                        if (o.weight > 0) {
+                            ctx.globalAlpha = 1;
+                            ctx.lineWidth = o.weight;
+                            ctx.strokeStyle = o.color;
+                            ctx.stroke();
+                        }
+                        return tile;
+                    },
+                    onAdd: function (map) {
+                        L.GridLayer.prototype.onAdd.call(this, map);
+                        if (this.options.popup) { map.on('click', this._onClick, this); }
+                    },
+                    onRemove: function (map) {
+                        map.off('click', this._onClick, this);
+                        L.GridLayer.prototype.onRemove.call(this, map);
+                    },
+                    _onClick: function (e) {
+                        var map = this._map, scale = this.getTileSize().x * Math.pow(2, map.getZoom());
+                        var p = map.project(e.latlng, map.getZoom()), tolerance = this.options.radius + 3;
+                        var best = -1, bestDist = tolerance * tolerance;
+                        for (var i = this._first((p.x - tolerance) / scale); i < this._x.length; i++) {
+                            var dx = this._x[i] * scale - p.x;
+                            if (dx > tolerance) { break; }
+                            var dy = this._y[i] * scale - p.y, dist = dx * dx + dy * dy;
+                            if (dist <= bestDist) { best = i; bestDist = dist; }
+                        }
+                        if (best >= 0) {
+                            L.popup().setLatLng([this._lat[best], this._lon[best]])
+                                .setContent(this.options.popup).openOn(map);
+                        }
+                    }
+                });
+            }
+            var {{ this.get_name() }} = new L.CanvasPoints(
+                {{ this.get_name() }}_data,
+                {{ this.options }}
+            ){% if this.show %}.addTo({{ this._parent.get_name() }}){% endif %};
+        {% endmacro %}
+        """)
+
+    def __init__(self, points, name=None, radius=3, color='blue', fill_color=None, fill_opacity=0.8,
+                 weight=1, popup=None, overlay=True, control=True, show=True):
+        """
+        Args:
+            points: Punkte in EPSG:4326 (GeoDataFrame, GeoSeries oder Geometrie-Array)
+            radius, color, fill_color, fill_opacity, weight: Darstellung wie folium.CircleMarker
+            popup: Text für alle Punkte (None = kein Popup)
+        """
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "CanvasPoints"
+        self.payload, self.count = point_payload(points)
+        self.options = json.dumps({
+            'scale': COORD_SCALE,
+            'radius': radius,
+            'color': color,
+            'fillColor': fill_color or color,
+            'fillOpacity': fill_opacity,
+            'weight': weight,
+            'popup': popup,
+            # Punkte über den Zonen-Polygonen (wie zuvor die Marker)
+            'pane': 'markerPane',
+            'updateWhenZooming': False
+        }, ensure_ascii=False)
+
+    def render(self, **kwargs):
+        # ⚡ Koordinaten als eigene Variable vor dem Layer, am Jinja-Lexer vorbei
+        self.get_root().script.add_child(
+            _ScriptData(f'var {self.get_name()}_data = "{self.payload}";'),
+            name=f"{self.get_name()}_data"
+        )
+        super().render(**kwargs)
+
+class VectorTiles(Layer):
+    """
+    Vektor-Kacheln vom Kachel-Server (tile_server.py) als Canvas-Layer
+
+    Geladen werden nur die sichtbaren Kacheln; jede wird beim Eintreffen auf ein Canvas
+    gezeichnet. Flächen können über eine Palette nach ihrem Wert eingefärbt werden, Popups
+    kommen pro Feature aus der Kachel oder für alle gleich aus popup.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            if (!L.VectorTiles) {
+                L.VectorTiles = L.GridLayer.extend({
+                    initialize: function (url, options) {
+                        this._url = url;
+                        this._data = {};
+                        L.setOptions(this, options);
+                        this.on('tileunload', function (e) {
+                            delete this._data[this._tileCoordsToKey(e.coords)];
+                        }, this);
+                    },
+                    createTile: function (coords, done) {
+                        var tile = L.DomUtil.create('canvas', 'leaflet-tile'), size = this.getTileSize();
+                        var key = this._tileCoordsToKey(coords), layer = this;
+                        tile.width = size.x;
+                        tile.height = size.y;
+                        fetch(L.Util.template(this._url, coords))
+                            .then(function (r) { return r.status === 200 ? r.json() : null; })
+                            .then(function (data) {
+                                if (data) { layer._data[key] = layer._draw(tile, data); }
+                                done(null, tile);
+                            })
+                            .catch(function (err) { done(err, tile); });
+                        return tile;
+                    },
+                    _fill: function (data, f) {
+                        var o = this.options;
+                        if (!o.palette || !data.v) { return o.fillColor; }
+                        var t = (data.v[f] - o.vmin) / (o.vmax - o.vmin);
+                        var i = Math.round(Math.max(0, Math.min(1, t)) * (o.palette.length - 1));
+                        return o.palette[i];
+                    },
+                    _draw: function (tile, data) {
+                        var ctx = tile.getContext('2d'), o = this.options, k = tile.width / data.e;
+                        ctx.setLineDash(o.dashArray || []);
+                        ctx.lineWidth = o.weight;
+                        if (data.k === 'point') {
+                            ctx.beginPath();
+                            for (var i = 0; i < data.xy.length; i += 2) {
+                                var px = data.xy[i] * k, py = data.xy[i + 1] * k;
+                                ctx.moveTo(px + o.radius, py);
+                                ctx.arc(px, py, o.radius, 0, 2 * Math.PI);
+                            }
+                            ctx.globalAlpha = o.fillOpacity;
+                            ctx.fillStyle = o.fillColor;
+                            ctx.fill();
+                            if (o.weight > 0) {
+                                ctx.globalAlpha = 1;
+                                ctx.strokeStyle = o.color;
+                                ctx.stroke();
+                            }
+                            return {data: data, k: k};
+                        }
+                        var paths = [];
+                        for (var f = 0; f < data.f.length; f++) {
+                            var path = new Path2D(), rings = data.f[f];
+                            for (var r = 0; r < rings.length; r++) {
+                                var ring = rings[r];
+                                path.moveTo(ring[0] * k, ring[1] * k);
+                                for (var j = 2; j < ring.length; j += 2) { path.lineTo(ring[j] * k, ring[j + 1] * k); }
+                                if (data.k === 'polygon') { path.closePath(); }
+                            }
+                            var fill = this._fill(data, f);
+                            if (data.k === 'polygon') {
+                                ctx.globalAlpha = o.fillOpacity;
+                                ctx.fillStyle = fill;
+                                ctx.fill(path, 'evenodd');
+                            }
+                            if (o.weight > 0) {
+                                ctx.globalAlpha = 1;
+                                ctx.strokeStyle = o.palette && data.v ? fill : o.color;
+                                ctx.stroke(path);
+                            }
+                            paths.push(path);
+                        }
+                        return {data: data, k: k, paths: paths};
+                    },
+                    onAdd: function (map) {
+                        L.GridLayer.prototype.onAdd.call(this, map);
+                        map.on('click', this._onClick, this);
+                    },
+                    onRemove: function (map) {
+                        map.off('click', this._onClick, this);
+                        L.GridLayer.prototype.onRemove.call(this, map);
+                    },
+                    _onClick: function (e) {
+                        var map = this._map, z = this._tileZoom, size = this.getTileSize();
+                        if (z === undefined) { return; }
+                        var p = map.project(e.latlng, z), tx = Math.floor(p.x / size.x), ty = Math.floor(p.y / size.y);
+                        var entry = this._data[tx + ':' + ty + ':' + z];
+                        if (!entry) { return; }
+                        var d = entry.data, px = p.x - tx * size.x, py = p.y - ty * size.y, text = null, at = e.latlng;
+                        if (d.k === 'point') {
+                            if (!this.options.popup) { return; }
+                            var best = Math.pow(this.options.radius + 3, 2);
+                            for (var i = 0; i < d.xy.length; i += 2) {
+                                var dx = d.xy[i] * entry.k - px, dy = d.xy[i + 1] * entry.k - py;
+                                if (dx * dx + dy * dy <= best) {
+                                    best = dx * dx + dy * dy;
+                                    text = this.options.popup;
+                                    at = map.unproject([tx * size.x + d.xy[i] * entry.k, ty * size.y + d.xy[i + 1] * entry.k], z);
+                                }
+                            }
+                        } else if (d.p || this.options.popup) {
+                            var ctx = this._hitContext || (this._hitContext = document.createElement('canvas').getContext('2d'));
+                            for (var f = entry.paths.length - 1; f >= 0 && text === null; f--) {
+                                if (ctx.isPointInPath(entry.paths[f], px, py, 'evenodd')) {
+                                    text = d.p ? d.p[f] : this.options.popup;
+                                }
+                            }
+                        }
+                        if (text !== null) { L.popup().setLatLng(at).setContent(text).openOn(map); }
+                    }
+                });
+            }
+            var {{ this.get_name() }} = new L.VectorTiles(
+                {{ this.url }},
+                {{ this.options }}
+            ){% if this.show %}.addTo({{ this._parent.get_name() }}){% endif %};
+        {% endmacro %}
+        """)
+
+    def __init__(self, url, bounds=None, name=None, radius=3, color='blue', fill_color=None, fill_opacity=0.8,
+                 weight=1, dash_array=None, palette=None, vmin=0, vmax=1, popup=None, pane=None,
+                 overlay=True, control=True, show=True):
+        """
+        Args:
+            url, bounds: Ergebnis von TileServer.register()
+            radius, color, fill_color, fill_opacity, weight: Darstellung wie folium.CircleMarker/GeoJson
+            dash_array: Strichmuster der Umrisse, z.B. [10, 5]
+            palette: Liste von Farben für Werte von vmin bis vmax (Kachel-Spalte 'v')
+            popup: Text für alle Features ohne eigenen Popup-Text
+            pane: Leaflet-Pane (Standard: Punkte über den Flächen)
+        """
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "VectorTiles"
+        self.url = json.dumps(url)
+        self.options = json.dumps({
+            'bounds': bounds,
+            'radius': radius,
+            'color': color,
+            'fillColor': fill_color or color,
+            'fillOpacity': fill_opacity,
+            'weight': weight,
+            'dashArray': dash_array,
+            'palette': palette,
+            'vmin': vmin,
+            'vmax': vmax,
+            'popup': popup,
+            'pane': pane or 'overlayPane',
+            'updateWhenZooming': False
+        }, ensure_ascii=False)
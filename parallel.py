@@ -0,0 +1,88 @@
+"""
+Parallele Ausführung der Standortsuche auf mehreren CPU-Kernen
+Geometrien werden als WKB übertragen, Ergebnisse als numpy-Arrays
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from analysis import evaluate_tile, iter_tiles, _distance_checks, _exclusion_parts, _tile_cells
+from diagnostics import current, log, timed
+
+# Zustand der Worker-Prozesse (wird einmal pro Prozess im Initializer gesetzt)
+_worker_parts = None
+_worker_tree = None
+_worker_distance_checks = ()
+
+def default_workers():
+    """Anzahl der verfügbaren CPU-Kerne"""
+    return os.cpu_count() or 1
+
+def _init_planting_worker(parts_wkb, distance_zones):
+    """Baut die Zonenteile und die Spatial Indizes einmal pro Worker auf"""
+    global _worker_parts, _worker_tree, _worker_distance_checks
+    _worker_parts = shapely.from_wkb(parts_wkb)
+    _worker_tree = shapely.STRtree(_worker_parts)
+    _worker_distance_checks = [(shapely.STRtree(shapely.points(coords)), abstand)
+                               for coords, abstand in distance_zones]
+
+def _planting_tile_task(task):
+    """Wertet eine Kachel im Worker aus"""
+    x_coords, y_coords, grid_spacing = task
+    return evaluate_tile(_worker_parts, _worker_tree, x_coords, y_coords, grid_spacing,
+                         _worker_distance_checks)
+
+@timed()
+def find_planting_coords_parallel(ausschlusszonen_dict, bounds, grid_spacing=20,
+                                  workers=None, tile_size=None, memory_budget_mb=256):
+    """
+    Sucht Pflanzstandorte kachelweise in einem Prozess-Pool
+
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen
+        bounds: Bounding Box [minx, miny, maxx, maxy]
+        grid_spacing: Abstand zwischen Punkten in Metern
+        workers: Anzahl der Prozesse (Standard: alle CPU-Kerne)
+        tile_size: Kachelgröße in Metern (Standard: mehrere Kacheln pro Worker)
+        memory_budget_mb: Speicherbudget pro Kachel in MB
+
+    Returns:
+        Tuple (x, y) mit den Koordinaten der geeigneten Standorte
+    """
+    workers = workers or default_workers()
+
+    # Mindestens ~4 Kacheln pro Worker für gleichmäßige Auslastung
+    if tile_size is None:
+        minx, miny, maxx, maxy = bounds
+        side = max(maxx - minx, maxy - miny)
+        tile_size = min(side / np.ceil(np.sqrt(4 * workers)),
+                        _tile_cells(grid_spacing, None, memory_budget_mb) * grid_spacing)
+
+    tasks = [(x_coords, y_coords, grid_spacing)
+             for x_coords, y_coords in iter_tiles(bounds, grid_spacing, tile_size)
+             if len(x_coords) > 0 and len(y_coords) > 0]
+
+    log(f"\n⚙️ Parallele Standortsuche: {len(tasks)} Kacheln auf {workers} Prozessen")
+
+    parts_wkb = shapely.to_wkb(_exclusion_parts(ausschlusszonen_dict))
+
+    # Abstandszonen als reine Koordinaten-Arrays übertragen
+    distance_zones = [(shapely.get_coordinates(tree.geometries), abstand)
+                      for tree, abstand in _distance_checks(ausschlusszonen_dict)]
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_planting_worker,
+                             initargs=(parts_wkb, distance_zones)) as executor:
+        results = list(executor.map(_planting_tile_task, tasks))
+
+    if not results:
+        return np.empty(0), np.empty(0)
+
+    xx = np.concatenate([x for x, y in results])
+    yy = np.concatenate([y for x, y in results])
+    log(f"  ✓ {len(xx)} geeignete Standorte gefunden")
+    current().update({'standorte': len(xx), 'kacheln': len(tasks), 'worker': workers})
+    return xx, yy
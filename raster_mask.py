@@ -0,0 +1,464 @@
+"""
+Rasterisierte Ausschluss-Maske für die interaktive Standortsuche
+Die Zonen werden einmal in ein boolesches numpy-Gitter gebrannt,
+jeder Rasterabstand ist danach nur noch ein (gestrideter) Array-Zugriff.
+"""
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from analysis import is_distance_zone
+from diagnostics import current, log, timed
+
+# Anzahl Gitterzeilen, die pro Durchgang gefüllt werden (begrenzt den Zwischenspeicher)
+BAND_ROWS = 1024
+
+def _lattice_axes(bounds, step):
+    """Achsen eines Gitters mit Ursprung in (minx, miny) - identisch zu np.arange im Vektorpfad"""
+    minx, miny, maxx, maxy = bounds
+    return np.arange(minx, maxx, step), np.arange(miny, maxy, step)
+
+def _ring_edges(geom):
+    """Alle Kanten der Polygon-Ringe als Arrays (x0, y0, x1, y1, polygon) - polygon = Index des Teils"""
+    parts = shapely.get_parts(geom)
+    parts = parts[shapely.get_type_id(parts) == 3]  # nur Polygone
+    rings, part_idx = shapely.get_rings(parts, return_index=True)
+    coords, ring_idx = shapely.get_coordinates(rings, return_index=True)
+
+    same_ring = ring_idx[:-1] == ring_idx[1:]
+    start = coords[:-1][same_ring]
+    end = coords[1:][same_ring]
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1], part_idx[ring_idx[:-1][same_ring]]
+
+def _merge_intervals(rows, x_in, x_out):
+    """
+    Vereinigt überlappende bzw. berührende Innen-Intervalle pro Zeile
+    (ein gemeinsamer Rand zweier Teile liegt dann im Inneren, wie bei der Union)
+    """
+    order = np.lexsort((x_in, rows))
+    rows, x_in, x_out = rows[order], x_in[order], x_out[order]
+
+    # Laufendes Maximum von x_out pro Zeile: Zeilen über einen Versatz getrennt
+    xmin = x_in.min()
+    span = (x_out - xmin).max() + 1.0
+    offset = rows * span
+    reach = np.maximum.accumulate(x_out - xmin + offset)
+    starts = np.flatnonzero(np.r_[True, (x_in - xmin + offset)[1:] > reach[:-1]])
+    return rows[starts], x_in[starts], np.maximum.reduceat(x_out, starts)
+
+def rasterize_geometry(geom, origin, resolution, shape, out=None, window=None):
+    """
+    Brennt Polygon-Geometrien in ein Gitter
+
+    Ein Gitterpunkt (origin + index * resolution) gilt als ausgeschlossen, wenn er
+    strikt im Inneren liegt - wie contains() im Vektorpfad (Scanline, Even-Odd-Regel
+    pro Polygon). Mehrere Geometrien (z.B. die Zeilen einer nicht dissolvten Zone)
+    dürfen sich überlappen oder berühren: ihre Intervalle werden pro Zeile vereinigt.
+
+    Args:
+        geom: Polygon, MultiPolygon oder Array davon
+        origin: (minx, miny) des Gitters
+        resolution: Gitterweite in Metern
+        shape: (zeilen, spalten) des Gitters
+        out: Optional bestehende Maske, die per ODER ergänzt wird
+        window: Optional (zeile0, zeile1, spalte0, spalte1) - nur dieser Ausschnitt des
+                Gitters wird gefüllt, die Maske hat dann die Form des Ausschnitts
+
+    Returns:
+        Boolesche Maske der Form shape bzw. window (Zeile = y, Spalte = x)
+    """
+    r0, r1, c0, c1 = window if window is not None else (0, shape[0], 0, shape[1])
+    mask = out if out is not None else np.zeros((r1 - r0, c1 - c0), dtype=bool)
+    if geom is None:
+        return mask
+
+    ox, oy = origin
+    x0, y0, x1, y1, polygon = _ring_edges(geom)
+
+    # Horizontale Kanten schneiden keine Scanline
+    keep = y0 != y1
+    x0, y0, x1, y1, polygon = x0[keep], y0[keep], x1[keep], y1[keep], polygon[keep]
+
+    # Zeilen j mit ymin <= y_j < ymax (halboffen, damit Eckpunkte nicht doppelt zählen)
+    ymin = np.minimum(y0, y1)
+    ymax = np.maximum(y0, y1)
+    row_lo = np.clip(np.ceil((ymin - oy) / resolution), r0, r1).astype(np.int64)
+    row_hi = np.clip(np.ceil((ymax - oy) / resolution), r0, r1).astype(np.int64)
+    counts = row_hi - row_lo
+    if counts.sum() == 0:
+        return mask
+
+    # ⚡ Alle Schnittpunkte Kante x Scanline auf einmal
+    edge = np.repeat(np.arange(len(counts)), counts)
+    rows = row_lo[edge] + (np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts))
+    y_scan = oy + rows * resolution
+    t = (y_scan - y0[edge]) / (y1[edge] - y0[edge])
+    x_cross = x0[edge] + t * (x1[edge] - x0[edge])
+
+    # Pro Polygon und Zeile sortiert, je zwei Schnittpunkte bilden ein Innen-Intervall
+    order = np.lexsort((x_cross, rows, polygon[edge]))
+    rows = rows[order][0::2]
+    x_in = x_cross[order][0::2]
+    x_out = x_cross[order][1::2]
+    if polygon.max() > 0:
+        rows, x_in, x_out = _merge_intervals(rows, x_in, x_out)
+
+    # Strikt innen: x_in < x_i < x_out
+    col_start = np.clip(np.floor((x_in - ox) / resolution).astype(np.int64) + 1, c0, c1) - c0
+    col_end = np.clip(np.ceil((x_out - ox) / resolution).astype(np.int64), c0, c1) - c0
+    valid = col_start < col_end
+    rows, col_start, col_end = rows[valid] - r0, col_start[valid], col_end[valid]
+
+    # Intervalle bandweise per Differenz-Array + cumsum füllen
+    n_rows, n_cols = mask.shape
+    for band_start in range(0, n_rows, BAND_ROWS):
+        band_end = min(band_start + BAND_ROWS, n_rows)
+        in_band = (rows >= band_start) & (rows < band_end)
+        if not in_band.any():
+            continue
+
+        diff = np.zeros((band_end - band_start, n_cols + 1), dtype=np.int8)
+        np.add.at(diff, (rows[in_band] - band_start, col_start[in_band]), 1)
+        np.add.at(diff, (rows[in_band] - band_start, col_end[in_band]), -1)
+        mask[band_start:band_end] |= np.cumsum(diff, axis=1, dtype=np.int8)[:, :n_cols] > 0
+
+    return mask
+
+# Bäume pro Durchgang beim Stempeln der Abstandskreise
+STAMP_CHUNK = 20_000
+
+def stamp_distance_zone(points_xy, abstand, origin, resolution, shape, out=None, window=None):
+    """
+    Markiert alle Gitterpunkte, die näher als abstand an einem der Punkte liegen
+    ⚡ Ein Kreis-Stempel pro Punkt, vektorisiert über alle Punkte (kein Buffer, kein Dissolve)
+
+    window wie bei rasterize_geometry
+    """
+    r0, r1, c0, c1 = window if window is not None else (0, shape[0], 0, shape[1])
+    mask = out if out is not None else np.zeros((r1 - r0, c1 - c0), dtype=bool)
+    if len(points_xy) == 0 or abstand <= 0:
+        return mask
+
+    ox, oy = origin
+    k = int(np.ceil(abstand / resolution)) + 1
+    offsets = np.arange(-k, k + 1)
+    di, dj = [a.ravel() for a in np.meshgrid(offsets, offsets)]
+
+    for start in range(0, len(points_xy), STAMP_CHUNK):
+        px = points_xy[start:start + STAMP_CHUNK, 0:1]
+        py = points_xy[start:start + STAMP_CHUNK, 1:2]
+        cols = np.floor((px - ox) / resolution).astype(np.int64) + di
+        rows = np.floor((py - oy) / resolution).astype(np.int64) + dj
+
+        # Exakter Abstand Gitterpunkt - Baum, strikt kleiner als der Mindestabstand
+        dist2 = (ox + cols * resolution - px) ** 2 + (oy + rows * resolution - py) ** 2
+        hit = (dist2 < abstand ** 2) & (cols >= c0) & (cols < c1) & (rows >= r0) & (rows < r1)
+        mask[rows[hit] - r0, cols[hit] - c0] = True
+
+    return mask
+
+def _zone_window(zone, bounds, resolution, shape):
+    """Ausschnitt (zeile0, zeile1, spalte0, spalte1) des Gitters, den eine Zone abdecken kann"""
+    minx, miny, maxx, maxy = zone.total_bounds
+    margin = float(zone['abstand'].max()) if is_distance_zone(zone) else 0.0
+    ox, oy = bounds[0], bounds[1]
+    n_rows, n_cols = shape
+    r0 = int(np.clip(np.floor((miny - margin - oy) / resolution), 0, n_rows))
+    r1 = int(np.clip(np.ceil((maxy + margin - oy) / resolution) + 1, 0, n_rows))
+    c0 = int(np.clip(np.floor((minx - margin - ox) / resolution), 0, n_cols))
+    c1 = int(np.clip(np.ceil((maxx + margin - ox) / resolution) + 1, 0, n_cols))
+    return r0, max(r0, r1), c0, max(c0, c1)
+
+def _burn_zone(zone, bounds, resolution, shape):
+    """
+    Brennt eine Zone (Fläche oder Abstandszone) in ihren Ausschnitt des Gitters
+
+    Returns:
+        Tuple (window, maske) - boolesche Maske in der Form des Ausschnitts
+    """
+    window = _zone_window(zone, bounds, resolution, shape)
+    origin = (bounds[0], bounds[1])
+    if is_distance_zone(zone):
+        burned = stamp_distance_zone(shapely.get_coordinates(zone.geometry.values), float(zone['abstand'].iloc[0]),
+                                     origin, resolution, shape, window=window)
+    else:
+        burned = rasterize_geometry(zone.geometry.values, origin, resolution, shape, window=window)
+    return window, burned
+
+def _count_dtype(n):
+    """Kleinster Ganzzahl-Typ für bis zu n überlappende Zonen"""
+    return np.promote_types(np.uint8, np.min_scalar_type(n))
+
+@timed()
+def build_exclusion_mask(ausschlusszonen_dict, bounds, resolution=1.0):
+    """
+    Brennt alle Ausschlusszonen in ein Gitter
+
+    Jeder Gitterpunkt zählt, wie viele Zonen ihn abdecken (0 = frei). Eine entsperrte
+    Zone lässt sich so in ihrem Ausschnitt wieder abziehen, ohne die Maske neu zu bauen.
+
+    Args:
+        ausschlusszonen_dict: Dict mit allen Ausschlusszonen
+        bounds: Bounding Box [minx, miny, maxx, maxy]
+        resolution: Gitterweite der Maske in Metern
+
+    Returns:
+        Dict mit 'mask' (Anzahl Zonen pro Gitterpunkt), 'bounds', 'resolution' und 'crs'
+    """
+    log(f"\n🧱 Erzeuge Ausschluss-Maske ({resolution}m)...")
+
+    x_axis, y_axis = _lattice_axes(bounds, resolution)
+    shape = (len(y_axis), len(x_axis))
+    zones = [zone for zone in ausschlusszonen_dict.values() if zone is not None and len(zone) > 0]
+    mask = np.zeros(shape, dtype=_count_dtype(len(zones)))
+    crs = None
+
+    # Jede Zone einzeln brennen (die Maske zählt Zonen, nicht deren Teile)
+    for zone in zones:
+        crs = crs or zone.crs
+        (r0, r1, c0, c1), burned = _burn_zone(zone, bounds, resolution, shape)
+        mask[r0:r1, c0:c1] += burned
+
+    log(f"  ✓ Maske {shape[1]}x{shape[0]} ({mask.nbytes / 1024 / 1024:.0f} MB), "
+          f"{(mask > 0).mean() * 100:.1f}% ausgeschlossen")
+
+    return {
+        'mask': mask,
+        'bounds': tuple(bounds),
+        'resolution': resolution,
+        'crs': crs
+    }
+
+@timed()
+def add_zone_to_mask(mask_info, zone):
+    """
+    Maske mit einer zusätzlichen Zone (das übergebene Dict bleibt unverändert)
+    ⚡ Nur die neue Zone wird gebrannt, alle anderen bleiben erhalten
+    """
+    if zone is None or len(zone) == 0:
+        return mask_info
+
+    mask = mask_info['mask']
+    mask = mask.astype(np.promote_types(mask.dtype, _count_dtype(int(mask.max(initial=0)) + 1)))
+    (r0, r1, c0, c1), burned = _burn_zone(zone, mask_info['bounds'], mask_info['resolution'], mask.shape)
+    mask[r0:r1, c0:c1] += burned
+    return {**mask_info, 'mask': mask, 'crs': mask_info['crs'] or zone.crs}
+
+def _grid_indices(n_lattice, n_grid, grid_spacing, resolution):
+    """Index des nächstgelegenen Maskenpunkts für jeden Rasterpunkt"""
+    idx = np.rint(np.arange(n_grid) * (grid_spacing / resolution)).astype(np.int64)
+    return np.clip(idx, 0, n_lattice - 1)
+
+def mask_error_bound(mask_info, grid_spacing):
+    """
+    Maximale Lageabweichung (Meter) zwischen Rasterpunkt und ausgewertetem Maskenpunkt
+
+    Ist grid_spacing ein Vielfaches der Maskenauflösung, liegen alle Rasterpunkte
+    exakt auf Maskenpunkten (Abweichung 0) und die Klassifikation entspricht dem
+    Vektorpfad. Sonst wird auf den nächsten Maskenpunkt gerundet: höchstens
+    eine halbe Zelle pro Achse, also resolution * sqrt(2) / 2.
+    """
+    ratio = grid_spacing / mask_info['resolution']
+    if np.isclose(ratio, round(ratio)):
+        return 0.0
+    return float(mask_info['resolution'] * np.sqrt(2) / 2)
+
+def _sample_grid(mask_info, grid_spacing):
+    """
+    Maskenwerte an den Rasterpunkten
+
+    Returns:
+        Tuple (x_coords, y_coords, werte) - werte hat die Form (len(y_coords), len(x_coords))
+    """
+    mask = mask_info['mask']
+    resolution = mask_info['resolution']
+    x_coords, y_coords = _lattice_axes(mask_info['bounds'], grid_spacing)
+
+    ratio = grid_spacing / resolution
+    if np.isclose(ratio, round(ratio)):
+        # Rasterpunkte liegen exakt auf der Maske: gestrideter View
+        step = int(round(ratio))
+        sub = mask[::step, ::step][:len(y_coords), :len(x_coords)]
+    else:
+        iy = _grid_indices(mask.shape[0], len(y_coords), grid_spacing, resolution)
+        ix = _grid_indices(mask.shape[1], len(x_coords), grid_spacing, resolution)
+        sub = mask[np.ix_(iy, ix)]
+    return x_coords, y_coords, sub
+
+def sample_mask(mask_info, grid_spacing):
+    """
+    Liest die Standorte für einen Rasterabstand aus der Maske
+    ⚡ Nur Array-Zugriff, keine Geometrie-Operation
+
+    Returns:
+        Tuple (x, y) mit den Koordinaten der geeigneten Standorte
+    """
+    x_coords, y_coords, sub = _sample_grid(mask_info, grid_spacing)
+    row, col = np.nonzero(sub == 0)
+    return x_coords[col], y_coords[row]
+
+def find_planting_locations_raster(mask_info, grid_spacing=20):
+    """
+    Pflanzstandorte aus der Ausschluss-Maske (schnelle Alternative zu find_planting_locations)
+
+    Returns:
+        GeoDataFrame mit geeigneten Pflanzstandorten
+    """
+    x, y = sample_mask(mask_info, grid_spacing)
+
+    if len(x) > 0:
+        return gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y), crs=mask_info['crs'])
+    else:
+        return None
+
+@timed()
+def zone_depth_raster(zone, bounds, resolution, grid_spacing):
+    """
+    Rasterpunkte, die eine Zone in der Maske abdeckt, und wie tief sie darin liegen
+    ⚡ Einmal pro Zone und Rasterabstand - jede Entsperrung ist danach nur noch ein
+    Schwellwert-Vergleich auf der Tiefe (wie im Distanzfeld, kein Buffer pro Prozentwert)
+
+    Die Abdeckung kommt aus demselben Brennvorgang wie die Maske, die Zählung der Maske
+    lässt sich damit exakt um diese Zone verringern.
+
+    Returns:
+        Dict mit 'idx' (flache Rasterindizes, aufsteigend) und 'depth' (float32: Abstand zum
+        Zonenrand, bei Abstandszonen wie weit der Punkt innerhalb des Mindestabstands liegt)
+    """
+    from analysis import nearest_distance
+    from candidates import zone_depth
+
+    x_axis, y_axis = _lattice_axes(bounds, resolution)
+    shape = (len(y_axis), len(x_axis))
+    (r0, r1, c0, c1), burned = _burn_zone(zone, bounds, resolution, shape)
+
+    # Rasterpunkte im Ausschnitt der Zone, die der Brennvorgang getroffen hat
+    x_coords, y_coords = _lattice_axes(bounds, grid_spacing)
+    iy = _grid_indices(shape[0], len(y_coords), grid_spacing, resolution)
+    ix = _grid_indices(shape[1], len(x_coords), grid_spacing, resolution)
+    gy = np.flatnonzero((iy >= r0) & (iy < r1))
+    gx = np.flatnonzero((ix >= c0) & (ix < c1))
+    row, col = np.nonzero(burned[np.ix_(iy[gy] - r0, ix[gx] - c0)])
+    row, col = gy[row], gx[col]
+    # Tiefe am ausgewerteten Maskenpunkt (wie die Abdeckung), nicht am gerundeten Rasterpunkt
+    x, y = x_axis[ix[col]], y_axis[iy[row]]
+
+    if is_distance_zone(zone):
+        abstand = float(zone['abstand'].iloc[0])
+        distance = nearest_distance(shapely.STRtree(zone.geometry.values), x, y, max_distance=abstand)
+        depth = np.maximum(abstand - distance, 0).astype(np.float32)
+    else:
+        depth = zone_depth(zone.geometry.values, np.arange(len(x)), x, y)
+
+    current().update({'punkte': len(x)})
+    return {'idx': row * len(x_coords) + col, 'depth': depth}
+
+@timed()
+def unlock_delta_raster(mask_info, zone_depths, grid_spacing, unlock_zones=(), unlock_percentage=0,
+                        mode='buffer'):
+    """
+    Änderung der Rasterpunkte gegenüber der Basis für ein What-If-Szenario
+    ⚡ Keine Geometrie-Operation: die Zählung der Maske wird an den Punkten der entsperrten
+    Zonen um diese verringert, ihre Reste kommen per Schwellwert auf der Tiefe dazu
+
+    Args:
+        zone_depths: Dict Name -> zone_depth_raster(...) für (mindestens) die entsperrten Zonen
+
+    Returns:
+        Dict mit 'added' und 'removed': flache Indizes der Rasterpunkte (Zeile * Spalten + Spalte),
+        die durch das Szenario frei bzw. gesperrt werden
+    """
+    from candidates import unlock_distance
+
+    empty = np.empty(0, dtype=np.int64)
+    names = [name for name in unlock_zones if name in zone_depths and len(zone_depths[name]['idx']) > 0]
+    if not names or unlock_percentage <= 0:
+        return {'added': empty, 'removed': empty}
+
+    footprint = np.unique(np.concatenate([zone_depths[name]['idx'] for name in names]))
+
+    # Maskenwerte am Fußabdruck, ohne die entsperrten Zonen = Anzahl der übrigen Zonen
+    mask = mask_info['mask']
+    resolution = mask_info['resolution']
+    x_coords, y_coords = _lattice_axes(mask_info['bounds'], grid_spacing)
+    iy = _grid_indices(mask.shape[0], len(y_coords), grid_spacing, resolution)
+    ix = _grid_indices(mask.shape[1], len(x_coords), grid_spacing, resolution)
+    covering = mask[iy[footprint // len(x_coords)], ix[footprint % len(x_coords)]].astype(np.int64)
+    was_excluded = covering > 0
+    for name in names:
+        covering[np.searchsorted(footprint, zone_depths[name]['idx'])] -= 1
+    excluded = covering > 0
+
+    # Teilweise entsperrte Zonen per Schwellwert (komplett entsperrt = Schwelle unendlich)
+    field = {'zones': zone_depths}
+    for name in names:
+        threshold = unlock_distance(field, name, unlock_percentage, mode)
+        if np.isfinite(threshold):
+            zone = zone_depths[name]
+            excluded[np.searchsorted(footprint, zone['idx'][zone['depth'] > threshold])] = True
+
+    current()['zonen_entsperrt'] = len(names)
+    return {
+        'added': footprint[was_excluded & ~excluded],
+        'removed': footprint[~was_excluded & excluded]
+    }
+
+def planting_scenario_raster(mask_info, zone_depths, grid_spacing, unlock_zones=(), unlock_percentage=0,
+                             mode='buffer'):
+    """
+    Basis und What-If-Szenario aus einer Maske
+
+    Args:
+        zone_depths: Dict Name -> zone_depth_raster(...) für die entsperrten Zonen
+
+    Returns:
+        Dict mit 'x', 'y' (alle Rasterpunkte), 'crs', 'baseline' und 'suitable' (boolesch:
+        geeignet ohne bzw. mit Szenario) und 'delta' (wie unlock_delta_raster)
+    """
+    x_coords, y_coords, sub = _sample_grid(mask_info, grid_spacing)
+    baseline = (sub == 0).ravel()
+    delta = unlock_delta_raster(mask_info, zone_depths, grid_spacing, unlock_zones, unlock_percentage, mode)
+
+    suitable = baseline
+    if len(delta['added']) or len(delta['removed']):
+        suitable = baseline.copy()
+        suitable[delta['added']] = True
+        suitable[delta['removed']] = False
+
+    xx, yy = np.meshgrid(x_coords, y_coords)
+    return {
+        'x': xx.ravel(),
+        'y': yy.ravel(),
+        'crs': mask_info['crs'],
+        'baseline': baseline,
+        'suitable': suitable,
+        'delta': delta
+    }
+
+def validate_mask(mask_info, ausschlusszonen_dict, grid_spacing, sample_size=20000, seed=0):
+    """
+    Vergleicht die Maske mit dem exakten Vektorpfad auf einer Stichprobe von Rasterpunkten
+
+    Returns:
+        Dict mit 'max_position_error_m' (Schranke) und 'mismatch_rate' (gemessen)
+    """
+    from exclusion_store import ExclusionStore
+
+    x_coords, y_coords = _lattice_axes(mask_info['bounds'], grid_spacing)
+    rng = np.random.default_rng(seed)
+    n = min(sample_size, len(x_coords) * len(y_coords))
+    ix = rng.integers(0, len(x_coords), n)
+    iy = rng.integers(0, len(y_coords), n)
+
+    exact = ExclusionStore.from_zones(ausschlusszonen_dict).excluded_xy(x_coords[ix], y_coords[iy])
+
+    mask = mask_info['mask']
+    mx = _grid_indices(mask.shape[1], len(x_coords), grid_spacing, mask_info['resolution'])
+    my = _grid_indices(mask.shape[0], len(y_coords), grid_spacing, mask_info['resolution'])
+    approx = mask[my[iy], mx[ix]] > 0
+
+    return {
+        'max_position_error_m': mask_error_bound(mask_info, grid_spacing),
+        'mismatch_rate': float((exact != approx).mean()) if n else 0.0
+    }
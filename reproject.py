@@ -0,0 +1,112 @@
+"""
+Reprojektion mit wiederverwendeten Transformern und Cache
+Pro CRS-Paar wird ein pyproj-Transformer einmal erzeugt; Geometrien werden als ein
+Koordinaten-Array transformiert. to_crs() merkt sich die projizierten Geometrien pro
+Quelle - ein unveränderter Layer (gleicher Schlüssel) wird nie ein zweites Mal projiziert.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import shapely
+
+from diagnostics import count, span
+
+# So viele projizierte Geometrie-Arrays bleiben im Speicher
+MAX_CACHED = 64
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+@lru_cache(maxsize=None)
+def _crs(crs):
+    from pyproj import CRS
+    return CRS.from_user_input(crs)
+
+def as_crs(crs):
+    """pyproj.CRS aus EPSG-Code, String oder CRS (EPSG-Codes und Strings gemerkt)"""
+    from pyproj import CRS
+    return crs if isinstance(crs, CRS) else _crs(crs)
+
+@lru_cache(maxsize=32)
+def get_transformer(src, dst):
+    """Transformer src -> dst mit x/y-Reihenfolge (einmal pro CRS-Paar erzeugt)"""
+    from pyproj import Transformer
+    return Transformer.from_crs(as_crs(src), as_crs(dst), always_xy=True)
+
+def transform_xy(x, y, src, dst):
+    """Koordinaten-Arrays von src nach dst"""
+    return get_transformer(as_crs(src), as_crs(dst)).transform(np.asarray(x, dtype=float),
+                                                               np.asarray(y, dtype=float))
+
+def transform_geometry(geometry, src, dst):
+    """
+    Geometrie-Array von src nach dst
+
+    ⚡ Alle Stützpunkte gehen in einem Aufruf durch den Transformer (2D - z fällt weg)
+    """
+    transformer = get_transformer(as_crs(src), as_crs(dst))
+    return shapely.transform(np.asarray(geometry),
+                             lambda coords: np.column_stack(transformer.transform(coords[:, 0], coords[:, 1])))
+
+def geometry_key(gdf):
+    """SHA-1 über CRS und Koordinaten (Schlüssel für Daten ohne eigenen Fingerabdruck)"""
+    geometry = gdf.geometry.values
+    digest = hashlib.sha1()
+    digest.update(str(gdf.crs).encode())
+    digest.update(shapely.get_type_id(geometry).tobytes())
+    digest.update(shapely.get_num_coordinates(geometry).tobytes())
+    digest.update(np.ascontiguousarray(shapely.get_coordinates(geometry)).tobytes())
+    return digest.hexdigest()
+
+def to_crs(gdf, crs, key=None):
+    """
+    Wie gdf.to_crs(crs), aber mit wiederverwendetem Transformer und Geometrie-Cache
+
+    Gecacht werden nur die projizierten Geometrien; die Attribute kommen bei jedem Aufruf
+    aus gdf (ein Schlüssel über die Koordinaten sagt nichts über die Spaltenwerte).
+    Die Geometrien werden geteilt und dürfen nicht verändert werden.
+
+    Args:
+        gdf: GeoDataFrame
+        crs: Ziel-CRS (z.B. 4326)
+        key: Schlüssel der Quelldaten (z.B. Fingerabdruck des Layers); None = aus den Koordinaten
+
+    Returns:
+        GeoDataFrame im Ziel-CRS (gdf selbst, wenn es schon dort ist)
+    """
+    import geopandas as gpd
+
+    dst = as_crs(crs)
+    if gdf.crs is None or gdf.crs == dst:
+        return gdf
+    if shapely.has_z(gdf.geometry.values).any():
+        return gdf.to_crs(dst)
+
+    cache_key = (key if key is not None else geometry_key(gdf), gdf.crs.to_wkt(), dst.to_wkt())
+    with _lock:
+        projected = _cache.get(cache_key)
+        if projected is not None and len(projected) == len(gdf):
+            _cache.move_to_end(cache_key)
+        else:
+            projected = None
+    count('reproject_cache_total', result='hit' if projected is not None else 'miss')
+
+    if projected is None:
+        with span('reproject', features=len(gdf)):
+            projected = transform_geometry(gdf.geometry.values, gdf.crs, dst)
+        with _lock:
+            _cache[cache_key] = projected
+            while len(_cache) > MAX_CACHED:
+                _cache.popitem(last=False)
+
+    # Aktuelle Attribute (und Index) aus gdf zu den projizierten Geometrien
+    name = gdf.geometry.name
+    geometry = gpd.GeoSeries(projected, index=gdf.index, crs=dst)
+    result = gpd.GeoDataFrame(gdf.drop(columns=name), geometry=geometry, crs=dst)
+    if name != result.geometry.name:
+        result = result.rename_geometry(name)
+    return result
@@ -0,0 +1,188 @@
+"""
+Inhaltsadressierter Ergebnis-Cache auf der Festplatte
+Schlüssel = Fingerabdruck der Eingangsdaten + Parameter, Verdrängung nach Größe (LRU).
+Mehrere Prozesse/Replikas können dasselbe Verzeichnis teilen.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import shapely
+
+from geo_cache import CACHE_DIR
+from diagnostics import count, log, span
+
+# Erhöhen, wenn sich die Berechnung ändert (alte Einträge werden dann nicht mehr getroffen)
+CACHE_VERSION = 1
+
+# Maximale Größe des Ergebnis-Caches in MB
+MAX_CACHE_MB = int(os.environ.get("CITY_FOREST_RESULT_CACHE_MB", 2048))
+
+def frame_fingerprint(gdf):
+    """SHA-1 über CRS, Spalten und Geometrien (WKB) eines GeoDataFrames"""
+    if gdf is None:
+        return 'none'
+
+    digest = hashlib.sha1()
+    # WKT statt str(): gleiche CRS aus Shapefile bzw. GeoParquet ergeben denselben Text
+    digest.update((gdf.crs.to_wkt() if gdf.crs is not None else 'none').encode())
+    digest.update(json.dumps([str(c) for c in gdf.columns]).encode())
+    for wkb in shapely.to_wkb(gdf.geometry.values):
+        digest.update(wkb or b'')
+    return digest.hexdigest()
+
+def layer_fingerprints(bäume, constraints):
+    """
+    Fingerabdruck pro Zone: Baumkataster unter BAUM_PUFFER, jeder Constraint-Layer unter seinem Namen
+    Erlaubt es, bei einer Änderung nur die betroffenen Zonen neu zu berechnen.
+    """
+    from analysis import BAUM_PUFFER
+
+    keys = {BAUM_PUFFER: frame_fingerprint(bäume)}
+    for name in sorted(constraints):
+        keys[name] = frame_fingerprint(constraints[name])
+    return keys
+
+def combine_fingerprints(keys):
+    """Ein Fingerabdruck aus einem Dict von Fingerabdrücken"""
+    return hashlib.sha1(json.dumps(keys, sort_keys=True, default=str).encode()).hexdigest()
+
+def data_fingerprint(bäume, constraints):
+    """Fingerabdruck von Baumkataster + allen Constraint-Layern"""
+    return combine_fingerprints(layer_fingerprints(bäume, constraints))
+
+def make_key(name, *parts):
+    """Cache-Schlüssel aus Name, Version und (JSON-serialisierbaren) Parametern"""
+    payload = json.dumps([name, CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return f"{name}-{hashlib.sha1(payload.encode()).hexdigest()}"
+
+def _results_dir(cache_dir):
+    return Path(cache_dir or CACHE_DIR) / "results"
+
+def load(key, cache_dir=None):
+    """
+    Lädt einen Eintrag
+
+    Returns:
+        Tuple (gefunden, wert)
+    """
+    path = _results_dir(cache_dir) / f"{key}.pkl"
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return False, None
+    except Exception as e:
+        # Kaputt, abgeschnitten oder aus einer inkompatiblen Version (z.B. fehlendes Modul,
+        # geänderte Klasse) - Eintrag löschen und neu berechnen
+        log(f"⚠ Cache-Eintrag unlesbar, wird neu berechnet: {e}")
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        return False, None
+
+    # mtime dient als Zeitpunkt des letzten Zugriffs für die LRU-Verdrängung
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return True, value
+
+def store(key, value, cache_dir=None, max_mb=None):
+    """Speichert einen Eintrag (atomar) und verdrängt danach die ältesten Einträge"""
+    folder = _results_dir(cache_dir)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    path = folder / f"{key}.pkl"
+    tmp = folder / f"{key}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+    evict(cache_dir, MAX_CACHE_MB if max_mb is None else max_mb)
+
+def evict(cache_dir=None, max_mb=MAX_CACHE_MB):
+    """Löscht die am längsten nicht genutzten Einträge, bis der Cache unter max_mb liegt"""
+    entries = []
+    for path in _results_dir(cache_dir).glob("*.pkl"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue  # von einem anderen Prozess gelöscht
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        total -= size
+
+def disk_cached(name, key_parts, compute, cache_dir=None):
+    """
+    Liefert das Ergebnis aus dem Festplatten-Cache oder berechnet und speichert es
+
+    Args:
+        name: Art des Ergebnisses (z.B. 'zones')
+        key_parts: Parameter inkl. Daten-Fingerabdruck, die das Ergebnis eindeutig bestimmen
+        compute: Funktion ohne Argumente, die das Ergebnis berechnet
+    """
+    key = make_key(name, *key_parts)
+    found, value = load(key, cache_dir)
+    count('disk_cache_requests_total', cache=name, result='hit' if found else 'miss')
+    if found:
+        log(f"💾 Cache-Treffer: {name}")
+        return value
+
+    with span(f"disk_cache:{name}"):
+        value = compute()
+    try:
+        store(key, value, cache_dir)
+    except Exception as e:
+        log(f"⚠ Ergebnis nicht gecacht ({name}): {e}")
+    return value
+
+class LatestResults:
+    """
+    Zuletzt berechnetes Ergebnis pro Schlüssel (Art, Ausdehnung, Raster) im Speicher
+    Ausgangspunkt für inkrementelle Updates; prozessweit geteilt und threadsicher.
+    Ein neues Ergebnis ersetzt den Eintrag seines Schlüssels - pro Art bleiben höchstens
+    max_per_kind Schlüssel (die zuletzt benutzten), damit verdrängte Cache-Einträge
+    nicht hier weiterleben.
+    """
+
+    def __init__(self, max_per_kind=2):
+        self.max_per_kind = max_per_kind
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Eintrag zu key (Tupel, erstes Element = Art) oder None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        """Ersetzt den Eintrag zu key und verdrängt die ältesten Schlüssel derselben Art"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            same_kind = [k for k in self._entries if k[0] == key[0]]
+            for old in same_kind[:max(len(same_kind) - self.max_per_kind, 0)]:
+                del self._entries[old]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,151 @@
+"""
+Parameter-Sweep über Baumabstand, Linien-Buffer, Rasterabstand und Entsperrung
+Alle Kombinationen teilen sich die teure Arbeit: Flächenzonen werden einmal berechnet,
+das Distanzfeld einmal pro Rasterabstand. Jede Kombination ist danach nur noch ein
+Schwellwert-Vergleich auf den vorberechneten Abständen.
+Führe aus mit: python sweep.py --abstand-baeume 3 5 10 --buffer-linien 5 10 20 --output sweep.csv
+"""
+
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+
+from analysis import BAUM_PUFFER, calculate_stats, constraint_zone, make_distance_zone
+from candidates import MAX_FELD_ABSTAND, build_relaxation_field, excluded_mask, with_zone_distance
+from diagnostics import log
+import reproject
+
+# Linien-Layer werden wie Abstandszonen behandelt (Abstand zur Linie < Buffer)
+LINE_TYPES = ('LineString', 'MultiLineString')
+
+def sweep_zones(bäume, constraints, abstand_bäume, buffer_linien):
+    """
+    Zonen für den Sweep: Bäume und Linien als Abstandszonen, Flächen wie gewohnt vereinigt
+
+    Die Flächenzonen hängen von keinem Sweep-Parameter ab und werden nur einmal berechnet.
+    Linien bekommen statt eines Buffers den Mindestabstand buffer_linien - der Buffer
+    lässt sich danach ohne neue Geometrie ändern.
+
+    Returns:
+        Tuple (zones, line_names)
+    """
+    zones = {BAUM_PUFFER: make_distance_zone(bäume, abstand_bäume)}
+    line_names = []
+
+    for name, layer in constraints.items():
+        if layer is None or len(layer) == 0:
+            continue
+        try:
+            if layer.geometry.geom_type.iloc[0] in LINE_TYPES:
+                lines = reproject.to_crs(layer, bäume.crs).geometry
+                zones[name] = gpd.GeoDataFrame({'abstand': float(buffer_linien)},
+                                               index=range(len(lines)), geometry=lines.values, crs=bäume.crs)
+                line_names.append(name)
+            else:
+                zones[name] = constraint_zone(layer, bäume.crs, buffer_linien, name)
+        except Exception as e:
+            log(f"  ✗ Fehler bei {name}: {e}")
+
+    return zones, line_names
+
+def _count_sites(field, line_names, abstand, buffer, unlock_zones, percentages, unlock_mode):
+    """Standortzahlen für eine (Abstand, Buffer)-Kombination und alle Entsperr-Prozente"""
+    field = with_zone_distance(field, BAUM_PUFFER, abstand)
+    for name in line_names:
+        field = with_zone_distance(field, name, buffer)
+
+    return [int((~excluded_mask(field, unlock_zones, percentage, unlock_mode)).sum())
+            for percentage in percentages]
+
+def run_sweep(bäume, constraints, abstand_bäume=(5,), buffer_linien=(10,), grid_spacing=(25,),
+              unlock_percentage=(0,), unlock_zones=(), unlock_mode='buffer', bounds=None, workers=None):
+    """
+    Zählt die Pflanzstandorte für alle Parameter-Kombinationen
+
+    Args:
+        bäume: Baumkataster
+        constraints: Dict mit Constraint-Layern
+        abstand_bäume, buffer_linien, grid_spacing, unlock_percentage: Werte pro Parameter
+        unlock_zones: Zonen, die für die Entsperr-Prozente geöffnet werden
+        unlock_mode: 'area' oder 'buffer' (wie apply_zone_relaxation)
+        bounds: Bounding Box (Standard: Ausdehnung des Baumkatasters)
+        workers: Threads für Feldaufbau und Kombinationen (Standard: bis zu 8)
+
+    Returns:
+        DataFrame mit einer Zeile pro Kombination und der Spalte 'standorte'
+    """
+    import pandas as pd
+
+    too_far = [value for value in (*abstand_bäume, *buffer_linien) if value > MAX_FELD_ABSTAND]
+    if too_far:
+        raise ValueError(f"Abstände {too_far} > MAX_FELD_ABSTAND ({MAX_FELD_ABSTAND}m)")
+
+    combinations = len(abstand_bäume) * len(buffer_linien) * len(grid_spacing) * len(unlock_percentage)
+    log(f"\n🧮 Parameter-Sweep: {combinations} Kombinationen")
+    start = time.perf_counter()
+
+    if bounds is None:
+        bounds = calculate_stats(bäume)['bounds']
+
+    # 1. Einmal: Zonen mit dem größten Abstand, damit die Distanzfelder alle Werte abdecken
+    zones, line_names = sweep_zones(bäume, constraints, max(abstand_bäume), max(buffer_linien))
+    unlockable = [name for name in unlock_zones if name in zones]
+
+    # ⚡ OPTIMIERUNG: numpy/shapely geben den GIL frei - Threads teilen sich Zonen und Felder ohne Kopie
+    with ThreadPoolExecutor(max_workers=workers or min(8, max(len(grid_spacing), 4))) as executor:
+        # 2. Einmal pro Rasterabstand: Distanzfeld
+        fields = dict(zip(grid_spacing, executor.map(
+            lambda spacing: build_relaxation_field(zones, bounds, spacing, unlockable=unlockable),
+            grid_spacing
+        )))
+
+        # 3. Pro Kombination: Schwellwerte auf dem Feld
+        groups = list(itertools.product(grid_spacing, abstand_bäume, buffer_linien))
+        counts = executor.map(
+            lambda group: _count_sites(fields[group[0]], line_names, group[1], group[2],
+                                       unlockable, unlock_percentage, unlock_mode),
+            groups
+        )
+
+        rows = [
+            {'grid_spacing': spacing, 'abstand_bäume': abstand, 'buffer_linien': buffer,
+             'unlock_percentage': percentage, 'standorte': count}
+            for (spacing, abstand, buffer), group_counts in zip(groups, counts)
+            for percentage, count in zip(unlock_percentage, group_counts)
+        ]
+
+    log(f"  ✓ {len(rows)} Kombinationen in {time.perf_counter() - start:.2f}s")
+    return pd.DataFrame(rows, columns=['grid_spacing', 'abstand_bäume', 'buffer_linien',
+                                       'unlock_percentage', 'standorte'])
+
+if __name__ == "__main__":
+    from analysis import BBOX_MARGIN_M, load_all_constraints, load_data
+
+    parser = argparse.ArgumentParser(description="Parameter-Sweep der Standortsuche")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--constraints", default="constraints")
+    parser.add_argument("--abstand-baeume", type=float, nargs="+", default=[5])
+    parser.add_argument("--buffer-linien", type=float, nargs="+", default=[10])
+    parser.add_argument("--grid-spacing", type=float, nargs="+", default=[25])
+    parser.add_argument("--unlock-percentage", type=float, nargs="+", default=[0])
+    parser.add_argument("--unlock-zones", nargs="*", default=[])
+    parser.add_argument("--unlock-mode", choices=['area', 'buffer'], default='buffer')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args()
+
+    bäume = load_data(args.data)
+    if bäume is None:
+        raise SystemExit(1)
+    minx, miny, maxx, maxy = bäume.total_bounds
+    bbox = (minx - BBOX_MARGIN_M, miny - BBOX_MARGIN_M, maxx + BBOX_MARGIN_M, maxy + BBOX_MARGIN_M)
+    constraints = load_all_constraints(args.constraints, bbox=bbox, bbox_crs=bäume.crs)
+
+    table = run_sweep(bäume, constraints, args.abstand_baeume, args.buffer_linien, args.grid_spacing,
+                      args.unlock_percentage, args.unlock_zones, args.unlock_mode, workers=args.workers)
+    table.to_csv(args.output, index=False)
+    print(table.to_string(index=False))
+    print(f"\n✅ Tabelle gespeichert: {args.output}")
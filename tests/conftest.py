@@ -0,0 +1,6 @@
+"""Die Module liegen flach im Projektverzeichnis - für die Tests importierbar machen"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
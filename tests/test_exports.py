@@ -0,0 +1,67 @@
+"""
+Tests für den Export der Standorte
+FlatGeobuf wird nur angeboten, wenn pyogrio.write_arrow verfügbar ist - sonst bleiben
+GeoJSON, CSV und GeoParquet.
+"""
+
+import importlib
+import json
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import exports
+
+X = np.array([510000.0, 510010.0, 510020.0])
+Y = np.array([5440000.0, 5440010.0, 5440020.0])
+
+@pytest.fixture
+def reload_exports(monkeypatch):
+    """Lädt exports.py mit einem ersetzten pyogrio neu (danach wieder mit dem echten)"""
+    def load(pyogrio):
+        monkeypatch.setitem(sys.modules, 'pyogrio', pyogrio)
+        return importlib.reload(exports)
+
+    yield load
+    monkeypatch.undo()
+    importlib.reload(exports)
+
+@pytest.mark.parametrize('pyogrio', [
+    None,  # nicht installiert: import pyogrio wirft ImportError
+    types.SimpleNamespace(__gdal_version__=(3, 6, 2)),  # pyogrio < 0.8 ohne write_arrow
+    types.SimpleNamespace(__gdal_version__=(3, 7, 3), write_arrow=object())  # GDAL zu alt
+], ids=['ohne-pyogrio', 'ohne-write-arrow', 'gdal-3.7'])
+def test_fgb_hidden_without_write_arrow(reload_exports, pyogrio, tmp_path):
+    module = reload_exports(pyogrio)
+
+    assert 'fgb' not in module.EXPORT_FORMATS
+    assert list(module.EXPORT_FORMATS) == ['geojson', 'csv', 'parquet']
+    with pytest.raises(ValueError):
+        module.write_sites(X, Y, 25832, tmp_path / "standorte.fgb", fmt='fgb')
+
+def test_text_formats_without_pyogrio(reload_exports, tmp_path):
+    module = reload_exports(None)
+
+    path = module.write_sites(X, Y, 25832, tmp_path / "standorte.geojson", attributes={'whatif_aktiv': 'Nein'})
+    features = json.loads(path.read_text(encoding='utf-8'))['features']
+    assert [f['id'] for f in features] == [1, 2, 3]
+    assert features[0]['properties'] == {'whatif_aktiv': 'Nein'}
+
+def test_parquet_without_pyogrio(reload_exports, tmp_path):
+    gpd = pytest.importorskip('geopandas')
+    module = reload_exports(None)
+
+    path = module.write_sites(X, Y, 25832, tmp_path / "standorte.parquet", fmt='parquet', chunk_size=2,
+                              attributes={'whatif_aktiv': 'Ja'})
+    sites = gpd.read_parquet(path)
+    assert sites.crs.to_epsg() == 4326
+    assert sites['id'].tolist() == [1, 2, 3]
+    assert (sites['whatif_aktiv'] == 'Ja').all()
+
+def test_fgb_offered_with_write_arrow():
+    pyogrio = pytest.importorskip('pyogrio')
+    if not hasattr(pyogrio, 'write_arrow') or pyogrio.__gdal_version__ < (3, 8):
+        pytest.skip("pyogrio ohne write_arrow bzw. GDAL < 3.8")
+    assert 'fgb' in exports.EXPORT_FORMATS
@@ -0,0 +1,370 @@
+"""
+Lokaler Kachel-Server für die Karte
+Bäume, Pflanzstandorte und Ausschlusszonen werden nicht als GeoJSON in die Seite
+eingebettet, sondern als Vektor-Kacheln (z/x/y) von einem kleinen HTTP-Server im
+Hintergrund geladen. Pro Zoomstufe wird vereinfacht (nur die zuletzt benutzten Stufen
+bleiben im Speicher); jede Kachel wird auf ihren Ausschnitt zugeschnitten, auf ein festes
+Raster gerundet und gzip-komprimiert auf der Festplatte gecacht. Die Datenmenge pro Kachel hängt damit von der Kachelgröße ab, nicht
+von der Größe der Stadt.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from diagnostics import count, log
+from geo_cache import CACHE_DIR
+from reproject import geometry_key, to_crs, transform_geometry
+
+# Adresse des Servers (Port 0 = freier Port)
+TILE_HOST = os.environ.get("CITY_FOREST_TILE_HOST", "127.0.0.1")
+TILE_PORT = int(os.environ.get("CITY_FOREST_TILE_PORT", "0"))
+
+# Öffentliche Basis-URL, falls der Browser den Server nur über einen Proxy erreicht
+TILE_URL = os.environ.get("CITY_FOREST_TILE_URL")
+
+# Koordinaten-Einheiten pro Kachelkante (wie Mapbox Vector Tiles) und Rand gegen Nähte
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# Punkte: höchstens einer pro Rasterzelle (256 = ein Punkt pro Bildschirm-Pixel)
+POINT_GRID = 256
+
+# Punkte sind nach den Kacheln dieser Zoomstufe sortiert - eine Kachel liest nur ihre Zellen
+INDEX_ZOOM = 14
+
+# Vereinfachungs-Toleranz in Pixeln der jeweiligen Zoomstufe
+SIMPLIFY_PX = 0.5
+
+# Höchste Zoomstufe, die der Server ausliefert
+MAX_ZOOM = 22
+
+# So viele Layer bleiben im Speicher bzw. im Kachel-Cache auf der Festplatte
+MAX_LAYERS = 32
+MAX_CACHED_LAYERS = 64
+
+# So viele Zoomstufen (vereinfachte Kopie + STRtree) behält jeder Layer im Speicher
+MAX_LEVELS = 3
+
+# Halbe Kantenlänge der Web-Mercator-Welt (EPSG:3857)
+ORIGIN = 20037508.342789244
+
+_TILE_PATH = re.compile(r"^/([0-9a-f]{40})/(\d+)/(\d+)/(\d+)\.json$")
+
+def tile_bounds(z, x, y):
+    """Ausdehnung einer Kachel in EPSG:3857 (minx, miny, maxx, maxy)"""
+    size = 2 * ORIGIN / 2 ** z
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+def layer_key(gdf, popup_column=None, value_column=None):
+    """SHA-1 über CRS, Koordinaten und die Spalten für Popups/Farbwerte"""
+    digest = hashlib.sha1(geometry_key(gdf).encode())
+    for column in (popup_column, value_column):
+        if column is not None:
+            digest.update(column.encode())
+            digest.update(json.dumps(gdf[column].tolist(), default=str).encode())
+    return digest.hexdigest()
+
+def _split(values, index):
+    """Teilt ein Array an den Wechseln von index (index ist sortiert)"""
+    return np.split(values, np.flatnonzero(np.diff(index)) + 1) if len(index) else []
+
+class TileSet:
+    """
+    Ein Layer in Kacheln
+
+    Punkte werden pro Kachel auf ein Pixelraster ausgedünnt, Flächen und Linien pro
+    Zoomstufe vereinfacht und über einen STRtree pro Kachel abgefragt (LRU über die
+    letzten MAX_LEVELS Zoomstufen - die Karte zeigt meist nur eine oder zwei gleichzeitig).
+    Die Projektion nach EPSG:3857 passiert erst bei der ersten Kachel.
+    """
+
+    def __init__(self, key, gdf, popup_column=None, value_column=None):
+        self.key = key
+        self.bounds = to_crs(gdf, 4326).total_bounds.tolist() if len(gdf) else None
+        self._gdf = gdf
+        self._popup_column = popup_column
+        self._value_column = value_column
+        self._lock = threading.Lock()
+        self._levels = OrderedDict()
+        self._prepared = False
+
+    def _prepare(self):
+        gdf = self._gdf
+        geometry = gdf.geometry.values
+        if gdf.crs is not None:
+            # Kein Cache: die Web-Mercator-Kopie lebt nur in diesem TileSet
+            geometry = transform_geometry(geometry, gdf.crs, 3857)
+        types = set(np.unique(shapely.get_type_id(geometry)).tolist())
+
+        if types <= {0, 4}:
+            self.kind = 'point'
+            coords = shapely.get_coordinates(geometry)
+            # ⚡ OPTIMIERUNG: Einmal nach Index-Zelle sortieren - pro Kachel nur noch
+            # searchsorted und die Punkte der berührten Zellen statt aller Punkte
+            n = 2 ** INDEX_ZOOM
+            cell = 2 * ORIGIN / n
+            cx = np.clip(np.floor((coords[:, 0] + ORIGIN) / cell), 0, n - 1).astype(np.int64)
+            cy = np.clip(np.floor((ORIGIN - coords[:, 1]) / cell), 0, n - 1).astype(np.int64)
+            keys = cy * n + cx
+            order = np.argsort(keys, kind='stable')
+            self.x, self.y, self.cell_keys = coords[order, 0], coords[order, 1], keys[order]
+            self.cell_rows = (int(cy.min()), int(cy.max())) if len(cy) else (0, -1)
+        else:
+            self.kind = 'line' if types <= {1, 2, 5} else 'polygon'
+            # ⚡ OPTIMIERUNG: Multi-Geometrien in Teile zerlegen - eine vereinigte Zone ist sonst
+            # ein einziges Feature, das jede Kachel komplett zuschneiden müsste
+            self.geometry, feature = shapely.get_parts(np.asarray(geometry), return_index=True)
+            self.popups = gdf[self._popup_column].astype(str).to_numpy()[feature] if self._popup_column else None
+            self.values = gdf[self._value_column].to_numpy(dtype=float)[feature] if self._value_column else None
+
+        self._gdf = None
+        self._prepared = True
+
+    def _point_candidates(self, minx, miny, maxx, maxy):
+        """Indizes der Punkte in den Index-Zellen, die eine Box (EPSG:3857) berührt"""
+        n = 2 ** INDEX_ZOOM
+        cell = 2 * ORIGIN / n
+        c0, c1 = np.clip(np.floor((np.array([minx, maxx]) + ORIGIN) / cell), 0, n - 1).astype(np.int64)
+        r0, r1 = np.clip(np.floor((ORIGIN - np.array([maxy, miny])) / cell), 0, n - 1).astype(np.int64)
+        rows = np.arange(max(r0, self.cell_rows[0]), min(r1, self.cell_rows[1]) + 1)
+
+        # Pro Zellenzeile ein zusammenhängender Abschnitt der sortierten Punkte
+        lo = np.searchsorted(self.cell_keys, rows * n + c0, side='left')
+        hi = np.searchsorted(self.cell_keys, rows * n + c1, side='right')
+        slices = [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def _level(self, z):
+        """Vereinfachte Geometrien und STRtree für eine Zoomstufe (die ältesten Stufen fallen heraus)"""
+        level = self._levels.get(z)
+        if level is None:
+            tolerance = SIMPLIFY_PX * 2 * ORIGIN / 2 ** z / 256
+            simplified = shapely.simplify(self.geometry, tolerance, preserve_topology=True)
+            level = self._levels[z] = (shapely.STRtree(simplified), simplified)
+            while len(self._levels) > MAX_LEVELS:
+                self._levels.popitem(last=False)
+        self._levels.move_to_end(z)
+        return level
+
+    def tile(self, z, x, y):
+        """
+        Inhalt einer Kachel als Dict (Koordinaten in Kachel-Einheiten, y nach unten)
+
+        Returns:
+            {'e': TILE_EXTENT, 'k': 'point', 'xy': [...]} bzw. {'e', 'k', 'f': [[ring, ...], ...],
+            optional 'v' (Farbwerte) und 'p' (Popup-Texte)} - None für leere Kacheln
+        """
+        with self._lock:
+            if not self._prepared:
+                self._prepare()
+            level = None if self.kind == 'point' else self._level(z)
+
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        scale = TILE_EXTENT / (maxx - minx)
+        pad = TILE_BUFFER / scale
+
+        if self.kind == 'point':
+            idx = self._point_candidates(minx - pad, miny - pad, maxx + pad, maxy + pad)
+            x, y = self.x[idx], self.y[idx]
+            inside = (x >= minx - pad) & (x <= maxx + pad) & (y >= miny - pad) & (y <= maxy + pad)
+            if not inside.any():
+                return None
+            px = np.round((x[inside] - minx) * scale).astype(np.int64)
+            py = np.round((maxy - y[inside]) * scale).astype(np.int64)
+            # ⚡ OPTIMIERUNG: Ein Punkt pro Pixel - mehr kann die Kachel nicht zeigen
+            cell = TILE_EXTENT // POINT_GRID
+            _, first = np.unique((px // cell) * (4 * POINT_GRID) + (py // cell), return_index=True)
+            xy = np.column_stack([px[first], py[first]]).ravel()
+            return {'e': TILE_EXTENT, 'k': 'point', 'xy': xy.tolist()}
+
+        tree, simplified = level
+        idx = np.sort(tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad)))
+        if len(idx) == 0:
+            return None
+
+        clipped = shapely.clip_by_rect(simplified[idx], minx - pad, miny - pad, maxx + pad, maxy + pad)
+        local = shapely.transform(clipped, lambda c: np.column_stack([(c[:, 0] - minx) * scale,
+                                                                      (maxy - c[:, 1]) * scale]))
+        # Ganzzahliges Raster: zu kleine Teile fallen dabei weg
+        local = shapely.set_precision(local, 1.0)
+        keep = ~shapely.is_empty(local)
+        idx, local = idx[keep], local[keep]
+        if len(idx) == 0:
+            return None
+
+        parts, part_feature = shapely.get_parts(local, return_index=True)
+        if self.kind == 'polygon':
+            polygons = shapely.get_type_id(parts) == 3
+            parts, part_feature = parts[polygons], part_feature[polygons]
+            paths, path_part = shapely.get_rings(parts, return_index=True)
+        else:
+            paths, path_part = parts, np.arange(len(parts))
+        coords, coord_path = shapely.get_coordinates(paths, return_index=True)
+        coords = coords.astype(np.int64)
+
+        rings = [ring.ravel().tolist() for ring in _split(coords, coord_path)]
+        path_feature = part_feature[path_part]
+        features = [[rings[i] for i in group] for group in _split(np.arange(len(rings)), path_feature)]
+        used = idx[np.unique(path_feature)]
+
+        data = {'e': TILE_EXTENT, 'k': self.kind, 'f': features}
+        if self.values is not None:
+            data['v'] = np.round(self.values[used], 4).tolist()
+        if self.popups is not None:
+            data['p'] = self.popups[used].tolist()
+        return data
+
+class TileServer:
+    """
+    HTTP-Server für Vektor-Kacheln (läuft in einem Hintergrund-Thread)
+
+    register() meldet ein GeoDataFrame an und liefert URL-Vorlage und Ausdehnung für
+    map_layers.VectorTiles. Der Schlüssel ist ein Inhalts-Hash - gleiche Daten ergeben
+    dieselbe URL, der Browser kann Kacheln also dauerhaft cachen.
+    """
+
+    def __init__(self, host=TILE_HOST, port=TILE_PORT, cache_dir=None):
+        self.cache_dir = Path(cache_dir or CACHE_DIR) / "tiles"
+        self._layers = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), _TileHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.tiles = self
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="tile-server", daemon=True)
+        self._thread.start()
+        log(f"🧩 Kachel-Server: {self.base_url}")
+
+    @property
+    def base_url(self):
+        return TILE_URL.rstrip('/') if TILE_URL else f"http://{self.host}:{self.port}"
+
+    def register(self, gdf, popup_column=None, value_column=None):
+        """
+        Meldet einen Layer an (bereits bekannte Inhalte kosten nur den Hash)
+
+        Args:
+            gdf: GeoDataFrame (beliebiges CRS)
+            popup_column: Spalte mit Popup-Text pro Feature (nur Flächen/Linien)
+            value_column: Spalte mit Farbwert pro Feature (für eine Palette)
+
+        Returns:
+            Dict mit 'url' (Vorlage mit {z}/{x}/{y}) und 'bounds' ([[süd, west], [nord, ost]] oder None)
+        """
+        key = layer_key(gdf, popup_column, value_column)
+        with self._lock:
+            tiles = self._layers.get(key)
+            if tiles is None:
+                tiles = TileSet(key, gdf, popup_column, value_column)
+                self._layers[key] = tiles
+                while len(self._layers) > MAX_LAYERS:
+                    self._layers.popitem(last=False)
+                self._prune_cache(key)
+            self._layers.move_to_end(key)
+
+        bounds = None
+        if tiles.bounds is not None:
+            west, south, east, north = tiles.bounds
+            bounds = [[south, west], [north, east]]
+        return {'url': f"{self.base_url}/{key}/{{z}}/{{x}}/{{y}}.json", 'bounds': bounds}
+
+    def _prune_cache(self, key):
+        """Markiert den Layer als benutzt und löscht die Kacheln der ältesten Layer"""
+        folder = self.cache_dir / key
+        folder.mkdir(parents=True, exist_ok=True)
+        os.utime(folder)
+        cached = sorted(self.cache_dir.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in cached[MAX_CACHED_LAYERS:]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def tile_bytes(self, key, z, x, y):
+        """
+        gzip-komprimierte Kachel (b'' = leer, None = unbekannter Layer)
+
+        Kacheln liegen unter cache_dir/<key>/<z>/<x>/<y>.json.gz und werden auch nach einem
+        Neustart ausgeliefert, solange der Layer noch nicht neu angemeldet wurde.
+        """
+        path = self.cache_dir / key / str(z) / str(x) / f"{y}.json.gz"
+        if path.exists():
+            count('tile_requests_total', cache='disk')
+            return path.read_bytes()
+
+        with self._lock:
+            tiles = self._layers.get(key)
+        if tiles is None:
+            count('tile_requests_total', cache='missing')
+            return None
+
+        start = time.perf_counter()
+        data = tiles.tile(z, x, y)
+        body = b'' if data is None else gzip.compress(
+            json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode(), compresslevel=6)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, path)
+
+        count('tile_requests_total', cache='generated')
+        count('tile_seconds_total', time.perf_counter() - start)
+        return body
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+class _TileHandler(BaseHTTPRequestHandler):
+    """GET /<key>/<z>/<x>/<y>.json - 200 mit gzip-JSON, 204 für leere Kacheln"""
+
+    def do_GET(self):
+        match = _TILE_PATH.match(self.path.split('?')[0])
+        if match is None:
+            self.send_error(404)
+            return
+        key, z, x, y = match.group(1), *map(int, match.groups()[1:])
+        if z > MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            self.send_error(404)
+            return
+
+        try:
+            body = self.server.tiles.tile_bytes(key, z, x, y)
+        except Exception as e:
+            log(f"  ✗ Kachel {z}/{x}/{y}: {e}")
+            self.send_error(500)
+            return
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200 if body else 204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        # Der Schlüssel ist ein Inhalts-Hash - die Kachel ändert sich nie
+        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        if body:
+            self.send_header('Content-Type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                self.send_header('Content-Encoding', 'gzip')
+            else:
+                body = gzip.decompress(body)
+            count('tile_bytes_total', len(body))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Zugriffe werden gezählt, nicht protokolliert
@@ -0,0 +1,171 @@
+"""
+Überwachung des constraints-Ordners
+Erkennt neue, geänderte und gelöschte Layer per Signatur (Größe + mtime) und lädt
+nur diese neu - alle anderen Layer und ihre gecachten Zonen bleiben unverändert.
+"""
+
+import threading
+from collections import deque
+from pathlib import Path
+
+from analysis import load_all_constraints
+from diagnostics import log, timed
+from geo_cache import read_cached, source_signature
+from result_cache import frame_fingerprint
+
+# Standard-Intervall der Hintergrund-Prüfung in Sekunden
+WATCH_INTERVAL = 5.0
+
+# So viele Versionen (Änderungen) merkt sich der Watcher für changes_since()
+HISTORY_LENGTH = 100
+
+class ConstraintWatcher:
+    """
+    Hält die Constraint-Layer eines Ordners aktuell
+
+    Der Ordner wird einmal komplett geladen (parallel), danach vergleicht poll() nur
+    noch die Datei-Signaturen. Geänderte Dateien werden über den GeoParquet-Cache
+    neu gelesen; ändert sich dabei der Inhalt nicht (nur mtime), zählt das nicht als Änderung.
+    """
+
+    def __init__(self, constraints_path="constraints", columns=(), bbox=None, bbox_crs=None):
+        self.constraints_path = constraints_path
+        self.columns = columns
+        self.bbox = bbox
+        self.bbox_crs = bbox_crs
+        self.version = 0
+        self.last_changes = {'added': [], 'changed': [], 'removed': []}
+        self._history = deque(maxlen=HISTORY_LENGTH)
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._layers = load_all_constraints(constraints_path, columns, bbox, bbox_crs)
+        self._keys = {name: frame_fingerprint(gdf) for name, gdf in self._layers.items()}
+        self._signatures = {path.stem: source_signature(path) for path in self._files()}
+
+    def _files(self):
+        return sorted(Path(self.constraints_path).glob("*.shp"))
+
+    def snapshot(self):
+        """
+        Aktueller Stand
+
+        Returns:
+            Tuple (constraints, layer_keys, version) - Kopien, sicher für andere Threads
+        """
+        with self._lock:
+            return dict(self._layers), dict(self._keys), self.version
+
+    def changes_since(self, version):
+        """
+        Alle Änderungen nach einer Version (z.B. dem letzten Stand einer Sitzung)
+
+        Returns:
+            Dict mit 'added', 'changed' und 'removed' (Layer-Namen, jeweils ohne Dubletten)
+        """
+        merged = {'added': [], 'changed': [], 'removed': []}
+        with self._lock:
+            for entry_version, changes in self._history:
+                if entry_version <= version:
+                    continue
+                for kind, names in changes.items():
+                    merged[kind].extend(name for name in names if name not in merged[kind])
+        return merged
+
+    @timed('ConstraintWatcher.poll')
+    def poll(self):
+        """
+        Prüft den Ordner einmal und lädt geänderte Layer neu
+
+        Returns:
+            Dict mit 'added', 'changed' und 'removed' (Layer-Namen)
+        """
+        with self._poll_lock:
+            files = {path.stem: path for path in self._files()}
+            signatures = {name: source_signature(path) for name, path in files.items()}
+            changes = {'added': [], 'changed': [], 'removed': []}
+
+            updates = {}
+            for name, signature in signatures.items():
+                if self._signatures.get(name) == signature:
+                    continue
+                try:
+                    gdf = read_cached(files[name], columns=self.columns, bbox=self.bbox, bbox_crs=self.bbox_crs)
+                except Exception as e:
+                    # Datei wird evtl. noch geschrieben - beim nächsten Durchlauf erneut versuchen
+                    log(f"  ✗ {name}: Fehler beim Neuladen - {e}")
+                    continue
+
+                key = frame_fingerprint(gdf)
+                if name not in self._keys:
+                    changes['added'].append(name)
+                elif self._keys[name] != key:
+                    changes['changed'].append(name)
+                updates[name] = (gdf, key, signature)
+
+            removed = [name for name in self._layers if name not in files]
+            changes['removed'] = removed
+
+            with self._lock:
+                for name, (gdf, key, signature) in updates.items():
+                    self._layers[name] = gdf
+                    self._keys[name] = key
+                    self._signatures[name] = signature
+                for name in removed:
+                    self._layers.pop(name, None)
+                    self._keys.pop(name, None)
+                    self._signatures.pop(name, None)
+
+                if any(changes.values()):
+                    self.version += 1
+                    self.last_changes = changes
+                    self._history.append((self.version, changes))
+                    log(f"\n🔄 Constraints aktualisiert: {changes}")
+
+            return changes
+
+    def start(self, interval=WATCH_INTERVAL):
+        """Startet die Prüfung in einem Hintergrund-Thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    log(f"⚠ Fehler bei der Ordner-Überwachung: {e}")
+
+        self._thread = threading.Thread(target=run, name="constraint-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Beendet den Hintergrund-Thread"""
+        self._stop.set()
+
+# Ein Watcher pro Ordner und Prozess (von allen Sitzungen geteilt)
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+def watch_constraints(constraints_path="constraints", columns=(), bbox=None, bbox_crs=None,
+                      interval=WATCH_INTERVAL):
+    """
+    Liefert den laufenden Watcher für einen Ordner (legt ihn beim ersten Aufruf an)
+    Ändern sich columns/bbox (z.B. neues Baumkataster), wird der alte Watcher ersetzt.
+    """
+    params = (tuple(columns) if columns is not None else None,
+              tuple(bbox) if bbox is not None else None, str(bbox_crs))
+
+    with _watchers_lock:
+        current = _watchers.get(constraints_path)
+        if current is not None and current[0] == params:
+            return current[1]
+        if current is not None:
+            current[1].stop()
+
+        watcher = ConstraintWatcher(constraints_path, columns, bbox, bbox_crs).start(interval)
+        _watchers[constraints_path] = (params, watcher)
+        return watcher
@@ -0,0 +1,68 @@
+"""
+Detailstufen der Ausschlusszonen für die Karte
+Pro Anzeigemaßstab wird jede Zone einmal topologie-erhaltend vereinfacht (im metrischen
+CRS, also vor der Projektion), nach WGS84 projiziert und auf die Nachkommastellen
+gerundet, die bei diesem Maßstab noch sichtbar sind. Die Karte bekommt so nur die
+Stützpunkte, die man auch sieht - und projiziert werden nur noch diese.
+"""
+
+import numpy as np
+import shapely
+
+from diagnostics import current, timed
+from reproject import transform_geometry, transform_xy
+
+# Detailstufe -> (Zoomstufe, bei der die Vereinfachung unsichtbar bleibt, Nachkommastellen in Grad)
+LOD_LEVELS = {
+    'stadt': (13, 5),
+    'quartier': (15, 6),
+    'strasse': (17, 6)
+}
+
+# Vereinfachungs-Toleranz in Bildschirm-Pixeln
+SIMPLIFY_PX = 0.5
+
+# Bodenauflösung am Äquator bei Zoom 0 (Meter pro Pixel, 256er-Kacheln)
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+def lod_tolerance(zoom, latitude):
+    """Vereinfachungs-Toleranz in Metern für eine Zoomstufe und Breite"""
+    return SIMPLIFY_PX * METERS_PER_PIXEL_Z0 * np.cos(np.radians(latitude)) / 2 ** zoom
+
+@timed()
+def zone_lod(zone, level='quartier'):
+    """
+    Zone in einer Detailstufe, in EPSG:4326 und ohne Attribute
+
+    Args:
+        zone: GeoDataFrame in einem metrischen CRS
+        level: Schlüssel aus LOD_LEVELS oder 'original' (nur projiziert)
+
+    Returns:
+        GeoDataFrame in EPSG:4326
+    """
+    import geopandas as gpd
+
+    geometry = zone.geometry.values
+    counts = current()
+    counts['stützpunkte'] = int(shapely.get_num_coordinates(geometry).sum())
+
+    if level != 'original':
+        zoom, decimals = LOD_LEVELS[level]
+        minx, miny, maxx, maxy = zone.total_bounds
+        _, latitude = transform_xy([(minx + maxx) / 2], [(miny + maxy) / 2], zone.crs, 4326)
+        tolerance = lod_tolerance(zoom, latitude[0])
+        if zone.crs is not None and zone.crs.is_geographic:
+            tolerance /= 111320.0  # Meter -> Grad
+        # ⚡ OPTIMIERUNG: Erst vereinfachen, dann projizieren - die Projektion sieht nur die übrigen Punkte
+        geometry = shapely.simplify(geometry, tolerance, preserve_topology=True)
+
+    wgs84 = transform_geometry(geometry, zone.crs, 4326)
+    if level != 'original':
+        # Auf das Raster der Nachkommastellen einrasten (set_precision hält die Geometrien gültig),
+        # danach runden, damit die Zahlen im GeoJSON auch kurz geschrieben werden
+        wgs84 = shapely.set_precision(wgs84, 10.0 ** -decimals)
+        wgs84 = shapely.transform(wgs84, lambda coords: np.round(coords, decimals))
+
+    counts['stützpunkte_lod'] = int(shapely.get_num_coordinates(wgs84).sum())
+    return gpd.GeoDataFrame(geometry=wgs84, crs="EPSG:4326")